@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.views import LoginView
 from django.utils.html import format_html
-from .models import CustomUser
+from .models import CustomUser, EmailDelivery
 from django.conf import settings
 
 # ✅ Register CustomUser in Django Admin
@@ -51,6 +51,17 @@ class CustomUserAdmin(UserAdmin):
     avatar_tag.short_description = "Avatar"
 
 
+@admin.register(EmailDelivery)
+class EmailDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("to_email", "kind", "status", "attempts", "created_at", "sent_at", "last_error")
+    list_filter = ("status", "kind")
+    search_fields = ("to_email", "user__username")
+    raw_id_fields = ("user",)
+    # The body holds codes and reset links.
+    exclude = ("body",)
+    readonly_fields = ("user", "kind", "to_email", "subject", "attempts", "last_error", "created_at", "sent_at")
+
+
 class AdminLoginView(LoginView):
     """ Custom admin login view with reCAPTCHA """
     def get_context_data(self, **kwargs):
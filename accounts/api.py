@@ -1,40 +1,31 @@
 import logging
 
-from django.contrib.auth import authenticate, get_user_model
-from django.contrib.auth.hashers import check_password
-from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
-from django.core.validators import EmailValidator
-from django.utils.dateparse import parse_date
 
 from rest_framework import status
 from rest_framework.decorators import (
     api_view,
     authentication_classes,
+    parser_classes,
     permission_classes,
     throttle_classes,
 )
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.throttling import ScopedRateThrottle
 
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 import jwt
 
-import base64
-import hashlib
-import hmac
-import os
-
-from accounts.models import CustomUser, IrcAppPassword
+from accounts import avatars, hashing, scram, services
+from main import ratelimit
+from accounts.models import IrcAppPassword
 from accounts.tokens import get_tokens_for_user
 from accounts.utils import issue_email_verification_code, verify_email_code
 
-from .utils import verify_recaptcha
-
 
 irc_api_logger = logging.getLogger("accounts.irc_api")
 auth_api_logger = logging.getLogger("accounts.auth_api")
@@ -50,249 +41,53 @@ def _require_json_content(request):
     return None
 
 
-def _decode_avatar_data_url(data_url: str, max_bytes: int):
-    if not data_url:
-        return None, None
-
-    if not data_url.startswith("data:") or ";base64," not in data_url:
-        return None, "Avatar invalide."
-
-    header, b64data = data_url.split(";base64,", 1)
-    mime = header[5:].strip().lower()
-    if not mime.startswith("image/"):
-        return None, "Avatar invalide."
-
-    try:
-        raw = base64.b64decode(b64data, validate=True)
-    except Exception:
-        return None, "Avatar invalide."
-
-    if max_bytes and len(raw) > max_bytes:
-        return None, "Avatar trop volumineux."
-
-    ext = mime.split("/", 1)[-1].lower()
-    ext = ext.split("+", 1)[0]
-    if ext == "jpeg":
-        ext = "jpg"
-    elif ext == "svg+xml":
-        ext = "svg"
-    elif ext == "x-icon":
-        ext = "ico"
-
-    filename = f"avatar.{ext or 'bin'}"
-    return ContentFile(raw, name=filename), None
-
-
-def _get_custom_avatar_url(user: CustomUser) -> str | None:
-    if not user.avatar or not getattr(user.avatar, "name", ""):
-        return None
-    if user.avatar.name == "avatars/default.jpg":
-        return None
-    return user.avatar_url()
-
-
-def _safe_scram_salt(*, saltlen: int) -> bytes:
-    """Generate a SCRAM salt whose *standard* base64 encoding avoids '+' and '/'.
-
-    Some IRC clients (notably adiirc/maddirc in our testing) appear to abort SCRAM
-    when the server-first "s=" attribute contains these characters.
-    """
-
-    if saltlen < 16:
-        saltlen = 16
-
-    for _ in range(256):
-        salt = os.urandom(saltlen)
-        salt_b64 = base64.b64encode(salt).decode("ascii")
-        if "+" not in salt_b64 and "/" not in salt_b64:
-            return salt
-
-    raise RuntimeError("failed to generate a client-compatible SCRAM salt")
-
-
-def _make_scram_sha512_verifier(password: str, *, iterations: int = 4096, saltlen: int = 16) -> str:
-    """Create an RFC5802 SCRAM-SHA-512 verifier string.
-
-    Format matches Anope's ns_sasl_scram_sha512 third-party module:
-    v=1,i=<iterations>,s=<b64salt>,sk=<b64storedkey>,sv=<b64serverkey>
-    """
-
-    if not isinstance(password, str) or not password:
-        raise ValueError("password must be a non-empty string")
-
-    try:
-        iterations = int(iterations)
-    except Exception:
-        iterations = 4096
-    if iterations < 4096:
-        iterations = 4096
-
-    try:
-        saltlen = int(saltlen)
-    except Exception:
-        saltlen = 16
-    if saltlen < 16:
-        saltlen = 16
-
-    salt = _safe_scram_salt(saltlen=saltlen)
-
-    salted_password = hashlib.pbkdf2_hmac(
-        "sha512",
-        password.encode("utf-8"),
-        salt,
-        iterations,
-        dklen=64,
+def _hashing_busy_response(http_status=status.HTTP_503_SERVICE_UNAVAILABLE):
+    response = Response(
+        {"error": "Serveur occupé, réessayez dans un instant.", "code": "busy"},
+        status=http_status,
     )
+    response["Retry-After"] = "1"
+    return response
 
-    client_key = hmac.new(salted_password, b"Client Key", hashlib.sha512).digest()
-    stored_key = hashlib.sha512(client_key).digest()
-    server_key = hmac.new(salted_password, b"Server Key", hashlib.sha512).digest()
-
-    b64 = lambda b: base64.b64encode(b).decode("ascii")
-    return f"v=1,i={iterations},s={b64(salt)},sk={b64(stored_key)},sv={b64(server_key)}"
-
-
-def _make_scram_sha256_verifier(password: str, *, iterations: int = 4096, saltlen: int = 16) -> str:
-    """Create an RFC5802 SCRAM-SHA-256 verifier string.
-
-    Format:
-    v=1,i=<iterations>,s=<b64salt>,sk=<b64storedkey>,sv=<b64serverkey>
-    """
-
-    if not isinstance(password, str) or not password:
-        raise ValueError("password must be a non-empty string")
-
-    try:
-        iterations = int(iterations)
-    except Exception:
-        iterations = 4096
-    if iterations < 4096:
-        iterations = 4096
-
-    try:
-        saltlen = int(saltlen)
-    except Exception:
-        saltlen = 16
-    if saltlen < 16:
-        saltlen = 16
-
-    salt = _safe_scram_salt(saltlen=saltlen)
-
-    salted_password = hashlib.pbkdf2_hmac(
-        "sha256",
-        password.encode("utf-8"),
-        salt,
-        iterations,
-        dklen=32,
-    )
-
-    client_key = hmac.new(salted_password, b"Client Key", hashlib.sha256).digest()
-    stored_key = hashlib.sha256(client_key).digest()
-    server_key = hmac.new(salted_password, b"Server Key", hashlib.sha256).digest()
-
-    b64 = lambda b: base64.b64encode(b).decode("ascii")
-    return f"v=1,i={iterations},s={b64(salt)},sk={b64(stored_key)},sv={b64(server_key)}"
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
-@throttle_classes([ScopedRateThrottle])
+@throttle_classes([ratelimit.ScopedThrottle])
+@parser_classes([JSONParser, MultiPartParser])
 def register(request):
+    """Create an account from JSON (avatar as a data URL) or multipart form data (avatar file)."""
     try:
-        err = _require_json_content(request)
-        if err:
-            return err
+        if not request.FILES:
+            err = _require_json_content(request)
+            if err:
+                return err
 
         if request.user.is_authenticated:
             return Response({"error": "You are already registered"}, status=status.HTTP_400_BAD_REQUEST)
 
-        username = (request.data.get("username") or "").strip()
-        email = (request.data.get("email") or "").strip().lower()
-        password1 = request.data.get("password1")
-        password2 = request.data.get("password2")
-        birthday_raw = request.data.get("birthday")
-        gender = (request.data.get("gender") or "").strip()
-        city = (request.data.get("city") or "").strip()
-        recaptcha_token = request.data.get("g_recaptcha_response") or request.data.get("g-recaptcha-response")
-        avatar_data_url = request.data.get("avatar_data_url") or request.data.get("avatar")
-
-        if not username or not email or not password1 or not password2:
-            return Response({"error": "Champs requis manquants."}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            EmailValidator()(email)
-        except ValidationError:
-            return Response({"error": "Email invalide."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Validate username using model field validators.
-        try:
-            CustomUser._meta.get_field("username").run_validators(username)
-        except ValidationError:
-            return Response({"error": "Nom d'utilisateur invalide."}, status=status.HTTP_400_BAD_REQUEST)
-
-        if password1 != password2:
-            return Response({"error": "Passwords do not match"}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            validate_password(password1)
-        except ValidationError as ve:
-            return Response({"error": "Mot de passe trop faible.", "details": list(ve.messages)}, status=status.HTTP_400_BAD_REQUEST)
-
-        birthday = None
-        if birthday_raw:
-            birthday = parse_date(str(birthday_raw))
-            if not birthday:
-                return Response({"error": "Date de naissance invalide."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # ✅ reCAPTCHA Verification
-        is_valid, recaptcha_error = verify_recaptcha(recaptcha_token)
-        if not is_valid:
-            return Response({"error": f"reCAPTCHA failed: {recaptcha_error}"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # ✅ Check if username or email exists
-        if CustomUser.objects.filter(username=username).exists():
-            return Response({"error": "Username already exists"}, status=status.HTTP_400_BAD_REQUEST)
-        if CustomUser.objects.filter(email=email).exists():
-            return Response({"error": "Email already registered"}, status=status.HTTP_400_BAD_REQUEST)
-        if gender not in ["M", "F"]:
-            return Response({"error": "Invalid gender"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # ✅ Create user
-        user = CustomUser.objects.create_user(
-            username=username,
-            email=email,
-            age=birthday,
-            gender=gender,
-            city=city,
-            password=password1,
-        )
-
-        # New accounts must verify email before login.
-        user.email_verified = False
-        user.save(update_fields=["email_verified"])  # Ensure flag is persisted.
-
-        # ✅ Save avatar AFTER user is created
-        if avatar_data_url:
-            max_bytes = getattr(settings, "AVATAR_MAX_UPLOAD_SIZE", 2 * 1024 * 1024)
-            avatar, avatar_error = _decode_avatar_data_url(avatar_data_url, max_bytes)
-            if avatar_error:
-                return Response({"error": avatar_error}, status=status.HTTP_400_BAD_REQUEST)
-            if avatar:
-                user.avatar = avatar
-                user.save(update_fields=["avatar"])  # ✅ Save the user with avatar
-
-        # Email verification code
+        data = request.data
         try:
-            issue_email_verification_code(user)
-        except ValidationError as ve:
-            auth_api_logger.warning("register email_issue validation_error user_id=%s email=%r err=%s", user.pk, user.email, ve)
-            return Response({
-                "error": "Compte créé, mais l'envoi du code est temporairement limité. Réessayez bientôt.",
-            }, status=status.HTTP_429_TOO_MANY_REQUESTS)
-        except Exception:
-            auth_api_logger.exception("register email_issue failed user_id=%s email=%r", user.pk, user.email)
-            return Response({
-                "error": "Compte créé, mais impossible d'envoyer l'email de confirmation. Veuillez réessayer plus tard ou contacter le support.",
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            avatar = request.FILES.get("avatar")
+            if avatar is None:
+                avatar = services.avatar_from_data_url(data.get("avatar_data_url") or data.get("avatar"))
+            services.register_user(
+                username=data.get("username"),
+                email=data.get("email"),
+                password1=data.get("password1"),
+                password2=data.get("password2"),
+                birthday=data.get("birthday"),
+                gender=data.get("gender"),
+                city=data.get("city"),
+                recaptcha_token=data.get("g_recaptcha_response") or data.get("g-recaptcha-response"),
+                avatar=avatar,
+            )
+        except services.RegistrationError as exc:
+            body = {"error": exc.message}
+            if exc.details:
+                body["details"] = exc.details
+            return Response(body, status=exc.status)
+        except hashing.HashingPoolBusy:
+            return _hashing_busy_response()
 
         return Response({
             "message": "Compte créé. En attente de confirmation par email.",
@@ -304,55 +99,28 @@ def register(request):
         return Response({"error": "Internal server error."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-# Make ScopedRateThrottle apply the intended scope.
-register.throttle_scope = "register"
+# api_view wraps the function in a class; throttles read the scope from it.
+register.cls.throttle_scope = "register"
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
-@throttle_classes([ScopedRateThrottle])
+@throttle_classes([ratelimit.ScopedThrottle])
 def login_api(request):
     try:
         err = _require_json_content(request)
         if err:
             return err
 
-        identifier = (request.data.get("username") or "").strip()
-        password = request.data.get("password")
-
-        if not identifier or not password:
-            return Response({
-                "error": "Champs requis manquants.",
-                "code": "missing_fields",
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        # Allow login by either username or email.
-        candidate_user = CustomUser.objects.filter(username__iexact=identifier).first()
-        if not candidate_user:
-            candidate_user = CustomUser.objects.filter(email__iexact=identifier).first()
-
-        if not candidate_user:
-            # User asked for explicit feedback; return a dedicated code.
-            return Response({
-                "error": "Nom d'utilisateur ou email inconnu.",
-                "code": "unknown_user",
-                "field": "username",
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        # Authenticate using the canonical username.
-        user = authenticate(username=candidate_user.username, password=password)
-        if not user:
-            return Response({
-                "error": "Mot de passe incorrect.",
-                "code": "bad_password",
-                "field": "password",
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        if not getattr(user, "email_verified", False):
-            return Response({
-                "error": "Veuillez confirmer votre email avant de vous connecter.",
-                "code": "email_unverified",
-            }, status=status.HTTP_403_FORBIDDEN)
+        try:
+            user = services.login_user(request.data.get("username"), request.data.get("password"))
+        except services.AccountError as exc:
+            body = {"error": exc.message, "code": exc.code}
+            if exc.field:
+                body["field"] = exc.field
+            return Response(body, status=exc.status)
+        except hashing.HashingPoolBusy:
+            return _hashing_busy_response()
 
         tokens = get_tokens_for_user(user)
         return Response({
@@ -370,13 +138,23 @@ def login_api(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-login_api.throttle_scope = "login"
+login_api.cls.throttle_scope = "login"
+
+
+class _IrcLoginThrottle(ratelimit.ScopedThrottle):
+    """Per submitted account: every IRC login arrives from the Anope host."""
+
+    def get_cache_key(self, request, view):
+        username = request.data.get("username") if hasattr(request.data, "get") else None
+        if not isinstance(username, str) or not username.strip():
+            return super().get_cache_key(request, view)
+        return self.cache_format % {"scope": self.scope, "ident": f"account:{username.strip().lower()}"}
 
 
 @api_view(["POST", "GET"])
 @authentication_classes([])
 @permission_classes([AllowAny])
-@throttle_classes([ScopedRateThrottle])
+@throttle_classes([_IrcLoginThrottle])
 def login_token(request):
     """Anope-compatible login endpoint.
 
@@ -389,7 +167,8 @@ def login_token(request):
 
     Notes:
     - If a shared secret is configured (settings.IRC_API_TOKEN), the client can send it via X-API-Key.
-    - Always returns HTTP 200 so Anope can parse the JSON body (its module treats non-200 as a transport error).
+    - Always returns HTTP 200 so Anope can parse the JSON body (its module treats non-200 as a transport error),
+      except 503 when the password hashing pool is saturated.
     """
 
     # Avoid noisy "Method Not Allowed" warnings from scanners.
@@ -397,8 +176,6 @@ def login_token(request):
     if request.method != "POST":
         return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    # ScopedRateThrottle reads view.throttle_scope (not request.throttle_scope).
-
     remote_ip = request.META.get("REMOTE_ADDR")
     forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
 
@@ -429,36 +206,37 @@ def login_token(request):
         return Response({"error": "Username and password are required."}, status=status.HTTP_200_OK)
 
     now = timezone.now()
-    app_pw_ttl_seconds = getattr(settings, "IRC_APP_PASSWORD_TTL_SECONDS", 120)
-    try:
-        app_pw_ttl_seconds = int(app_pw_ttl_seconds)
-    except Exception:
-        app_pw_ttl_seconds = 120
-    app_pw_ttl_seconds = min(max(app_pw_ttl_seconds, 10), 24 * 60 * 60)
-    app_pw_cutoff = now - timedelta(seconds=app_pw_ttl_seconds)
 
-    user = authenticate(username=username, password=password)
-    if not user:
-        UserModel = get_user_model()
-        user_obj = UserModel.objects.filter(username=username).first()
-        if user_obj:
-            for app_pw in (
-                IrcAppPassword.objects
-                .filter(
-                    user=user_obj,
-                    revoked_at__isnull=True,
-                    last_used__isnull=True,
-                    created_at__gte=app_pw_cutoff,
-                )
-                .order_by("-created_at")[:10]
-            ):
-                if check_password(password, app_pw.password):
+    UserModel = get_user_model()
+    user_obj = UserModel.objects.filter(**{UserModel.USERNAME_FIELD: username}).first()
+    via_app_password = False
+    try:
+        user = hashing.authenticate(user_obj, password)
+        token_parts = IrcAppPassword.split_token(password) if not user and user_obj else None
+        if token_parts:
+            selector, secret = token_parts
+            app_pw = IrcAppPassword.objects.filter(
+                selector=selector,
+                user=user_obj,
+                revoked_at__isnull=True,
+                last_used__isnull=True,
+                created_at__gte=IrcAppPassword.usable_cutoff(),
+            ).first()
+            if app_pw and hashing.check_encoded(secret, app_pw.password):
+                # One-time use: revoke immediately after a successful auth. The
+                # conditional update makes concurrent replays of the token lose.
+                used_at = timezone.now()
+                if IrcAppPassword.objects.filter(pk=app_pw.pk, revoked_at__isnull=True).update(
+                    last_used=used_at,
+                    revoked_at=used_at,
+                ):
                     user = user_obj
-                    app_pw.last_used = timezone.now()
-                    # One-time use: revoke immediately after a successful auth.
-                    app_pw.revoked_at = app_pw.last_used
-                    app_pw.save(update_fields=["last_used", "revoked_at"])
-                    break
+                    via_app_password = True
+    except hashing.HashingPoolBusy:
+        irc_api_logger.warning("login_token hashing_busy ip=%s xff=%s username=%r", remote_ip, forwarded_for, username)
+        # Deliberately not a 200: Anope treats non-200 as a transport error, so
+        # the user is not told their password is wrong.
+        return _hashing_busy_response()
     if not user or not getattr(user, "is_active", True) or not getattr(user, "email_verified", False):
         irc_api_logger.warning(
             "login_token invalid_credentials ip=%s xff=%s username=%r password_len=%s",
@@ -485,19 +263,20 @@ def login_token(request):
     if isinstance(token, bytes):
         token = token.decode("utf-8")
 
-    scram_iterations = getattr(settings, "IRC_SCRAM_ITERATIONS", 4096)
-    scram_saltlen = getattr(settings, "IRC_SCRAM_SALTLEN", 16)
     try:
-        scram_verifier = _make_scram_sha512_verifier(password, iterations=scram_iterations, saltlen=scram_saltlen)
+        if via_app_password:
+            # One-time app passwords are not the account password: derive
+            # throwaway verifiers rather than touching the stored ones.
+            verifiers = hashing.submit(scram.make_verifiers, password)
+        else:
+            verifiers = user.scram_verifiers_for_login(password)
+    except hashing.HashingPoolBusy:
+        verifiers = {}
     except Exception:
         irc_api_logger.exception("login_token scram_verifier_error username=%r", username)
-        scram_verifier = ""
-
-    try:
-        scram256_verifier = _make_scram_sha256_verifier(password, iterations=scram_iterations, saltlen=scram_saltlen)
-    except Exception:
-        irc_api_logger.exception("login_token scram256_verifier_error username=%r", username)
-        scram256_verifier = ""
+        verifiers = {}
+    scram_verifier = verifiers.get("sha512", "")
+    scram256_verifier = verifiers.get("sha256", "")
 
     return Response({
         "access_token": token,
@@ -509,13 +288,12 @@ def login_token(request):
     }, status=status.HTTP_200_OK)
 
 
-# Make ScopedRateThrottle apply the intended scope.
-login_token.throttle_scope = "irc_api"
+login_token.cls.throttle_scope = "irc_login"
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
-@throttle_classes([ScopedRateThrottle])
+@throttle_classes([ratelimit.ScopedThrottle])
 def verify_email(request):
     """Verify an email address using a short code sent by email."""
 
@@ -529,7 +307,7 @@ def verify_email(request):
     if not email or not code:
         return Response({"error": "Email et code requis."}, status=status.HTTP_400_BAD_REQUEST)
 
-    user = CustomUser.objects.filter(email__iexact=email).first()
+    user = services.find_user_by_identifier(email, fields=("email",))
     if not user:
         # Avoid leaking whether an email exists.
         return Response({"error": "Email ou code invalide."}, status=status.HTTP_400_BAD_REQUEST)
@@ -541,12 +319,12 @@ def verify_email(request):
     return Response({"message": "Email confirmé. Vous pouvez vous connecter."}, status=status.HTTP_200_OK)
 
 
-verify_email.throttle_scope = "verify_email"
+verify_email.cls.throttle_scope = "verify_email"
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
-@throttle_classes([ScopedRateThrottle])
+@throttle_classes([ratelimit.ScopedThrottle])
 def resend_email_verification(request):
     err = _require_json_content(request)
     if err:
@@ -556,7 +334,7 @@ def resend_email_verification(request):
     if not email:
         return Response({"error": "Email requis."}, status=status.HTTP_400_BAD_REQUEST)
 
-    user = CustomUser.objects.filter(email__iexact=email).first()
+    user = services.find_user_by_identifier(email, fields=("email",))
     if not user:
         # Avoid leaking whether an email exists.
         return Response({"message": "Si l'email existe, un code a été envoyé."}, status=status.HTTP_200_OK)
@@ -573,7 +351,7 @@ def resend_email_verification(request):
     return Response({"message": "Si l'email existe, un code a été envoyé."}, status=status.HTTP_200_OK)
 
 
-resend_email_verification.throttle_scope = "resend_email"
+resend_email_verification.cls.throttle_scope = "resend_email"
 
 # ✅ API Change Password (Requires Authentication)
 @api_view(["POST"])
@@ -583,14 +361,12 @@ def change_password(request):
     if err:
         return err
 
-    old_password = request.data.get("old_password")
-    new_password = request.data.get("new_password")
-
-    if not request.user.check_password(old_password):
-        return Response({"error": "Incorrect old password"}, status=status.HTTP_400_BAD_REQUEST)
-
-    request.user.set_password(new_password)
-    request.user.save()
+    try:
+        services.change_password(request.user, request.data.get("old_password"), request.data.get("new_password"))
+    except services.AccountError as exc:
+        return Response({"error": exc.message}, status=exc.status)
+    except hashing.HashingPoolBusy:
+        return _hashing_busy_response()
 
     return Response({"message": "Password changed successfully"}, status=status.HTTP_200_OK)
 
@@ -602,16 +378,18 @@ def change_email(request):
     if err:
         return err
 
-    new_email = request.data.get("new_email")
+    try:
+        services.change_email(request.user, request.data.get("new_email"))
+    except services.AccountError as exc:
+        return Response({"error": exc.message}, status=exc.status)
 
-    UserModel = get_user_model()
-    if UserModel.objects.filter(email=new_email).exists():
-        return Response({"error": "Email already in use"}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"message": "Email updated successfully"}, status=status.HTTP_200_OK)
 
-    request.user.email = new_email
-    request.user.save()
 
-    return Response({"message": "Email updated successfully"}, status=status.HTTP_200_OK)
+def _avatar_cache_headers(response):
+    max_age = int(getattr(settings, "AVATAR_API_CACHE_SECONDS", 900))
+    response["Cache-Control"] = f"public, max-age={max_age}"
+    return response
 
 
 @api_view(["GET"])
@@ -621,8 +399,43 @@ def get_avatar(request):
     if not account:
         return Response({"avatar_url": None}, status=status.HTTP_200_OK)
 
-    user = CustomUser.objects.filter(username__iexact=account, public=True).only("avatar").first()
-    if not user:
-        return Response({"avatar_url": None}, status=status.HTTP_200_OK)
+    return _avatar_cache_headers(Response({"avatar_url": avatars.resolve(account)}, status=status.HTTP_200_OK))
+
+
+@api_view(["GET", "POST"])
+@permission_classes([AllowAny])
+@throttle_classes([ratelimit.ScopedThrottle])
+def get_avatars(request):
+    """Bulk avatar lookup: ``?accounts=a,b,c`` (or repeated ``account=``), or a JSON body ``{"accounts": [...]}``.
+
+    Response: ``{"avatars": {"<account>": "<url>" | null, ...}}``.
+    """
+
+    if request.method == "POST":
+        raw = request.data.get("accounts") if hasattr(request.data, "get") else None
+        if isinstance(raw, str):
+            raw = raw.split(",")
+        if not isinstance(raw, list):
+            return Response({"error": "accounts must be a list."}, status=status.HTTP_400_BAD_REQUEST)
+        accounts = [str(item) for item in raw]
+    else:
+        accounts = []
+        for value in request.query_params.getlist("accounts"):
+            accounts.extend(value.split(","))
+        accounts.extend(request.query_params.getlist("account"))
+
+    max_accounts = int(getattr(settings, "AVATAR_BULK_MAX_ACCOUNTS", 100))
+    accounts = [account.strip() for account in accounts if account.strip()]
+    if len(accounts) > max_accounts:
+        return Response(
+            {"error": f"Too many accounts (max {max_accounts})."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    response = Response({"avatars": avatars.resolve_many(accounts)}, status=status.HTTP_200_OK)
+    if request.method == "GET":
+        _avatar_cache_headers(response)
+    return response
+
 
-    return Response({"avatar_url": _get_custom_avatar_url(user)}, status=status.HTTP_200_OK)
+get_avatars.cls.throttle_scope = "avatars"
@@ -0,0 +1,99 @@
+"""Cached nick -> custom avatar URL resolution for IRC clients.
+
+Clients look avatars up for every nick they see, so results (including
+"no avatar") are cached per lower-cased account name. ``CustomUser.save`` and
+``CustomUser.delete`` drop the affected entries.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.functions import Lower
+
+
+KEY_PREFIX = "accounts.avatar"
+DEFAULT_AVATAR_NAME = "avatars/default.jpg"
+DEFAULT_STATIC_URL = "/static/images/default-avatar.svg"
+
+# Stored for accounts without a public custom avatar (cache.get can't tell
+# a cached None from a miss).
+_NONE = ""
+
+
+def _key(account: str) -> str:
+    return f"{KEY_PREFIX}.{account.lower()}"
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "AVATAR_RESOLVER_TTL", 3600))
+
+
+def _negative_ttl() -> int:
+    return int(getattr(settings, "AVATAR_RESOLVER_NEGATIVE_TTL", 300))
+
+
+def custom_avatar_url(user) -> Optional[str]:
+    """URL of the user's uploaded avatar, or ``None`` for the placeholder."""
+
+    if not user.avatar or not getattr(user.avatar, "name", ""):
+        return None
+    if user.avatar.name == DEFAULT_AVATAR_NAME:
+        return None
+    url = user.avatar_url()
+    # avatar_url() falls back to the static placeholder when the file is gone.
+    if url == DEFAULT_STATIC_URL:
+        return None
+    return url
+
+
+def resolve_many(accounts: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Map each account name (as given) to its avatar URL or ``None``.
+
+    Lookups are case-insensitive. Cache misses are resolved with one query.
+    """
+
+    requested: List[str] = []
+    for account in accounts:
+        account = (account or "").strip()
+        if account and account not in requested:
+            requested.append(account)
+    if not requested:
+        return {}
+
+    keys = {account: _key(account) for account in requested}
+    cached = cache.get_many(set(keys.values()))
+
+    missing = {account.lower() for account in requested if keys[account] not in cached}
+    if missing:
+        found: Dict[str, str] = {}
+        users = (
+            get_user_model().objects
+            .annotate(username_lower=Lower("username"))
+            .filter(username_lower__in=missing, public=True)
+            .only("username", "avatar", "thumbnails")
+        )
+        for user in users:
+            found[user.username.lower()] = custom_avatar_url(user) or _NONE
+
+        positive = {_key(name): url for name, url in found.items() if url}
+        negative = {_key(name): _NONE for name in missing if not found.get(name)}
+        if positive:
+            cache.set_many(positive, _ttl())
+        if negative:
+            cache.set_many(negative, _negative_ttl())
+        cached.update(positive)
+        cached.update(negative)
+
+    return {account: cached.get(keys[account]) or None for account in requested}
+
+
+def resolve(account: str) -> Optional[str]:
+    return resolve_many([account]).get((account or "").strip())
+
+
+def invalidate(*accounts: str) -> None:
+    keys = {_key(account) for account in accounts if account}
+    if keys:
+        cache.delete_many(keys)
@@ -0,0 +1,189 @@
+"""Queued transactional email (verification codes, password resets).
+
+Requests only write an :class:`~accounts.models.EmailDelivery` row; a
+django-rq job sends due rows after the transaction commits, over one SMTP
+connection per batch. Failed sends are retried with exponential backoff
+until ``EMAIL_QUEUE_MAX_ATTEMPTS``. If the queue is unreachable the row stays
+queued for ``manage.py send_queued_emails`` (run it periodically as a sweep).
+
+``EMAIL_QUEUE_ASYNC = False`` sends on commit in the current process instead.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+from typing import Dict, Optional
+
+import django_rq
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EmailDelivery
+
+
+logger = logging.getLogger(__name__)
+
+TASK_PATH = "accounts.tasks.send_queued_emails"
+
+
+def _setting_int(name: str, default: int) -> int:
+    try:
+        return max(int(getattr(settings, name, default)), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+def queue_email(user, kind: str, subject: str, body: str, to_email: Optional[str] = None) -> EmailDelivery:
+    """Record an email for ``user`` and have it sent once the transaction commits."""
+
+    delivery = EmailDelivery.objects.create(
+        user=user,
+        kind=kind,
+        to_email=to_email or user.email,
+        subject=subject[:255],
+        body=body,
+    )
+    schedule_delivery()
+    return delivery
+
+
+def schedule_delivery(delay: Optional[timedelta] = None) -> None:
+    """Ask a worker to run :func:`deliver_due` after commit (or ``delay`` from now)."""
+
+    if not getattr(settings, "EMAIL_QUEUE_ASYNC", True):
+        def run_inline():
+            try:
+                deliver_due()
+            except Exception:
+                logger.exception("inline email delivery failed")
+
+        transaction.on_commit(run_inline)
+        return
+
+    def enqueue():
+        try:
+            queue = django_rq.get_queue(getattr(settings, "EMAIL_QUEUE", "default"), autocommit=True)
+            if delay:
+                queue.enqueue_in(delay, TASK_PATH)
+            else:
+                queue.enqueue(TASK_PATH)
+        except Exception as exc:
+            # Never fall back to sending in the request: the sweep picks it up.
+            logger.warning("could not enqueue email delivery (%s); left for send_queued_emails", exc)
+
+    transaction.on_commit(enqueue)
+
+
+def _claim(batch_size: int):
+    """Mark up to ``batch_size`` due rows as sending and return them.
+
+    Claimed rows get a lease (``EMAIL_QUEUE_LEASE_SECONDS``); if the worker
+    dies mid-batch they become due again when it expires.
+    """
+
+    now = timezone.now()
+    lease = timedelta(seconds=_setting_int("EMAIL_QUEUE_LEASE_SECONDS", 300))
+    with transaction.atomic():
+        ids = list(
+            EmailDelivery.objects.select_for_update(skip_locked=True)
+            .filter(
+                status__in=[EmailDelivery.STATUS_QUEUED, EmailDelivery.STATUS_SENDING],
+                next_attempt_at__lte=now,
+            )
+            .order_by("next_attempt_at")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if ids:
+            EmailDelivery.objects.filter(pk__in=ids).update(
+                status=EmailDelivery.STATUS_SENDING,
+                attempts=F("attempts") + 1,
+                next_attempt_at=now + lease,
+            )
+    return list(EmailDelivery.objects.filter(pk__in=ids).order_by("next_attempt_at", "pk"))
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    base = _setting_int("EMAIL_QUEUE_RETRY_BASE_SECONDS", 30)
+    cap = _setting_int("EMAIL_QUEUE_RETRY_MAX_SECONDS", 3600)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), cap))
+
+
+def _record_failure(delivery: EmailDelivery, exc: Exception) -> Optional[timedelta]:
+    """Reschedule or give up on ``delivery``; returns the retry delay, if any."""
+
+    error = f"{type(exc).__name__}: {exc}"[:255]
+    if delivery.attempts >= _setting_int("EMAIL_QUEUE_MAX_ATTEMPTS", 6):
+        logger.error("email delivery %s failed permanently: %s", delivery.pk, error)
+        EmailDelivery.objects.filter(pk=delivery.pk).update(status=EmailDelivery.STATUS_FAILED, last_error=error)
+        return None
+
+    delay = _retry_delay(delivery.attempts)
+    logger.warning("email delivery %s failed (attempt %s), retrying in %s: %s", delivery.pk, delivery.attempts, delay, error)
+    EmailDelivery.objects.filter(pk=delivery.pk).update(
+        status=EmailDelivery.STATUS_QUEUED,
+        next_attempt_at=timezone.now() + delay,
+        last_error=error,
+    )
+    return delay
+
+
+def deliver_due(batch_size: Optional[int] = None) -> Dict[str, int]:
+    """Send one batch of due emails over a single connection; returns counts by outcome."""
+
+    batch_size = batch_size or _setting_int("EMAIL_QUEUE_BATCH_SIZE", 50) or 50
+    deliveries = _claim(batch_size)
+    counts = {"sent": 0, "retry": 0, "failed": 0}
+    if not deliveries:
+        return counts
+
+    retry_delays = []
+
+    def fail(delivery, exc):
+        delay = _record_failure(delivery, exc)
+        if delay is None:
+            counts["failed"] += 1
+        else:
+            counts["retry"] += 1
+            retry_delays.append(delay)
+
+    from_email = getattr(settings, "DEFAULT_FROM_EMAIL", None) or None
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        for delivery in deliveries:
+            fail(delivery, exc)
+    else:
+        try:
+            for delivery in deliveries:
+                message = EmailMessage(
+                    delivery.subject, delivery.body, from_email, [delivery.to_email], connection=connection
+                )
+                try:
+                    message.send()
+                except Exception as exc:
+                    fail(delivery, exc)
+                    continue
+                EmailDelivery.objects.filter(pk=delivery.pk).update(
+                    status=EmailDelivery.STATUS_SENT,
+                    sent_at=timezone.now(),
+                    body="",
+                    last_error="",
+                )
+                counts["sent"] += 1
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    if len(deliveries) >= batch_size:
+        # There may be more due rows than fit in one batch.
+        schedule_delivery()
+    if retry_delays:
+        schedule_delivery(delay=min(retry_delays))
+    return counts
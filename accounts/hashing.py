@@ -0,0 +1,128 @@
+"""Bounded worker pool for password hashing and verification.
+
+PBKDF2 is deliberately slow. Running it on the request thread lets a
+brute-force or IRC reconnect storm occupy every worker. Here it runs in a
+small thread pool instead (hashlib releases the GIL while hashing). Admission
+is capped at ``PASSWORD_HASHING_WORKERS + PASSWORD_HASHING_MAX_QUEUE`` jobs;
+anything beyond that fails fast with :class:`HashingPoolBusy`. Only pure
+hashing runs in the pool. Database reads and writes stay on the caller's
+thread.
+
+``PASSWORD_HASHING_WORKERS = 0`` disables the pool and hashes inline.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class HashingPoolBusy(Exception):
+    """Raised when the hashing pool cannot take (or finish) a job in time."""
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+_config = None
+
+
+def _setting_int(name: str, default: int) -> int:
+    try:
+        return max(int(getattr(settings, name, default)), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+def _pool():
+    global _executor, _slots, _config
+
+    workers = _setting_int("PASSWORD_HASHING_WORKERS", 4)
+    if workers <= 0:
+        return None, None
+    config = (workers, _setting_int("PASSWORD_HASHING_MAX_QUEUE", 16))
+
+    with _lock:
+        if _config != config:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hashing")
+            _slots = threading.BoundedSemaphore(sum(config))
+            _config = config
+        return _executor, _slots
+
+
+def submit(fn, *args, **kwargs):
+    """Run ``fn`` in the hashing pool and return its result.
+
+    Raises :class:`HashingPoolBusy` when the pool is saturated or the job does
+    not finish within ``PASSWORD_HASHING_TIMEOUT`` seconds.
+    """
+
+    executor, slots = _pool()
+    if executor is None:
+        return fn(*args, **kwargs)
+
+    if not slots.acquire(blocking=False):
+        raise HashingPoolBusy("password hashing pool is saturated")
+    try:
+        future = executor.submit(fn, *args, **kwargs)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _future: slots.release())
+
+    try:
+        timeout = float(getattr(settings, "PASSWORD_HASHING_TIMEOUT", 5.0))
+    except (TypeError, ValueError):
+        timeout = 5.0
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        raise HashingPoolBusy("password hashing timed out") from None
+
+
+def check_encoded(raw_password, encoded) -> bool:
+    """``django.contrib.auth.hashers.check_password`` for a stored hash."""
+
+    return bool(submit(hashers.check_password, raw_password, encoded))
+
+
+def set_password(user, raw_password) -> None:
+    """Hash ``raw_password`` onto ``user`` (unsaved), like ``user.set_password``."""
+
+    submit(user.set_password, raw_password)
+
+
+def check_password(user, raw_password) -> bool:
+    """Verify ``raw_password`` for ``user``, upgrading an outdated hash on success."""
+
+    if raw_password is None:
+        return False
+
+    needs_upgrade = []
+    if not submit(hashers.check_password, raw_password, user.password, needs_upgrade.append):
+        return False
+
+    if needs_upgrade:
+        set_password(user, raw_password)
+        user.save(update_fields=["password"])
+    return True
+
+
+def authenticate(user, raw_password):
+    """Pool-backed equivalent of ModelBackend.authenticate for an already loaded user.
+
+    ``user`` may be ``None``; the default hasher still runs once so response
+    times do not reveal whether the account exists.
+    """
+
+    if user is None:
+        if raw_password:
+            submit(hashers.make_password, raw_password)
+        return None
+    if check_password(user, raw_password) and getattr(user, "is_active", True):
+        return user
+    return None
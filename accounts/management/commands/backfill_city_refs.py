@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Case, IntegerField, Value, When
+
+from community.models import MemberDirectoryEntry
+from locations.models import City, city_key
+
+
+class Command(BaseCommand):
+    help = "Link members to locations.City from their free-text city (fills CustomUser.city_ref)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--all", action="store_true", help="Re-resolve members that already have a city.")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, int(options["batch_size"]))
+
+        # Cities loaded before name_key existed.
+        stale = []
+        for city in City.objects.filter(name_key="").only("id", "name").iterator(chunk_size=batch_size):
+            city.name_key = city_key(city.name)
+            stale.append(city)
+        City.objects.bulk_update(stale, ["name_key"], batch_size=batch_size)
+
+        city_ids = {}
+        for pk, key in City.objects.order_by("-pk").values_list("pk", "name_key").iterator(chunk_size=5000):
+            # Lowest pk wins, as in City.resolve().
+            city_ids[key] = pk
+
+        User = get_user_model()
+        qs = User.objects.exclude(city__isnull=True).exclude(city="")
+        if not options["all"]:
+            qs = qs.filter(city_ref__isnull=True)
+
+        linked = scanned = 0
+        last_pk = 0
+        while True:
+            batch = list(qs.filter(pk__gt=last_pk).order_by("pk").only("id", "city", "city_ref")[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = []
+            for user in batch:
+                city_id = city_ids.get(city_key(user.city))
+                if city_id != user.city_ref_id:
+                    user.city_ref_id = city_id
+                    changed.append(user)
+            # bulk_update skips save(): no avatar or thumbnail side effects,
+            # but also no directory sync, so the entries are updated here.
+            User.objects.bulk_update(changed, ["city_ref"])
+            if changed:
+                city_refs = Case(
+                    *[When(pk=user.pk, then=Value(user.city_ref_id)) for user in changed],
+                    output_field=IntegerField(),
+                )
+                MemberDirectoryEntry.objects.filter(pk__in=[user.pk for user in changed]).update(city_ref_id=city_refs)
+            linked += sum(1 for user in changed if user.city_ref_id)
+            scanned += len(batch)
+            self.stdout.write(f"{scanned} members scanned")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. Keyed {len(stale)} cities, linked {linked} of {scanned} members."
+        ))
@@ -1,28 +1,38 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 
+from main.thumbnails import backfill
+
 
 class Command(BaseCommand):
     help = "Generate avatar thumbnails (WebP/JPEG fallback) for existing users."
 
     def add_arguments(self, parser):
         parser.add_argument("--limit", type=int, default=0)
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1)")
+        parser.add_argument("--force", action="store_true", help="Regenerate thumbnails that are already recorded.")
 
     def handle(self, *args, **options):
         User = get_user_model()
         limit = int(options.get("limit") or 0)
+        force = options["force"]
 
-        qs = User.objects.all().only("id", "avatar")
+        qs = User.objects.exclude(avatar="").exclude(avatar__isnull=True).only("id", "avatar", "thumbnails").order_by("id")
+        ids = [user.id for user in qs.iterator(chunk_size=500) if force or user.thumbnails_outdated()]
         if limit > 0:
-            qs = qs[:limit]
-
-        processed = 0
-        for user in qs.iterator(chunk_size=200):
-            try:
-                if hasattr(user, "ensure_avatar_thumbs"):
-                    user.ensure_avatar_thumbs()
-                processed += 1
-            except Exception as exc:
-                self.stderr.write(f"user_id={user.id}: {exc}")
-
-        self.stdout.write(self.style.SUCCESS(f"Done. Processed {processed} users."))
+            ids = ids[:limit]
+
+        def progress(done, total, errors):
+            for user_id, exc in errors:
+                self.stderr.write(f"user_id={user_id}: {exc}")
+            self.stdout.write(f"{done}/{total} users")
+
+        processed, errors = backfill(
+            "accounts.tasks.generate_avatar_thumbs",
+            ids,
+            workers=max(1, int(options["workers"])),
+            force=force,
+            progress=progress,
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Processed {processed} users ({len(errors)} errors)."))
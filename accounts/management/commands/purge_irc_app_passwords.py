@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from accounts.tasks import enqueue_purge_irc_app_passwords, purge_irc_app_passwords
+
+
+class Command(BaseCommand):
+    help = "Delete expired, used and revoked IRC app passwords."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Run the purge synchronously without enqueuing.",
+        )
+
+    def handle(self, *args, **options):
+        if options.get("sync"):
+            deleted = purge_irc_app_passwords()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} IRC app password(s)."))
+            return
+
+        job_id = enqueue_purge_irc_app_passwords()
+        self.stdout.write(self.style.SUCCESS(f"Enqueued IRC app password purge job: {job_id}"))
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from accounts.tasks import enqueue_send_queued_emails, send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Send due queued transactional emails (verification codes, password resets)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Send one batch synchronously without enqueuing.",
+        )
+
+    def handle(self, *args, **options):
+        if options.get("sync"):
+            counts = send_queued_emails()
+            self.stdout.write(self.style.SUCCESS(
+                f"Sent {counts['sent']} email(s), {counts['retry']} to retry, {counts['failed']} failed."
+            ))
+            return
+
+        job_id = enqueue_send_queued_emails()
+        self.stdout.write(self.style.SUCCESS(f"Enqueued email delivery job: {job_id}"))
@@ -1,20 +1,46 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils.html import format_html
 from django.utils.timezone import now
 from django.conf import settings
-from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 
-import io
+import secrets
+from datetime import timedelta
+
+from accounts import avatars, hashing, scram
+from locations.models import City
+from main import thumbnails
+
+
+class CustomUserManager(UserManager):
+    def _create_user_object(self, username, email, password, **extra_fields):
+        # UserManager hashes the password without going through set_password().
+        user = super()._create_user_object(username, email, password, **extra_fields)
+        user._set_scram_verifiers(password)
+        return user
 
-from PIL import Image, ImageOps
 
 class CustomUser(AbstractUser):
     avatar = models.ImageField(upload_to="avatars/", default="avatars/default.jpg", blank=True, null=True)
     age = models.DateField(null=True, blank=True) 
     gender = models.CharField(max_length=1, choices=[("M", "Homme"), ("F", "Femme")], default="M")
+    # NULL rather than "" when missing, so accounts_email_ci_uniq needs no
+    # partial condition: MySQL has no partial indexes and would skip it.
+    email = models.EmailField("email address", blank=True, null=True)
     city = models.CharField(max_length=100, blank=True, null=True)
+    # The locations.City that ``city`` names, resolved on save (None if unknown).
+    city_ref = models.ForeignKey(
+        "locations.City",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="members",
+        editable=False,
+        db_index=False,  # Covered by accounts_public_city_idx.
+    )
     description = models.TextField(blank=True, null=True)
     popularity_score = models.IntegerField(default=0)
     last_login = models.DateTimeField(default=now, null=False, blank=False)
@@ -26,10 +52,32 @@ class CustomUser(AbstractUser):
     email_verification_expires_at = models.DateTimeField(null=True, blank=True)
     email_verification_sent_at = models.DateTimeField(null=True, blank=True)
 
+    # Fernet-encrypted SCRAM-SHA-512/256 verifiers for Anope, refreshed on
+    # every password change (see accounts.scram).
+    scram_verifiers = models.TextField(blank=True, default="", editable=False)
+
+    # Generated avatar variants (see main.thumbnails), written by ensure_avatar_thumbs().
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
+
+    objects = CustomUserManager()
+
     class Meta:
+        # community.directory pages through members along these (keyset).
         indexes = [
             models.Index(fields=["public", "date_joined"], name="accounts_public_date_idx"),
             models.Index(fields=["public", "last_login"], name="accounts_public_last_idx"),
+            models.Index(fields=["public", "popularity_score"], name="accounts_public_pop_idx"),
+            # Directory filters: a known city (newest activity first), gender
+            # with an age range, and an age range alone.
+            models.Index(fields=["public", "city_ref", "last_login"], name="accounts_public_city_idx"),
+            models.Index(fields=["public", "gender", "age"], name="accounts_public_gender_age_idx"),
+            models.Index(fields=["public", "age"], name="accounts_public_age_idx"),
+        ]
+        # Case-insensitive uniqueness; the LOWER() indexes also serve
+        # accounts.services.find_user_by_identifier().
+        constraints = [
+            models.UniqueConstraint(Lower("username"), name="accounts_username_ci_uniq"),
+            models.UniqueConstraint(Lower("email"), name="accounts_email_ci_uniq"),
         ]
 
     # ✅ Fix conflicts with Django auth.User model
@@ -54,20 +102,26 @@ class CustomUser(AbstractUser):
         if not self.avatar or not getattr(self.avatar, "name", ""):
             return default_static
 
-        try:
-            # Be defensive: don't return a URL to a missing file.
-            if hasattr(self.avatar, "storage") and hasattr(self.avatar.storage, "exists"):
-                if not self.avatar.storage.exists(self.avatar.name):
-                    return default_static
-        except Exception:
-            return default_static
+        manifest = thumbnails.current_manifest(self.thumbnails, self.avatar.name, thumbnails.AVATAR)
+        if manifest is not None:
+            # The thumbnail generator already checked the original for us.
+            if manifest.get("missing"):
+                return default_static
+        else:
+            try:
+                # Be defensive: don't return a URL to a missing file.
+                if hasattr(self.avatar, "storage") and hasattr(self.avatar.storage, "exists"):
+                    if not self.avatar.storage.exists(self.avatar.name):
+                        return default_static
+            except Exception:
+                return default_static
 
         try:
             return self.avatar.url
         except Exception:
             return default_static
 
-    def _avatar_thumb_storage_name(self, size: int) -> str:
+    def _avatar_thumb_storage_name(self, size: int, ext: str = "webp") -> str:
         avatar_name = (getattr(self.avatar, "name", "") or "").strip()
         if not avatar_name:
             return ""
@@ -76,83 +130,113 @@ class CustomUser(AbstractUser):
         if base.startswith("avatars/"):
             base = base[len("avatars/"):]
 
-        return f"avatars/thumbs/{base}__{size}.webp"
-
-    def _generate_avatar_thumb(self, size: int) -> None:
-        if not self.avatar or not getattr(self.avatar, "name", ""):
-            return
+        return f"avatars/thumbs/{base}__{size}.{ext}"
 
-        # Don't generate thumbs for the default placeholder.
-        if self.avatar.name == "avatars/default.jpg":
+    def ensure_avatar_thumbs(self, force: bool = False) -> None:
+        """Generate avatar variants (see ``thumbnails.AVATAR``) and record them in ``self.thumbnails``."""
+        source = (getattr(self.avatar, "name", "") or "") if self.avatar else ""
+        if not source:
             return
 
-        thumb_name = self._avatar_thumb_storage_name(size)
-        if not thumb_name:
+        manifest = thumbnails.current_manifest(self.thumbnails, source, thumbnails.AVATAR)
+        if manifest is not None and not force:
             return
 
-        if default_storage.exists(thumb_name):
+        # Don't generate thumbs for the default placeholder (or a missing original).
+        exists = default_storage.exists(source)
+        if source == "avatars/default.jpg" or not exists:
+            manifest = thumbnails.build_manifest(source, {}, thumbnails.AVATAR, missing=not exists)
+            thumbnails.replace_manifest(self, manifest)
             return
 
-        # Ensure the original exists.
-        if not default_storage.exists(self.avatar.name):
-            return
-
-        with default_storage.open(self.avatar.name, "rb") as fh:
-            img = Image.open(fh)
-            img = ImageOps.exif_transpose(img)
-
-            if img.mode not in ("RGB", "RGBA"):
-                img = img.convert("RGBA")
+        variants = thumbnails.generate(source, thumbnails.AVATAR, self._avatar_thumb_storage_name)
+        thumbnails.replace_manifest(self, thumbnails.build_manifest(source, variants, thumbnails.AVATAR))
 
-            thumb = ImageOps.fit(img, (size, size), method=Image.Resampling.LANCZOS)
+    def thumbnails_outdated(self) -> bool:
+        source = (getattr(self.avatar, "name", "") or "") if self.avatar else ""
+        return bool(source) and thumbnails.current_manifest(self.thumbnails, source, thumbnails.AVATAR) is None
 
-            buf = io.BytesIO()
-            try:
-                thumb.save(buf, format="WEBP", quality=78, method=6)
-                content = ContentFile(buf.getvalue())
-                default_storage.save(thumb_name, content)
-            except Exception:
-                # Fallback if WebP isn't available in the runtime.
-                buf = io.BytesIO()
-                if thumb.mode == "RGBA":
-                    thumb = thumb.convert("RGB")
-                thumb.save(buf, format="JPEG", quality=82, optimize=True, progressive=True)
-                fallback_name = thumb_name[:-5] + ".jpg"
-                default_storage.save(fallback_name, ContentFile(buf.getvalue()))
-
-    def ensure_avatar_thumbs(self) -> None:
-        # Sizes chosen to match common render sizes (100px avatars and ~261px cards).
-        self._generate_avatar_thumb(100)
-        self._generate_avatar_thumb(320)
+    def _avatar_thumb_url(self, size: int) -> str:
+        default_static = "/static/images/default-avatar.svg"
+        source = (getattr(self.avatar, "name", "") or "") if self.avatar else ""
+        url = thumbnails.variant_url(self.thumbnails, source, thumbnails.AVATAR, size, fmt="webp")
+        return url or self.avatar_url() or default_static
 
     def avatar_thumb_100_url(self):
-        default_static = "/static/images/default-avatar.svg"
-        thumb = self._avatar_thumb_storage_name(100)
-        if thumb and default_storage.exists(thumb):
-            return default_storage.url(thumb)
-        jpg = thumb[:-5] + ".jpg" if thumb else ""
-        if jpg and default_storage.exists(jpg):
-            return default_storage.url(jpg)
-        return self.avatar_url() or default_static
+        return self._avatar_thumb_url(100)
 
     def avatar_thumb_320_url(self):
-        default_static = "/static/images/default-avatar.svg"
-        thumb = self._avatar_thumb_storage_name(320)
-        if thumb and default_storage.exists(thumb):
-            return default_storage.url(thumb)
-        jpg = thumb[:-5] + ".jpg" if thumb else ""
-        if jpg and default_storage.exists(jpg):
-            return default_storage.url(jpg)
-        return self.avatar_url() or default_static
+        return self._avatar_thumb_url(320)
+
+    def avatar_picture(self):
+        """``<picture>`` data for the ``{% picture %}`` template tag."""
+        source = (getattr(self.avatar, "name", "") or "") if self.avatar else ""
+        return thumbnails.picture(self.thumbnails, source, thumbnails.AVATAR, self.avatar_url())
+
+    def _set_scram_verifiers(self, raw_password):
+        if not raw_password:
+            self.scram_verifiers = ""
+        else:
+            self.scram_verifiers = scram.encrypt_verifiers(scram.make_verifiers(raw_password))
+
+    def set_password(self, raw_password):
+        super().set_password(raw_password)
+        self._set_scram_verifiers(raw_password)
+
+    def set_unusable_password(self):
+        super().set_unusable_password()
+        # Otherwise the old IRC password would keep authenticating.
+        self.scram_verifiers = ""
+
+    def scram_verifiers_for_login(self, raw_password):
+        """Stored SCRAM verifiers, derived from ``raw_password`` only when missing or outdated.
+
+        ``raw_password`` must already have been checked against this account.
+        """
+        verifiers = scram.decrypt_verifiers(self.scram_verifiers)
+        if scram.is_current(verifiers):
+            return verifiers
+
+        verifiers = hashing.submit(scram.make_verifiers, raw_password)
+        self.scram_verifiers = scram.encrypt_verifiers(verifiers)
+        type(self).objects.filter(pk=self.pk).update(scram_verifiers=self.scram_verifiers)
+        return verifiers
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Remember the loaded username and city so a rename also drops the old
+        # avatar cache entry and a new city is resolved again (without forcing
+        # a query when the fields are deferred).
+        self._loaded_username = self.__dict__.get("username")
+        self._loaded_city = self.__dict__.get("city")
 
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if self.__dict__.get("email") == "":
+            self.email = None
+        if update_fields is not None and "password" in update_fields and "scram_verifiers" not in update_fields:
+            kwargs["update_fields"] = [*update_fields, "scram_verifiers"]
+        if "city" in self.__dict__ and (update_fields is None or "city" in update_fields):
+            if self.city != self._loaded_city or (self.city and self.city_ref_id is None):
+                city = City.resolve(self.city)
+                self.city_ref_id = city.pk if city else None
+                if update_fields is not None and "city_ref" not in update_fields:
+                    kwargs["update_fields"] = [*kwargs["update_fields"], "city_ref"]
         super().save(*args, **kwargs)
-        try:
-            self.ensure_avatar_thumbs()
-        except Exception:
-            # Never fail user saves due to thumbnail generation.
-            pass
+        self._loaded_city = self.__dict__.get("city", self._loaded_city)
+        if update_fields is None or {"username", "avatar", "public"} & set(update_fields):
+            avatars.invalidate(self._loaded_username, self.username)
+            self._loaded_username = self.username
+        if self.thumbnails_outdated():
+            # Decoding and resizing happen in a django-rq job, not in the request.
+            thumbnails.schedule_generation("accounts.tasks.generate_avatar_thumbs", self.pk)
     
+    def delete(self, *args, **kwargs):
+        usernames = (self._loaded_username, self.username)
+        result = super().delete(*args, **kwargs)
+        avatars.invalidate(*usernames)
+        return result
+
     @property
     def avatar_tag(self):
             """Show avatar in Django Admin."""
@@ -164,7 +248,12 @@ class CustomUser(AbstractUser):
 
 
 class IrcAppPassword(models.Model):
+    # Tokens are "<selector><secret>": the selector is stored in clear and
+    # indexed so a login attempt checks exactly one hash.
+    SELECTOR_LENGTH = 12
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="irc_app_passwords")
+    selector = models.CharField(max_length=SELECTOR_LENGTH, unique=True, null=True, blank=True)
     password = models.CharField(max_length=256)
     created_at = models.DateTimeField(auto_now_add=True)
     last_used = models.DateTimeField(null=True, blank=True)
@@ -173,7 +262,85 @@ class IrcAppPassword(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=["user", "revoked_at"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"IRC app password for {self.user_id}"
+
+    @staticmethod
+    def ttl_seconds() -> int:
+        ttl = getattr(settings, "IRC_APP_PASSWORD_TTL_SECONDS", 120)
+        try:
+            ttl = int(ttl)
+        except Exception:
+            ttl = 120
+        return min(max(ttl, 10), 24 * 60 * 60)
+
+    @classmethod
+    def usable_cutoff(cls):
+        return now() - timedelta(seconds=cls.ttl_seconds())
+
+    @classmethod
+    def issue(cls, user):
+        """Create a new app password for ``user`` and return ``(instance, plain_token)``."""
+        selector = secrets.token_hex(cls.SELECTOR_LENGTH // 2)
+        secret = secrets.token_urlsafe(24)
+        instance = cls.objects.create(user=user, selector=selector, password=make_password(secret))
+        return instance, f"{selector}{secret}"
+
+    @classmethod
+    def split_token(cls, token):
+        """Return ``(selector, secret)`` for a well-formed token, else ``None``."""
+        if not isinstance(token, str) or len(token) <= cls.SELECTOR_LENGTH:
+            return None
+        selector, secret = token[:cls.SELECTOR_LENGTH], token[cls.SELECTOR_LENGTH:]
+        if any(ch not in "0123456789abcdef" for ch in selector):
+            return None
+        return selector, secret
+
+
+class EmailDelivery(models.Model):
+    """A transactional email waiting for (or done with) the worker in accounts.emails."""
+
+    KIND_VERIFICATION = "verification"
+    KIND_PASSWORD_RESET = "password_reset"
+    KIND_CHOICES = [
+        (KIND_VERIFICATION, "Email verification"),
+        (KIND_PASSWORD_RESET, "Password reset"),
+    ]
+
+    STATUS_QUEUED = "queued"
+    STATUS_SENDING = "sending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_SENDING, "Sending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name="email_deliveries"
+    )
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    # Holds codes and reset links, so it is cleared once the message is sent.
+    body = models.TextField(blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.CharField(max_length=255, blank=True)
+    next_attempt_at = models.DateTimeField(default=now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["user", "kind", "created_at"]),
         ]
 
     def __str__(self):
-        return f"IRC app password for {self.user_id}"
\ No newline at end of file
+        return f"{self.kind} email to {self.to_email} ({self.status})"
@@ -0,0 +1,316 @@
+"""Account lookup and registration shared by the HTML views and the JSON API.
+
+Usernames and emails are matched case-insensitively through
+:func:`find_user_by_identifier`, which filters on ``LOWER(column)`` so the
+functional unique indexes on ``CustomUser`` are used.
+
+Registration callers hand over plain values and file objects; nothing is
+re-encoded on the way. Avatars are checked from their header and verified
+without decoding pixel data, so an upload is never held in memory more than
+once.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import logging
+from typing import Optional, Sequence
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.validators import EmailValidator
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.utils.dateparse import parse_date
+from PIL import Image
+
+from accounts import hashing
+from accounts.utils import issue_email_verification_code, verify_recaptcha
+
+
+logger = logging.getLogger("accounts.auth_api")
+
+# Pillow format -> stored file extension.
+AVATAR_FORMATS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+
+
+class RegistrationError(Exception):
+    """A registration that cannot go ahead; ``message`` is shown to the user."""
+
+    def __init__(self, message: str, status: int = 400, details=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.details = details
+
+
+class AccountError(Exception):
+    """A refused login or account change; ``message`` is shown to the user."""
+
+    def __init__(self, message: str, status: int = 400, code: Optional[str] = None, field: Optional[str] = None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.code = code
+        self.field = field
+
+
+def find_user_by_identifier(identifier, fields: Sequence[str] = ("username", "email"), queryset=None):
+    """First user whose ``fields`` (tried in order) equal ``identifier``, ignoring case."""
+
+    value = (identifier or "").strip().lower()
+    if not value:
+        return None
+    if queryset is None:
+        queryset = get_user_model().objects.all()
+    for field in fields:
+        user = queryset.annotate(_identifier=Lower(field)).filter(_identifier=value).first()
+        if user is not None:
+            return user
+    return None
+
+
+def identifier_taken(field: str, value, exclude_pk=None) -> bool:
+    value = (value or "").strip().lower()
+    if not value:
+        return False
+    queryset = get_user_model().objects.annotate(_identifier=Lower(field)).filter(_identifier=value)
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    return queryset.exists()
+
+
+def avatar_max_bytes() -> int:
+    return getattr(settings, "AVATAR_MAX_UPLOAD_SIZE", 2 * 1024 * 1024)
+
+
+def check_avatar(fileobj):
+    """Validate an uploaded avatar and return it renamed after its real format.
+
+    Only the image header is parsed and ``verify()`` walks the file without
+    allocating pixels; dimensions above ``AVATAR_MAX_PIXELS`` are rejected
+    before anything is decoded.
+    """
+
+    max_bytes = avatar_max_bytes()
+    size = getattr(fileobj, "size", None)
+    if max_bytes and size is not None and size > max_bytes:
+        raise RegistrationError("Avatar trop volumineux.")
+
+    content_type = getattr(fileobj, "content_type", "") or ""
+    if content_type and not content_type.startswith("image/"):
+        raise RegistrationError("Avatar invalide.")
+
+    max_pixels = getattr(settings, "AVATAR_MAX_PIXELS", 4096 * 4096)
+    try:
+        fileobj.seek(0)
+        with Image.open(fileobj) as img:
+            if img.format not in AVATAR_FORMATS:
+                raise RegistrationError("Avatar invalide.")
+            width, height = img.size
+            if max_pixels and width * height > max_pixels:
+                raise RegistrationError("Avatar trop grand.")
+            ext = AVATAR_FORMATS[img.format]
+            img.verify()
+    except RegistrationError:
+        raise
+    except Exception:
+        raise RegistrationError("Avatar invalide.") from None
+
+    fileobj.seek(0)
+    fileobj.name = f"avatar.{ext}"
+    return fileobj
+
+
+def avatar_from_data_url(data_url: str) -> Optional[ContentFile]:
+    """Decode a ``data:image/...;base64,`` avatar sent by JSON API clients."""
+
+    if not data_url:
+        return None
+    if not isinstance(data_url, str) or not data_url.startswith("data:") or ";base64," not in data_url:
+        raise RegistrationError("Avatar invalide.")
+
+    header, b64data = data_url.split(";base64,", 1)
+    if not header[5:].strip().lower().startswith("image/"):
+        raise RegistrationError("Avatar invalide.")
+
+    # Refuse oversized payloads before decoding them.
+    max_bytes = avatar_max_bytes()
+    if max_bytes and len(b64data) > (max_bytes + 2) // 3 * 4:
+        raise RegistrationError("Avatar trop volumineux.")
+    try:
+        raw = base64.b64decode(b64data, validate=True)
+    except (binascii.Error, ValueError):
+        raise RegistrationError("Avatar invalide.") from None
+
+    return ContentFile(raw, name="avatar")
+
+
+def register_user(
+    *,
+    username,
+    email,
+    password1,
+    password2,
+    birthday=None,
+    gender="",
+    city="",
+    recaptcha_token=None,
+    avatar=None,
+):
+    """Create an unverified account and send its email confirmation code.
+
+    ``avatar`` is an (unchecked) file object. Raises :class:`RegistrationError`
+    for invalid input and :class:`accounts.hashing.HashingPoolBusy` when the
+    password cannot be hashed right now.
+    """
+
+    CustomUser = get_user_model()
+
+    username = (username or "").strip()
+    email = (email or "").strip().lower()
+    gender = (gender or "").strip()
+    city = (city or "").strip()
+
+    if not username or not email or not password1 or not password2:
+        raise RegistrationError("Champs requis manquants.")
+
+    try:
+        EmailValidator()(email)
+    except ValidationError:
+        raise RegistrationError("Email invalide.") from None
+
+    # Validate username using model field validators.
+    try:
+        CustomUser._meta.get_field("username").run_validators(username)
+    except ValidationError:
+        raise RegistrationError("Nom d'utilisateur invalide.") from None
+
+    if password1 != password2:
+        raise RegistrationError("Passwords do not match")
+
+    try:
+        validate_password(password1)
+    except ValidationError as ve:
+        raise RegistrationError("Mot de passe trop faible.", details=list(ve.messages)) from None
+
+    birthday_date = None
+    if birthday:
+        birthday_date = parse_date(str(birthday))
+        if not birthday_date:
+            raise RegistrationError("Date de naissance invalide.")
+
+    if avatar is not None:
+        avatar = check_avatar(avatar)
+
+    is_valid, recaptcha_error = verify_recaptcha(recaptcha_token)
+    if not is_valid:
+        raise RegistrationError(f"reCAPTCHA failed: {recaptcha_error}")
+
+    if identifier_taken("username", username):
+        raise RegistrationError("Username already exists")
+    if identifier_taken("email", email):
+        raise RegistrationError("Email already registered")
+    if gender not in ["M", "F"]:
+        raise RegistrationError("Invalid gender")
+
+    user = CustomUser(
+        username=CustomUser.normalize_username(username),
+        email=CustomUser.objects.normalize_email(email),
+        age=birthday_date,
+        gender=gender,
+        city=city,
+        # New accounts must verify email before login.
+        email_verified=False,
+    )
+    hashing.set_password(user, password1)
+    if avatar is not None:
+        # Streamed from the upload (or its temporary file) into storage on save.
+        user.avatar = avatar
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        # Lost a race with a concurrent signup (see the unique constraints on CustomUser).
+        taken = "Username already exists" if identifier_taken("username", username) else "Email already registered"
+        raise RegistrationError(taken) from None
+
+    try:
+        issue_email_verification_code(user)
+    except ValidationError as ve:
+        logger.warning("register email_issue validation_error user_id=%s email=%r err=%s", user.pk, user.email, ve)
+        raise RegistrationError(
+            "Compte créé, mais l'envoi du code est temporairement limité. Réessayez bientôt.",
+            status=429,
+        ) from None
+    except Exception:
+        logger.exception("register email_issue failed user_id=%s email=%r", user.pk, user.email)
+        raise RegistrationError(
+            "Compte créé, mais impossible d'envoyer l'email de confirmation. "
+            "Veuillez réessayer plus tard ou contacter le support.",
+            status=500,
+        ) from None
+
+    return user
+
+
+def login_user(identifier, password):
+    """The verified user ``identifier`` (username or email) logs in as.
+
+    Raises :class:`AccountError` (with a ``code`` and the offending
+    ``field``) or :class:`accounts.hashing.HashingPoolBusy`. Callers apply
+    their own throttling and open the session or issue tokens.
+    """
+
+    identifier = (identifier or "").strip()
+    if not identifier or not password:
+        raise AccountError("Champs requis manquants.", code="missing_fields")
+
+    candidate = find_user_by_identifier(identifier)
+    if candidate is None:
+        raise AccountError("Nom d'utilisateur ou email inconnu.", code="unknown_user", field="username")
+
+    user = hashing.authenticate(candidate, password)
+    if not user:
+        raise AccountError("Mot de passe incorrect.", code="bad_password", field="password")
+    if not getattr(user, "email_verified", False):
+        raise AccountError(
+            "Veuillez confirmer votre email avant de vous connecter.",
+            status=403,
+            code="email_unverified",
+        )
+    return user
+
+
+def change_password(user, old_password, new_password) -> None:
+    """Raises :class:`AccountError` or :class:`accounts.hashing.HashingPoolBusy`."""
+
+    if not hashing.check_password(user, old_password):
+        raise AccountError("Incorrect old password")
+    hashing.set_password(user, new_password)
+    user.save()
+
+
+def change_email(user, new_email) -> None:
+    """Raises :class:`AccountError` when ``new_email`` is invalid or belongs to another account."""
+
+    new_email = (new_email or "").strip()
+    try:
+        EmailValidator()(new_email)
+    except ValidationError:
+        raise AccountError("Email invalide.") from None
+    # Changing only the case of one's own address is allowed.
+    if identifier_taken("email", new_email, exclude_pk=user.pk):
+        raise AccountError("Email already in use")
+
+    user.email = get_user_model().objects.normalize_email(new_email)
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        # Lost a race with another account taking the address.
+        raise AccountError("Email already in use") from None
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+import django_rq
+
+from .models import IrcAppPassword
+
+
+def purge_irc_app_passwords() -> int:
+    """Delete IRC app passwords that can no longer be used (expired or revoked)."""
+    deleted, _ = IrcAppPassword.objects.filter(
+        Q(created_at__lt=IrcAppPassword.usable_cutoff()) | Q(revoked_at__isnull=False)
+    ).delete()
+    return deleted
+
+
+def enqueue_purge_irc_app_passwords() -> str:
+    queue = django_rq.get_queue("default")
+    job = queue.enqueue(purge_irc_app_passwords)
+    return job.id
+
+
+def send_queued_emails() -> dict:
+    """Send one batch of due transactional emails (see accounts.emails)."""
+    from .emails import deliver_due
+
+    return deliver_due()
+
+
+def enqueue_send_queued_emails() -> str:
+    queue = django_rq.get_queue(getattr(settings, "EMAIL_QUEUE", "default"))
+    job = queue.enqueue(send_queued_emails)
+    return job.id
+
+
+def generate_avatar_thumbs(user_id: int, force: bool = False) -> bool:
+    user = get_user_model().objects.filter(pk=user_id).only("id", "avatar", "thumbnails").first()
+    if user is None:
+        return False
+    user.ensure_avatar_thumbs(force=force)
+    # The manifest is stored with update(), which the directory sync never sees.
+    from community.directory import sync_member
+
+    sync_member(user.pk)
+    return True
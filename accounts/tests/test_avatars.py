@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from accounts import avatars
+from main import ratelimit
+
+
+class AvatarResolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.dave = User.objects.create_user(username="Dave", email="dave@example.com", password="s3cret-pass")
+        User.objects.filter(pk=self.dave.pk).update(avatar="avatars/dave.png")
+        User.objects.create_user(username="hidden", email="hidden@example.com", password="s3cret-pass", public=False)
+
+    def test_bulk_lookup_is_cached_including_misses(self):
+        url = reverse("api_get_avatars") + "?accounts=dave,hidden,nobody"
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("max-age=", first["Cache-Control"])
+        result = first.json()["avatars"]
+        self.assertEqual(set(result), {"dave", "hidden", "nobody"})
+        self.assertIsNone(result["hidden"])
+        self.assertIsNone(result["nobody"])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json()["avatars"], result)
+
+    def test_saving_the_user_invalidates_its_entry(self):
+        avatars.resolve("DAVE")
+        with self.assertNumQueries(0):
+            avatars.resolve("dave")
+        self.dave.public = False
+        self.dave.save(update_fields=["public"])
+        with self.assertNumQueries(1):
+            avatars.resolve("dave")
+
+    def test_too_many_accounts_is_rejected(self):
+        response = self.client.post(
+            reverse("api_get_avatars"),
+            data={"accounts": [f"nick{i}" for i in range(101)]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_lookup_is_throttled(self):
+        with mock.patch.dict(ratelimit.ScopedThrottle.FALLBACK_RATES, {"avatars": "2/min"}):
+            codes = [self.client.get(reverse("api_get_avatars") + "?accounts=dave").status_code for _ in range(3)]
+        self.assertEqual(codes, [200, 200, 429])
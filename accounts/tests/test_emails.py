@@ -0,0 +1,63 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts import emails
+from accounts.models import EmailDelivery
+from accounts.utils import issue_email_verification_code
+
+
+@override_settings(EMAIL_QUEUE_ASYNC=False, THUMBNAILS_ASYNC=False, EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class EmailQueueTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="oscar", email="oscar@example.com", password="s3cret-pass"
+        )
+
+    def test_verification_code_is_sent_after_commit_and_body_cleared(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            code = issue_email_verification_code(self.user)
+        self.assertEqual(len(mail.outbox), 0)
+        delivery = EmailDelivery.objects.get(user=self.user)
+        self.assertEqual(delivery.status, EmailDelivery.STATUS_QUEUED)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(code, mail.outbox[0].body)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, EmailDelivery.STATUS_SENT)
+        self.assertEqual(delivery.body, "")
+
+    def test_batch_shares_one_connection(self):
+        for i in range(3):
+            EmailDelivery.objects.create(user=self.user, kind="verification", to_email=f"u{i}@example.com", subject="s", body="b")
+        with mock.patch.object(EmailBackend, "open", autospec=True, return_value=True) as opened:
+            counts = emails.deliver_due()
+        self.assertEqual(counts, {"sent": 3, "retry": 0, "failed": 0})
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+
+    @override_settings(EMAIL_QUEUE_MAX_ATTEMPTS=2, EMAIL_QUEUE_RETRY_BASE_SECONDS=30)
+    def test_failures_back_off_then_give_up(self):
+        delivery = EmailDelivery.objects.create(user=self.user, kind="verification", to_email="x@example.com", subject="s", body="b")
+        with mock.patch.object(EmailBackend, "send_messages", side_effect=OSError("relay down")):
+            with self.captureOnCommitCallbacks(execute=False):
+                self.assertEqual(emails.deliver_due()["retry"], 1)
+            delivery.refresh_from_db()
+            self.assertEqual(delivery.status, EmailDelivery.STATUS_QUEUED)
+            self.assertGreater(delivery.next_attempt_at, timezone.now() + timezone.timedelta(seconds=25))
+            self.assertIn("relay down", delivery.last_error)
+
+            # Not due yet.
+            self.assertEqual(emails.deliver_due(), {"sent": 0, "retry": 0, "failed": 0})
+
+            EmailDelivery.objects.filter(pk=delivery.pk).update(next_attempt_at=timezone.now())
+            self.assertEqual(emails.deliver_due()["failed"], 1)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, EmailDelivery.STATUS_FAILED)
+        self.assertEqual(delivery.attempts, 2)
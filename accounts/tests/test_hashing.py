@@ -0,0 +1,59 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from accounts import hashing
+
+
+class HashingPoolTests(SimpleTestCase):
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_MAX_QUEUE=0, PASSWORD_HASHING_TIMEOUT=5)
+    def test_saturated_pool_rejects_immediately(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return "done"
+
+        results = []
+        worker = threading.Thread(target=lambda: results.append(hashing.submit(slow)))
+        worker.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(hashing.HashingPoolBusy):
+                hashing.submit(lambda: None)
+        finally:
+            release.set()
+            worker.join(5)
+        self.assertEqual(results, ["done"])
+        self.assertEqual(hashing.submit(lambda: "free again"), "free again")
+
+    @override_settings(PASSWORD_HASHING_WORKERS=0)
+    def test_zero_workers_hashes_inline(self):
+        self.assertEqual(hashing.submit(threading.current_thread), threading.current_thread())
+
+
+class HashingBusyResponseTests(TestCase):
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_MAX_QUEUE=0, PASSWORD_HASHING_TIMEOUT=0.01)
+    def test_login_api_returns_503_when_hashing_times_out(self):
+        get_user_model().objects.create_user(username="bob", email="bob@example.com", password="s3cret-pass")
+        release = threading.Event()
+        self.addCleanup(release.set)
+        original = hashing.hashers.check_password
+
+        def stuck(*args, **kwargs):
+            release.wait(5)
+            return original(*args, **kwargs)
+
+        with mock.patch.object(hashing.hashers, "check_password", stuck):
+            resp = self.client.post(
+                reverse("api_login"),
+                data={"username": "bob", "password": "s3cret-pass"},
+                content_type="application/json",
+            )
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.json()["code"], "busy")
+        self.assertEqual(resp["Retry-After"], "1")
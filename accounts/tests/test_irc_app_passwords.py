@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import IrcAppPassword
+from accounts.tasks import purge_irc_app_passwords
+
+
+@override_settings(IRC_API_TOKEN=None)
+class IrcAppPasswordTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="carol", email="carol@example.com", password="s3cret-pass")
+        User.objects.filter(pk=self.user.pk).update(email_verified=True)
+
+    def _login(self, password):
+        resp = self.client.post(reverse("api_login_token"), data={"username": "carol", "password": password})
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_token_embeds_its_selector_and_is_single_use(self):
+        app_pw, plain = IrcAppPassword.issue(self.user)
+        self.assertTrue(plain.startswith(app_pw.selector))
+        self.assertIn("access_token", self._login(plain))
+        self.assertIn("error", self._login(plain))
+
+    def test_wrong_secret_for_a_known_selector_is_rejected(self):
+        app_pw, plain = IrcAppPassword.issue(self.user)
+        self.assertIn("error", self._login(app_pw.selector + "x" * 32))
+        app_pw.refresh_from_db()
+        self.assertIsNone(app_pw.revoked_at)
+
+    def test_purge_removes_only_unusable_rows(self):
+        active, _ = IrcAppPassword.issue(self.user)
+        expired, _ = IrcAppPassword.issue(self.user)
+        revoked, _ = IrcAppPassword.issue(self.user)
+        IrcAppPassword.objects.filter(pk=expired.pk).update(created_at=timezone.now() - timedelta(days=2))
+        IrcAppPassword.objects.filter(pk=revoked.pk).update(revoked_at=timezone.now())
+
+        self.assertEqual(purge_irc_app_passwords(), 2)
+        self.assertEqual(list(IrcAppPassword.objects.values_list("pk", flat=True)), [active.pk])
@@ -0,0 +1,138 @@
+import base64
+import io
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from accounts import services
+
+
+def _png_bytes(size=(64, 64)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (20, 120, 40)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _form(**overrides):
+    data = {
+        "username": "nadia",
+        "email": "nadia@example.com",
+        "password1": "Un-mot-de-passe-solide-42",
+        "password2": "Un-mot-de-passe-solide-42",
+        "birthday": "1990-05-04",
+        "gender": "F",
+        "city": "Lyon",
+    }
+    data.update(overrides)
+    return data
+
+
+@override_settings(THUMBNAILS_ASYNC=False)
+@mock.patch("accounts.services.issue_email_verification_code")
+@mock.patch("accounts.services.verify_recaptcha", return_value=(True, None))
+class RegisterUserTests(TestCase):
+    def test_form_upload_is_stored_under_its_detected_format(self, _recaptcha, issue_code):
+        # Served as "image/jpeg" with a misleading name; stored as PNG.
+        upload = SimpleUploadedFile("photo.jpg", _png_bytes(), content_type="image/jpeg")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("register"), data={**_form(), "avatar": upload}, secure=True)
+
+        self.assertRedirects(response, reverse("verify_email"), fetch_redirect_response=False)
+        user = get_user_model().objects.get(username="nadia")
+        self.assertTrue(user.avatar.name.startswith("avatars/avatar"))
+        self.assertTrue(user.avatar.name.endswith(".png"))
+        self.assertTrue(user.check_password("Un-mot-de-passe-solide-42"))
+        issue_code.assert_called_once_with(user)
+
+    def test_invalid_avatar_is_rejected_before_the_account_exists(self, _recaptcha, _issue):
+        upload = SimpleUploadedFile("avatar.png", b"not an image", content_type="image/png")
+        with self.assertRaisesMessage(services.RegistrationError, "Avatar invalide."):
+            services.register_user(**_form(), avatar=upload)
+        self.assertFalse(get_user_model().objects.filter(username="nadia").exists())
+
+        with override_settings(AVATAR_MAX_PIXELS=100):
+            upload = SimpleUploadedFile("avatar.png", _png_bytes(), content_type="image/png")
+            with self.assertRaisesMessage(services.RegistrationError, "Avatar trop grand."):
+                services.register_user(**_form(), avatar=upload)
+
+    def test_api_accepts_data_url_avatars(self, _recaptcha, _issue):
+        data_url = "data:image/png;base64," + base64.b64encode(_png_bytes()).decode("ascii")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("api_register"),
+                data={**_form(), "avatar_data_url": data_url},
+                content_type="application/json",
+                secure=True,
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(get_user_model().objects.get(username="nadia").avatar.name.endswith(".png"))
+
+        response = self.client.post(
+            reverse("api_register"),
+            data=_form(username="other", email="other@example.com", password2="different-Password-1"),
+            content_type="application/json",
+            secure=True,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Passwords do not match")
+
+
+@override_settings(THUMBNAILS_ASYNC=False)
+class IdentifierLookupTests(TestCase):
+    def test_lookup_and_uniqueness_ignore_case(self):
+        user = get_user_model().objects.create_user(username="Paula", email="Paula@Example.com", password="s3cret-pass")
+        self.assertEqual(services.find_user_by_identifier("paula"), user)
+        self.assertEqual(services.find_user_by_identifier(" PAULA@example.COM "), user)
+        self.assertIsNone(services.find_user_by_identifier("paula", fields=("email",)))
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            get_user_model().objects.create_user(username="PAULA", email="other@example.com", password="s3cret-pass")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            get_user_model().objects.create_user(username="paula2", email="paula@example.COM", password="s3cret-pass")
+        # Blank emails are stored as NULL, which the email constraint ignores.
+        get_user_model().objects.create_user(username="nomail1", email="", password="s3cret-pass")
+        get_user_model().objects.create_user(username="nomail2", email="", password="s3cret-pass")
+        self.assertEqual(get_user_model().objects.filter(email__isnull=True).count(), 2)
+
+    def test_change_email_allows_a_new_case_but_not_another_account(self):
+        User = get_user_model()
+        user = User.objects.create_user(username="ines", email="ines@example.com", password="s3cret-pass")
+        User.objects.create_user(username="jade", email="jade@example.com", password="s3cret-pass")
+
+        services.change_email(user, "Ines@Example.com")
+        self.assertEqual(User.objects.get(pk=user.pk).email, "Ines@example.com")
+        with self.assertRaisesMessage(services.AccountError, "Email already in use"):
+            services.change_email(user, "JADE@example.com")
+
+
+@override_settings(THUMBNAILS_ASYNC=False)
+class LoginFormTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        user = User.objects.create_user(username="rosa", email="rosa@example.com", password="s3cret-pass")
+        User.objects.filter(pk=user.pk).update(email_verified=True)
+
+    def _login(self, ip, password="s3cret-pass"):
+        self.client.logout()
+        return self.client.post(
+            reverse("login"),
+            data={"username": "Rosa", "password": password},
+            HTTP_ACCEPT="application/json",
+            REMOTE_ADDR=ip,
+        )
+
+    def test_form_logins_are_throttled_per_client(self):
+        from main import ratelimit
+
+        with mock.patch.dict(ratelimit.ScopedThrottle.THROTTLE_RATES, {"login": "2/min"}):
+            codes = [self._login("203.0.113.1", password="wrong").status_code for _ in range(3)]
+            other = self._login("203.0.113.2")
+        self.assertEqual(codes, [400, 400, 429])
+        self.assertEqual(other.status_code, 200)
+        self.assertEqual(other.json()["username"], "rosa")
+        self.assertIn("access_token", self.client.session)
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts import scram
+
+
+@override_settings(IRC_API_TOKEN=None)
+class LoginTokenScramTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="s3cret-pass")
+        User.objects.filter(pk=self.user.pk).update(email_verified=True)
+
+    def _login(self):
+        resp = self.client.post(reverse("api_login_token"), data={"username": "alice", "password": "s3cret-pass"})
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_verifiers_are_stored_encrypted_when_password_is_set(self):
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.scram_verifiers)
+        self.assertNotIn("v=1", self.user.scram_verifiers)
+        self.assertTrue(scram.is_current(scram.decrypt_verifiers(self.user.scram_verifiers)))
+
+    def test_login_returns_stored_verifiers(self):
+        stored = scram.decrypt_verifiers(get_user_model().objects.get(pk=self.user.pk).scram_verifiers)
+        first, second = self._login(), self._login()
+        self.assertEqual(first["scram_sha512_verifier"], stored["sha512"])
+        self.assertEqual(second["scram_sha256_verifier"], stored["sha256"])
+
+    def test_legacy_user_is_upgraded_on_first_login(self):
+        get_user_model().objects.filter(pk=self.user.pk).update(scram_verifiers="")
+        data = self._login()
+        self.assertTrue(data["scram_sha512_verifier"].startswith("v=1,i=4096,"))
+        stored = scram.decrypt_verifiers(get_user_model().objects.get(pk=self.user.pk).scram_verifiers)
+        self.assertEqual(stored["sha512"], data["scram_sha512_verifier"])
+
+    def test_password_change_refreshes_verifiers(self):
+        before = get_user_model().objects.get(pk=self.user.pk).scram_verifiers
+        self.user.set_password("an0ther-pass")
+        self.user.save(update_fields=["password"])
+        after = get_user_model().objects.get(pk=self.user.pk).scram_verifiers
+        self.assertNotEqual(scram.decrypt_verifiers(before), scram.decrypt_verifiers(after))
+
+    def test_unusable_password_drops_verifiers(self):
+        self.user.set_unusable_password()
+        self.user.save(update_fields=["password"])
+        self.assertEqual(get_user_model().objects.get(pk=self.user.pk).scram_verifiers, "")
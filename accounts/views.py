@@ -3,21 +3,14 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 import logging
-from rest_framework.request import Request
-from django.contrib.auth import login, authenticate
-from rest_framework.test import APIRequestFactory  # Creates API-like requests
-from .api import register, login_api, change_password, change_email
+from django.contrib.auth import login
 from .models import CustomUser
 from django.contrib.auth import get_user_model
 from django.contrib.auth import logout
 from .forms import ProfileUpdateForm
 from django.http import JsonResponse
 from django.utils import timezone
-from django.contrib.auth.hashers import make_password
-import secrets
 from django.urls import reverse
-from django.core.mail import send_mail
-import base64
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.template.loader import render_to_string
@@ -26,15 +19,18 @@ from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
 from django.utils.http import url_has_allowed_host_and_scheme
 from typing import Optional
-from datetime import timedelta
 from django.core.validators import EmailValidator
 from django.utils.dateparse import parse_date
-from django.core.cache import cache
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 
-from .models import IrcAppPassword
+from main import ratelimit
+
+from . import emails, hashing, services
+from .models import EmailDelivery, IrcAppPassword
+from .tokens import get_tokens_for_user
 from .utils import issue_email_verification_code, verify_email_code
 
-factory = APIRequestFactory()
 CustomUser = get_user_model()
 
 logger = logging.getLogger(__name__)
@@ -45,64 +41,54 @@ def wants_json(request) -> bool:
     return "application/json" in accept
 
 
-def _encode_avatar_data_url(avatar):
-    if not avatar:
-        return None, None
+class _RegisterFormScope:
+    # Shares the "register" throttle bucket with the API endpoint.
+    throttle_scope = "register"
 
-    max_bytes = getattr(settings, "AVATAR_MAX_UPLOAD_SIZE", 2 * 1024 * 1024)
-    content_type = getattr(avatar, "content_type", "") or ""
-    if avatar.size and avatar.size > max_bytes:
-        return None, "Avatar trop volumineux."
-    if content_type and not content_type.startswith("image/"):
-        return None, "Avatar invalide."
 
-    try:
-        raw = avatar.read()
-        if max_bytes and len(raw) > max_bytes:
-            return None, "Avatar trop volumineux."
-        b64 = base64.b64encode(raw).decode("ascii")
-    except Exception:
-        return None, "Avatar invalide."
+class _LoginFormScope:
+    # Same "login" bucket as the API, keyed on the real client address.
+    throttle_scope = "login"
 
-    return f"data:{content_type};base64,{b64}", None
 
-# ✅ Register View (Calls `register` API Directly)
+# ✅ Register View (Calls the registration service directly)
+@csrf_exempt
 def register_view(request):
+    # Spool uploads to disk; the handlers must be set before the body is read,
+    # hence the CSRF check runs inside.
+    request.upload_handlers = [TemporaryFileUploadHandler(request)]
+    return _register_view(request)
+
+
+@csrf_protect
+def _register_view(request):
     if request.method == "POST":
-        avatar_file = request.FILES.get("avatar")
-        avatar_data_url, avatar_error = _encode_avatar_data_url(avatar_file)
-        if avatar_error:
-            messages.error(request, avatar_error)
+        if not ratelimit.ScopedThrottle().allow_request(request, _RegisterFormScope):
+            messages.error(request, "Trop de tentatives. Réessayez plus tard.")
             return render(request, "accounts/register.html")
 
-        payload = {
-            "username": request.POST.get("username"),
-            "email": request.POST.get("email"),
-            "password1": request.POST.get("password1"),
-            "password2": request.POST.get("password2"),
-            "birthday": request.POST.get("birthday"),
-            "gender": request.POST.get("gender"),
-            "city": request.POST.get("city"),
-            "g_recaptcha_response": request.POST.get("g_recaptcha_response") or request.POST.get("g-recaptcha-response"),
-        }
-        if avatar_data_url:
-            payload["avatar_data_url"] = avatar_data_url
-
-        api_request = factory.post(
-            "/accounts/api/register/",
-            data=payload,
-            format="json",
-        )
-        api_request = Request(api_request)
-
-        response = register(api_request)  # Call API function directly
-        data = response.data
-
-        if response.status_code == 201:
+        try:
+            services.register_user(
+                username=request.POST.get("username"),
+                email=request.POST.get("email"),
+                password1=request.POST.get("password1"),
+                password2=request.POST.get("password2"),
+                birthday=request.POST.get("birthday"),
+                gender=request.POST.get("gender"),
+                city=request.POST.get("city"),
+                recaptcha_token=request.POST.get("g_recaptcha_response") or request.POST.get("g-recaptcha-response"),
+                avatar=request.FILES.get("avatar"),
+            )
+        except services.RegistrationError as exc:
+            messages.error(request, exc.message)
+        except hashing.HashingPoolBusy:
+            messages.error(request, "Serveur occupé, réessayez dans un instant.")
+        except Exception:
+            logger.exception("register_view unexpected_error")
+            messages.error(request, "An error occurred during registration.")
+        else:
             messages.success(request, "Compte créé. Un code de confirmation a été envoyé à votre email.")
             return redirect("verify_email")
-        else:
-            messages.error(request, data.get("error", "An error occurred during registration."))
 
     return render(request, "accounts/register.html")
 
@@ -135,25 +121,20 @@ def login_view(request):
         username = (request.POST.get("username") or "").strip()
         password = request.POST.get("password")
 
-        # ✅ Call the API Directly Without Wrapping `Request`
-        api_request = factory.post(
-            "/accounts/api/login/",
-            data={"username": username, "password": password},
-            format="json",
-        )
-        response = login_api(api_request)
-        data = response.data
-
-        if response.status_code == 200:
-            resolved_username = data.get("username") or username
-
-            # ✅ Get user manually (Since `authenticate()` fails with API passwords)
+        if not ratelimit.ScopedThrottle().allow_request(request, _LoginFormScope):
+            error = services.AccountError("Trop de tentatives. Réessayez plus tard.", status=429, code="rate_limited")
+        else:
             try:
-                user = CustomUser.objects.get(username=resolved_username)
+                user = services.login_user(username, password)
+            except services.AccountError as exc:
+                error = exc
+            except hashing.HashingPoolBusy:
+                error = services.AccountError("Serveur occupé, réessayez dans un instant.", status=503, code="busy")
+            else:
                 login(request, user)  # ✅ Use Django session login
-                request.session["access_token"] = data["access_token"]
-                request.session["refresh_token"] = data["refresh_token"]
-
+                tokens = get_tokens_for_user(user)
+                request.session["access_token"] = tokens["access"]
+                request.session["refresh_token"] = tokens["refresh"]
                 redirect_url = get_safe_next_url() or reverse("profile", kwargs={"username": user.username})
                 if json_response:
                     return JsonResponse({
@@ -165,33 +146,18 @@ def login_view(request):
 
                 messages.success(request, "Login successful!")
                 return redirect(redirect_url)  # ✅ Django Redirect (No JS)
-            except CustomUser.DoesNotExist:
-                if json_response:
-                    return JsonResponse({
-                        "ok": False,
-                        "error": {
-                            "code": "unknown_user",
-                            "message": "Nom d'utilisateur ou email inconnu.",
-                        },
-                        "field_errors": {"username": "Nom d'utilisateur ou email inconnu."},
-                    }, status=400)
-                messages.error(request, "User not found. Try registering.")
-
-        error_message = data.get("error", "Invalid credentials.")
-        error_code = data.get("code")
-        field = data.get("field")
+
+        error_message = error.message
         field_errors = {}
-        if error_code == "unknown_user" or field == "username":
-            field_errors["username"] = error_message
-        elif error_code == "bad_password" or field == "password":
-            field_errors["password"] = error_message
+        if error.field:
+            field_errors[error.field] = error_message
 
         if json_response:
             return JsonResponse({
                 "ok": False,
-                "error": {"code": error_code or "invalid_credentials", "message": error_message},
+                "error": {"code": error.code or "invalid_credentials", "message": error_message},
                 "field_errors": field_errors,
-            }, status=response.status_code if response.status_code else 400)
+            }, status=error.status)
 
         messages.error(request, error_message)
 
@@ -240,17 +206,8 @@ def register_validate_view(request):
     except Exception:
         per_minute = 30
     if per_minute > 0:
-        xff = (request.META.get("HTTP_X_FORWARDED_FOR") or "").split(",")[0].strip()
-        ip = xff or (request.META.get("REMOTE_ADDR") or "") or "unknown"
-        rl_key = f"register_preflight_validate:{ip}"
-        try:
-            count = cache.incr(rl_key)
-        except ValueError:
-            cache.add(rl_key, 1, timeout=60)
-            count = 1
-        except Exception:
-            count = 1
-        if count > per_minute:
+        limit = ratelimit.Limit(f"register_preflight_validate:{ratelimit.client_ip(request)}", ratelimit.Rate(per_minute, 60))
+        if not ratelimit.hit(limit).allowed:
             return JsonResponse({"ok": False, "error": {"code": "rate_limited"}}, status=429)
 
     username = (request.POST.get("username") or "").strip()
@@ -310,58 +267,47 @@ def register_validate_view(request):
     # WARNING: this enables enumeration; keep disabled unless you explicitly want it.
     if getattr(settings, "REGISTER_PREFLIGHT_CHECK_AVAILABILITY", False):
         if username and "username" not in field_errors:
-            if CustomUser.objects.filter(username__iexact=username).exists():
+            if services.identifier_taken("username", username):
                 field_errors["username"] = "Ce pseudo est déjà pris."
 
         if email and "email" not in field_errors:
-            if CustomUser.objects.filter(email__iexact=email).exists():
+            if services.identifier_taken("email", email):
                 field_errors["email"] = "Cet email est déjà utilisé."
 
     return JsonResponse({"ok": True, "field_errors": field_errors})
 
-# ✅ Change Password (Uses `api_request`)
+# ✅ Change Password (Calls the account service directly)
 @login_required
 def change_password_view(request):
     if request.method == "POST":
-        api_request = factory.post(
-            "/accounts/api/change_password/",
-            data=request.POST,
-            format="json",
-        )
-        api_request = Request(api_request)
-        api_request.user = request.user  # Attach logged-in user to request
-
-        response = change_password(api_request)
-        data = response.data
-
-        if response.status_code == 200:
+        # The form asks twice; API clients send a single "new_password".
+        new_password = request.POST.get("new_password1") or request.POST.get("new_password")
+        confirmation = request.POST.get("new_password2")
+        try:
+            if confirmation is not None and confirmation != new_password:
+                raise services.AccountError("Les mots de passe ne correspondent pas.")
+            services.change_password(request.user, request.POST.get("old_password"), new_password)
+        except services.AccountError as exc:
+            messages.error(request, exc.message)
+        except hashing.HashingPoolBusy:
+            messages.error(request, "Serveur occupé, réessayez dans un instant.")
+        else:
             messages.success(request, "Password changed successfully!")
             return redirect("home")
-        else:
-            messages.error(request, data.get("error", "Failed to change password."))
 
     return render(request, "accounts/change_password.html")
 
-# ✅ Change Email (Uses `api_request`)
+# ✅ Change Email (Calls the account service directly)
 @login_required
 def change_email_view(request):
     if request.method == "POST":
-        api_request = factory.post(
-            "/accounts/api/change_email/",
-            data=request.POST,
-            format="json",
-        )
-        api_request = Request(api_request)
-        api_request.user = request.user  # Attach logged-in user
-
-        response = change_email(api_request)
-        data = response.data
-
-        if response.status_code == 200:
+        try:
+            services.change_email(request.user, request.POST.get("new_email"))
+        except services.AccountError as exc:
+            messages.error(request, exc.message)
+        else:
             messages.success(request, "Email updated successfully!")
             return redirect("home")
-        else:
-            messages.error(request, data.get("error", "Failed to update email."))
 
     return render(request, "accounts/change_email.html")
 
@@ -391,7 +337,7 @@ def forgot_password_view(request):
             messages.error(request, "Email invalide.")
             return redirect("forgot_password")
 
-        user = CustomUser.objects.filter(email__iexact=email).first()
+        user = services.find_user_by_identifier(email, fields=("email",))
         if user:
             if not bool(getattr(settings, "EMAIL_ENABLED", True)):
                 messages.error(request, "Email désactivé sur ce serveur. Contactez l'administrateur.")
@@ -405,8 +351,8 @@ def forgot_password_view(request):
             subject = "Password Reset Request"
             message = render_to_string("accounts/password_reset_email.html", {"reset_url": reset_url, "user": user})
             try:
-                from_email = getattr(settings, "DEFAULT_FROM_EMAIL", None) or None
-                send_mail(subject, message, from_email, [user.email], fail_silently=False)
+                # Sent by a worker after this request (see accounts.emails).
+                emails.queue_email(user, EmailDelivery.KIND_PASSWORD_RESET, subject, message)
             except Exception:
                 logger.exception(
                     "forgot_password_send_failed user_id=%s email=%r",
@@ -456,7 +402,7 @@ def verify_email_view(request):
         email = (request.POST.get("email") or "").strip()
         code = (request.POST.get("code") or "").strip()
 
-        user = CustomUser.objects.filter(email__iexact=email).first()
+        user = services.find_user_by_identifier(email, fields=("email",))
         if not user:
             messages.error(request, "Email inconnu.", extra_tags="emailverify")
             return render(request, "accounts/verify_email.html", {"email": email})
@@ -489,7 +435,7 @@ def profile_view(request, username):
             "ok": True,
             "profile": {
                 "username": user_profile.username,
-                "email": user_profile.email,
+                "email": user_profile.email or "",
                 "email_verified": bool(getattr(user_profile, "email_verified", False)),
                 "age": user_profile.age.isoformat() if user_profile.age else None,
                 "gender": user_profile.gender,
@@ -524,18 +470,11 @@ def profile_view(request, username):
         form = ProfileUpdateForm(instance=user_profile)
 
     irc_app_password_plain = request.session.pop("irc_app_password_plain", None)
-    app_pw_ttl_seconds = getattr(settings, "IRC_APP_PASSWORD_TTL_SECONDS", 120)
-    try:
-        app_pw_ttl_seconds = int(app_pw_ttl_seconds)
-    except Exception:
-        app_pw_ttl_seconds = 120
-    app_pw_ttl_seconds = min(max(app_pw_ttl_seconds, 10), 24 * 60 * 60)
-    cutoff = timezone.now() - timedelta(seconds=app_pw_ttl_seconds)
     irc_app_password_count = IrcAppPassword.objects.filter(
         user=user_profile,
         revoked_at__isnull=True,
         last_used__isnull=True,
-        created_at__gte=cutoff,
+        created_at__gte=IrcAppPassword.usable_cutoff(),
     ).count()
 
     return render(request, "accounts/profile.html", {
@@ -564,8 +503,7 @@ def generate_irc_app_password_view(request, username):
     # Revoke existing active tokens for simplicity (single active token).
     IrcAppPassword.objects.filter(user=user_profile, revoked_at__isnull=True).update(revoked_at=timezone.now())
 
-    plain = secrets.token_urlsafe(24)
-    IrcAppPassword.objects.create(user=user_profile, password=make_password(plain))
+    _, plain = IrcAppPassword.issue(user_profile)
     if json_response:
         resp = JsonResponse({"token": plain, "active": 1})
         resp["Cache-Control"] = "no-store, max-age=0"
@@ -4,6 +4,7 @@ from django.utils import timezone
 from django.core.files.storage import default_storage
 
 from blog.models import BlogPost
+from main import thumbnails
 
 
 class Command(BaseCommand):
@@ -65,17 +66,10 @@ class Command(BaseCommand):
                             deleted_images += 1
 
                         # Delete associated thumbnails
-                        for size in [326, 652]:
-                            thumb_name = post._image_thumb_storage_name(size)
-                            if thumb_name and default_storage.exists(thumb_name):
+                        for thumb_name in thumbnails.variant_files(post.thumbnails):
+                            if default_storage.exists(thumb_name):
                                 default_storage.delete(thumb_name)
                                 deleted_thumbs += 1
-                            
-                            # Try JPEG fallback
-                            jpg_name = thumb_name[:-5] + ".jpg" if thumb_name else ""
-                            if jpg_name and default_storage.exists(jpg_name):
-                                default_storage.delete(jpg_name)
-                                deleted_thumbs += 1
                 except Exception as exc:
                     self.stderr.write(f"Error deleting images for post {post.id}: {exc}")
 
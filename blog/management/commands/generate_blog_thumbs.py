@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 
 from blog.models import BlogPost
+from main.thumbnails import backfill
 
 
 class Command(BaseCommand):
@@ -8,21 +9,29 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("--limit", type=int, default=0)
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1)")
+        parser.add_argument("--force", action="store_true", help="Regenerate thumbnails that are already recorded.")
 
     def handle(self, *args, **options):
         limit = int(options.get("limit") or 0)
+        force = options["force"]
 
-        qs = BlogPost.objects.all().only("id", "image")
+        qs = BlogPost.objects.exclude(image="").only("id", "image", "thumbnails").order_by("id")
+        ids = [post.id for post in qs.iterator(chunk_size=500) if force or post.thumbnails_outdated()]
         if limit > 0:
-            qs = qs[:limit]
-
-        processed = 0
-        for post in qs.iterator(chunk_size=100):
-            try:
-                if hasattr(post, "ensure_image_thumbs"):
-                    post.ensure_image_thumbs()
-                processed += 1
-            except Exception as exc:
-                self.stderr.write(f"post_id={post.id}: {exc}")
-
-        self.stdout.write(self.style.SUCCESS(f"Done. Processed {processed} posts."))
+            ids = ids[:limit]
+
+        def progress(done, total, errors):
+            for post_id, exc in errors:
+                self.stderr.write(f"post_id={post_id}: {exc}")
+            self.stdout.write(f"{done}/{total} posts")
+
+        processed, errors = backfill(
+            "blog.tasks.generate_image_thumbs",
+            ids,
+            workers=max(1, int(options["workers"])),
+            force=force,
+            progress=progress,
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Processed {processed} posts ({len(errors)} errors)."))
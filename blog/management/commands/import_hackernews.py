@@ -12,6 +12,7 @@ from django.utils.html import escape
 from django.utils.text import slugify
 
 from accounts.models import CustomUser
+from accounts.services import find_user_by_identifier
 from blog.models import BlogPost
 from PIL import Image, ImageDraw, ImageFont
 
@@ -128,7 +129,7 @@ class Command(BaseCommand):
         ))
 
     def _resolve_author(self, username: str) -> CustomUser:
-        user = CustomUser.objects.filter(username__iexact=username).first()
+        user = find_user_by_identifier(username, fields=("username",))
         if not user:
             user = CustomUser.objects.filter(is_superuser=True).order_by("id").first()
         if not user:
@@ -1,12 +1,9 @@
 from django.db import models
 from django.utils.text import slugify
 from accounts.models import CustomUser 
-from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 
-import io
-
-from PIL import Image, ImageOps
+from main import thumbnails
 
 class BlogPost(models.Model):
     title = models.CharField(max_length=255)
@@ -23,6 +20,8 @@ class BlogPost(models.Model):
     source_url = models.URLField(blank=True)
     is_active = models.BooleanField(default=True)
     is_published = models.BooleanField(default=True)  # ✅ MUST EXIST
+    # Generated image variants (see main.thumbnails), written by ensure_image_thumbs().
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         indexes = [
@@ -35,13 +34,11 @@ class BlogPost(models.Model):
 
         super().save(*args, **kwargs)
 
-        try:
-            self.ensure_image_thumbs()
-        except Exception:
-            # Never fail saving the post due to thumb generation.
-            pass
+        if self.thumbnails_outdated():
+            # Decoding and resizing happen in a django-rq job, not in the request.
+            thumbnails.schedule_generation("blog.tasks.generate_image_thumbs", self.pk)
 
-    def _image_thumb_storage_name(self, size: int) -> str:
+    def _image_thumb_storage_name(self, size: int, ext: str = "webp") -> str:
         image_name = (getattr(self.image, "name", "") or "").strip()
         if not image_name:
             return ""
@@ -50,72 +47,50 @@ class BlogPost(models.Model):
         if base.startswith("blog_images/"):
             base = base[len("blog_images/"):]
 
-        return f"blog_images/thumbs/{base}__{size}.webp"
+        return f"blog_images/thumbs/{base}__{size}.{ext}"
 
-    def _generate_image_thumb(self, size: int) -> None:
-        if not self.image or not getattr(self.image, "name", ""):
+    def ensure_image_thumbs(self, force: bool = False) -> None:
+        """Generate image variants (see ``thumbnails.BLOG_CARD``) and record them in ``self.thumbnails``."""
+        source = (getattr(self.image, "name", "") or "") if self.image else ""
+        if not source:
             return
 
-        thumb_name = self._image_thumb_storage_name(size)
-        if not thumb_name:
+        if thumbnails.current_manifest(self.thumbnails, source, thumbnails.BLOG_CARD) is not None and not force:
             return
 
-        if default_storage.exists(thumb_name):
+        if not default_storage.exists(source):
+            manifest = thumbnails.build_manifest(source, {}, thumbnails.BLOG_CARD, missing=True)
+            thumbnails.replace_manifest(self, manifest)
             return
 
-        if not default_storage.exists(self.image.name):
-            return
+        variants = thumbnails.generate(source, thumbnails.BLOG_CARD, self._image_thumb_storage_name)
+        thumbnails.replace_manifest(self, thumbnails.build_manifest(source, variants, thumbnails.BLOG_CARD))
 
-        with default_storage.open(self.image.name, "rb") as fh:
-            img = Image.open(fh)
-            img = ImageOps.exif_transpose(img)
-
-            if img.mode not in ("RGB", "RGBA"):
-                img = img.convert("RGBA")
-
-            # Most blog cards are square previews.
-            thumb = ImageOps.fit(img, (size, size), method=Image.Resampling.LANCZOS)
-
-            buf = io.BytesIO()
-            try:
-                thumb.save(buf, format="WEBP", quality=80, method=6)
-                default_storage.save(thumb_name, ContentFile(buf.getvalue()))
-            except Exception:
-                buf = io.BytesIO()
-                if thumb.mode == "RGBA":
-                    thumb = thumb.convert("RGB")
-                thumb.save(buf, format="JPEG", quality=84, optimize=True, progressive=True)
-                fallback_name = thumb_name[:-5] + ".jpg"
-                default_storage.save(fallback_name, ContentFile(buf.getvalue()))
-
-    def ensure_image_thumbs(self) -> None:
-        # Common sizes: ~326px cards (1x) and ~652px (2x).
-        self._generate_image_thumb(326)
-        self._generate_image_thumb(652)
+    def thumbnails_outdated(self) -> bool:
+        source = (getattr(self.image, "name", "") or "") if self.image else ""
+        return bool(source) and thumbnails.current_manifest(self.thumbnails, source, thumbnails.BLOG_CARD) is None
 
-    def image_thumb_326_url(self):
-        thumb = self._image_thumb_storage_name(326)
-        if thumb and default_storage.exists(thumb):
-            return default_storage.url(thumb)
-        jpg = thumb[:-5] + ".jpg" if thumb else ""
-        if jpg and default_storage.exists(jpg):
-            return default_storage.url(jpg)
+    def _image_url(self) -> str:
         try:
             return self.image.url
         except Exception:
             return ""
 
+    def _image_thumb_url(self, size: int) -> str:
+        source = (getattr(self.image, "name", "") or "") if self.image else ""
+        url = thumbnails.variant_url(self.thumbnails, source, thumbnails.BLOG_CARD, size, fmt="webp")
+        return url or self._image_url()
+
+    def image_thumb_326_url(self):
+        return self._image_thumb_url(326)
+
     def image_thumb_652_url(self):
-        thumb = self._image_thumb_storage_name(652)
-        if thumb and default_storage.exists(thumb):
-            return default_storage.url(thumb)
-        jpg = thumb[:-5] + ".jpg" if thumb else ""
-        if jpg and default_storage.exists(jpg):
-            return default_storage.url(jpg)
-        try:
-            return self.image.url
-        except Exception:
-            return ""
+        return self._image_thumb_url(652)
+
+    def image_picture(self):
+        """``<picture>`` data for the ``{% picture %}`` template tag."""
+        source = (getattr(self.image, "name", "") or "") if self.image else ""
+        return thumbnails.picture(self.thumbnails, source, thumbnails.BLOG_CARD, self._image_url())
 
     def __str__(self):
         return self.title
@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from .models import BlogPost
+
+
+def generate_image_thumbs(post_id: int, force: bool = False) -> bool:
+    post = BlogPost.objects.filter(pk=post_id).only("id", "image", "thumbnails").first()
+    if post is None:
+        return False
+    post.ensure_image_thumbs(force=force)
+    return True
@@ -2,11 +2,12 @@ from django.shortcuts import render, get_object_or_404, redirect
 from .models import BlogPost, Comment
 from .forms import BlogPostForm, CommentForm
 from accounts.utils import verify_recaptcha
-from django.db.models import Count
 from django.db.models import Q
 from django.conf import settings
 from django.http import HttpResponseForbidden
 from django.contrib.auth.decorators import login_required
+from community import popularity
+from main import fragments
 
 def blog_list(request):
     query = request.GET.get("q", "")  # Get search query from URL
@@ -26,25 +27,13 @@ def blog_list(request):
             Q(title__icontains=query) | Q(content__icontains=query) | Q(tags__icontains=query)
         )
 
-    categories = (
-        BlogPost.objects.filter(is_active=True, is_published=True)
-        .exclude(category="")
-        .values("category")
-        .annotate(count=Count("id"))
-        .order_by("-count", "category")
-    )
-
-    recent_posts = (
-        BlogPost.objects.filter(is_active=True, is_published=True)
-        .only("title", "slug", "created_at", "image")
-        .order_by("-created_at")[:5]
-    )
+    sidebar = fragments.get_many(["categories", "recent_posts"], request)
 
     return render(request, "blog/blog.html", {
         "posts": posts,
         "query": query,  # Keep search term in input field
-        "categories": categories,
-        "recent_posts": recent_posts,
+        "categories": sidebar["categories"],
+        "recent_posts": sidebar["recent_posts"],
         "selected_category": selected_category,
     })
 
@@ -79,18 +68,6 @@ def blog_detail(request, slug):
     post = get_object_or_404(BlogPost, slug=slug)
     comments = post.comments.order_by("-created_at")
     post_tags = post.tags.split(",") if post.tags else []
-    all_posts = (
-        BlogPost.objects.filter(is_active=True, is_published=True)
-        .only("title", "slug", "created_at", "image")
-        .order_by("-created_at")[:5]
-    )
-    categories = (
-        BlogPost.objects.filter(is_active=True, is_published=True)
-        .exclude(category="")
-        .values("category")
-        .annotate(count=Count("id"))
-        .order_by("-count", "category")
-    )
 
     form = CommentForm()
 
@@ -99,11 +76,14 @@ def blog_detail(request, slug):
     if request.method == "POST":
         return redirect("blog:add_comment", slug=post.slug)
 
+    popularity.record(post.author_id, "post_view", viewer=popularity.viewer(request))
+    sidebar = fragments.get_many(["recent_posts", "categories"], request)
+
     return render(request, "blog/blog-single.html", {
         "post": post,
         "post_tags": post_tags,
-        "recent_posts": all_posts,
-        "categories": categories,
+        "recent_posts": sidebar["recent_posts"],
+        "categories": sidebar["categories"],
         "recaptcha_site_key": settings.RECAPTCHA_SITE_KEY, 
         "comments": comments,
         "form": form,
@@ -130,9 +110,13 @@ def add_comment(request, slug):
 
             # Use authenticated user identity as requested.
             comment.name = getattr(request.user, "username", "") or str(request.user)
-            comment.email = getattr(request.user, "email", "")
+            comment.email = getattr(request.user, "email", "") or ""
 
+            # Only a member's first comment on a post is credited to its author.
+            first_comment = not post.comments.filter(name=comment.name).exists()
             comment.save()
+            if request.user.pk != post.author_id and first_comment:
+                popularity.record(post.author_id, "comment")
             return redirect("blog:blog_detail", slug=post.slug)
     return redirect("blog:blog_detail", slug=post.slug)
 
@@ -0,0 +1,244 @@
+"""The members directory: its read model, filters, pagination and totals.
+
+Listings read :class:`community.models.MemberDirectoryEntry`, one narrow
+row per public member. :func:`sync_member` refreshes a row after the user
+is saved (see ``community.signals``); :func:`rebuild` recomputes them all.
+
+Every sort order is a ``(column, pk)`` pair walked through an index on
+``column``: a page is "the next ``per_page`` rows after the last
+one shown", so page 500 costs the same as page 1 and no ``OFFSET`` or
+``COUNT(*)`` runs per view. Cursors come from :mod:`main.cursors`.
+
+Filters are shaped to match the composite indexes on the entries: a
+place that names a known :class:`locations.models.City` becomes an equality
+on ``city_ref`` (served together with the default order by
+``(city_ref, last_login)``), and gender/age ranges hit
+``(gender, birthdate)`` or ``(birthdate)``. The substring search is kept
+for members whose city is not linked, and is the only filter for places
+that match no city.
+
+The total shown above the list is counted once per filter combination and
+cached for ``COMMUNITY_COUNT_CACHE_TTL`` seconds, so it can lag slightly.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Mapping, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from locations.models import City
+from main import fragments, thumbnails
+from main.cursors import InvalidCursor, decode_cursor, encode_cursor
+
+from .models import MemberDirectoryEntry
+
+
+# order name -> (column, descending)
+ORDERINGS = {
+    "last_active": ("last_login", True),
+    "most_active": ("last_login", True),
+    "oldest": ("date_joined", False),
+    "popular": ("popularity_score", True),
+}
+DEFAULT_ORDER = "last_active"
+_DATETIME_COLUMNS = {"last_login", "date_joined"}
+_INTEGER_COLUMNS = {"popularity_score"}
+
+# CustomUser fields an entry is built from; saves touching none of them
+# leave the entry alone.
+SOURCE_FIELDS = (
+    "id", "username", "public", "gender", "age", "city", "city_ref",
+    "avatar", "thumbnails", "popularity_score", "last_login", "date_joined",
+)
+_ENTRY_FIELDS = [
+    "username", "gender", "birthdate", "age_years", "city", "city_ref", "avatar_url",
+    "avatar_picture", "popularity_score", "last_login", "date_joined", "updated_at",
+]
+
+
+def age_years(birthdate: Optional[date], today: Optional[date] = None) -> Optional[int]:
+    if not birthdate:
+        return None
+    today = today or date.today()
+    years = today.year - birthdate.year
+    if (today.month, today.day) < (birthdate.month, birthdate.day):
+        years -= 1
+    return max(years, 0)
+
+
+def _entry_values(user) -> Dict[str, Any]:
+    source = (getattr(user.avatar, "name", "") or "") if user.avatar else ""
+    avatar_url = user.avatar_url()
+    return {
+        "username": user.username,
+        "gender": user.gender or "",
+        "birthdate": user.age,
+        "age_years": age_years(user.age),
+        "city": user.city or "",
+        "city_ref_id": user.city_ref_id,
+        "avatar_url": thumbnails.variant_url(user.thumbnails, source, thumbnails.AVATAR, 100, fmt="webp") or avatar_url,
+        "avatar_picture": thumbnails.picture(user.thumbnails, source, thumbnails.AVATAR, avatar_url),
+        "popularity_score": user.popularity_score,
+        "last_login": user.last_login,
+        "date_joined": user.date_joined,
+    }
+
+
+def sync_member(user_id: int) -> Optional[MemberDirectoryEntry]:
+    """Create, refresh or drop the entry of ``user_id`` to match the user row."""
+
+    user = get_user_model().objects.filter(pk=user_id).only(*SOURCE_FIELDS).first()
+    if user is None or not user.public:
+        MemberDirectoryEntry.objects.filter(pk=user_id).delete()
+        return None
+    entry, _ = MemberDirectoryEntry.objects.update_or_create(user_id=user.pk, defaults=_entry_values(user))
+    return entry
+
+
+def rebuild(batch_size: int = 500) -> int:
+    """Rewrite every entry, ages included; returns how many were written."""
+
+    User = get_user_model()
+    written, last_pk = 0, 0
+    while True:
+        users = list(
+            User.objects.filter(public=True, pk__gt=last_pk).order_by("pk").only(*SOURCE_FIELDS)[:batch_size]
+        )
+        if not users:
+            break
+        last_pk = users[-1].pk
+        MemberDirectoryEntry.objects.bulk_create(
+            [MemberDirectoryEntry(user_id=user.pk, **_entry_values(user)) for user in users],
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=_ENTRY_FIELDS,
+        )
+        written += len(users)
+    MemberDirectoryEntry.objects.filter(user__public=False).delete()
+    # bulk_create sends no signals.
+    fragments.invalidate("newest_members", "popular_members", "active_members")
+    return written
+
+
+@dataclass
+class KeysetPage:
+    object_list: List[Any]
+    next_cursor: Optional[str]
+    previous_cursor: Optional[str]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+
+def filter_place(queryset, place: str):
+    """Members living in ``place`` (a city name, free text)."""
+
+    place = place.strip()
+    city = City.resolve(place)
+    if city is not None:
+        # Members linked to the city, plus those whose free text matched no
+        # city ("Paris 15e") but contains the name, as the text search did.
+        return queryset.filter(Q(city_ref=city) | Q(city_ref__isnull=True, city__icontains=place))
+    # Not a city we know (a region, a typo, a foreign town): scan the text.
+    return queryset.filter(city__icontains=place)
+
+
+def _position(obj, column: str) -> tuple:
+    return (getattr(obj, column), obj.pk)
+
+
+def _decode(token: Optional[str], column: str) -> Optional[tuple]:
+    try:
+        position = decode_cursor(token, length=2)
+    except InvalidCursor:
+        return None
+    if position is None:
+        return None
+    value, pk = position
+    if column in _DATETIME_COLUMNS:
+        try:
+            value = parse_datetime(value) if isinstance(value, str) else None
+        except (TypeError, ValueError):
+            # Well-formed but impossible, e.g. "2024-13-45T00:00:00".
+            return None
+        if value is None:
+            return None
+    elif column in _INTEGER_COLUMNS and (not isinstance(value, int) or isinstance(value, bool)):
+        return None
+    if not isinstance(pk, int) or isinstance(pk, bool):
+        return None
+    return value, pk
+
+
+def keyset_page(
+    queryset,
+    order: str,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    per_page: int = 10,
+) -> KeysetPage:
+    """One page of ``queryset`` in ``order``, after or before a cursor.
+
+    Unknown or tampered cursors simply restart from the first page.
+    """
+
+    column, descending = ORDERINGS.get(order, ORDERINGS[DEFAULT_ORDER])
+    after_pos = _decode(after, column)
+    before_pos = _decode(before, column) if after_pos is None else None
+
+    # Walking backwards means reading the index in the opposite direction.
+    backwards = before_pos is not None
+    forward_desc = descending != backwards
+    position = before_pos if backwards else after_pos
+
+    qs = queryset
+    if position is not None:
+        value, pk = position
+        op = "lt" if forward_desc else "gt"
+        qs = qs.filter(Q(**{f"{column}__{op}": value}) | Q(**{column: value, f"pk__{op}": pk}))
+    prefix = "-" if forward_desc else ""
+    rows = list(qs.order_by(f"{prefix}{column}", f"{prefix}pk")[:per_page + 1])
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        has_next, has_previous = True, more
+    else:
+        has_next, has_previous = more, position is not None
+
+    if not rows:
+        return KeysetPage([], None, None)
+    return KeysetPage(
+        rows,
+        encode_cursor(_position(rows[-1], column)) if has_next else None,
+        encode_cursor(_position(rows[0], column)) if has_previous else None,
+    )
+
+
+def cached_count(queryset, filters: Mapping[str, Any]) -> int:
+    """``queryset.count()``, cached per combination of directory ``filters``."""
+
+    signature = "&".join(f"{key}={filters[key]}" for key in sorted(filters) if filters[key] not in (None, ""))
+    digest = hashlib.sha1(signature.encode("utf-8")).hexdigest()[:16]
+    ttl = getattr(settings, "COMMUNITY_COUNT_CACHE_TTL", 300)
+    return cache.get_or_set(f"community.members.count.{digest}", queryset.count, ttl)
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from community.tasks import enqueue_flush_presence, flush_presence
+
+
+class Command(BaseCommand):
+    help = "Copy recent member presence from Redis into last_login in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Flush synchronously without enqueuing.",
+        )
+
+    def handle(self, *args, **options):
+        if options.get("sync"):
+            updated = flush_presence()
+            self.stdout.write(self.style.SUCCESS(f"Updated last_login for {updated} member(s)."))
+            return
+
+        job_id = enqueue_flush_presence()
+        self.stdout.write(self.style.SUCCESS(f"Enqueued presence flush job: {job_id}"))
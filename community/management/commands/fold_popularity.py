@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from community.tasks import enqueue_fold_popularity, fold_popularity
+
+
+class Command(BaseCommand):
+    help = "Fold counted profile/post views and comments into members' decayed popularity_score."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Fold synchronously without enqueuing.",
+        )
+
+    def handle(self, *args, **options):
+        if options.get("sync"):
+            result = fold_popularity()
+            self.stdout.write(self.style.SUCCESS(
+                f"Added {result['points']} point(s) to {result['members']} member(s); decay factor {result['decay']:.3f}."
+            ))
+            return
+
+        job_id = enqueue_fold_popularity()
+        self.stdout.write(self.style.SUCCESS(f"Enqueued popularity fold job: {job_id}"))
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from community.tasks import enqueue_rebuild_member_directory, rebuild_member_directory
+
+
+class Command(BaseCommand):
+    help = "Rebuild the member directory read model (listing fields, ages, avatar URLs)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Rebuild synchronously without enqueuing.",
+        )
+
+    def handle(self, *args, **options):
+        if options.get("sync"):
+            written = rebuild_member_directory()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} directory entries."))
+            return
+
+        job_id = enqueue_rebuild_member_directory()
+        self.stdout.write(self.style.SUCCESS(f"Enqueued member directory rebuild job: {job_id}"))
@@ -1,3 +1,73 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class MemberDirectoryEntry(models.Model):
+    """Public listing data for one member, denormalized from ``CustomUser``.
+
+    Only public members have a row. Directory pages, sidebars and the home
+    page read this narrow table instead of the user table (password hashes,
+    verification codes, descriptions...). Rows are kept in sync by
+    ``community.directory.sync_member`` (on user save) and rebuilt by
+    ``manage.py rebuild_member_directory``.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="directory_entry",
+    )
+    username = models.CharField(max_length=150)
+    gender = models.CharField(max_length=1, blank=True, default="")
+    birthdate = models.DateField(null=True, blank=True)
+    # Refreshed by the rebuild command; run it daily so birthdays show up.
+    age_years = models.PositiveSmallIntegerField(null=True, blank=True)
+    city = models.CharField(max_length=100, blank=True, default="")
+    city_ref = models.ForeignKey("locations.City", null=True, blank=True, on_delete=models.SET_NULL, db_index=False)
+    avatar_url = models.CharField(max_length=500, blank=True, default="")
+    # thumbnails.picture() output for the {% picture %} tag.
+    avatar_picture = models.JSONField(default=dict, blank=True)
+    popularity_score = models.IntegerField(default=0)
+    last_login = models.DateTimeField()
+    date_joined = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Same shapes as the directory indexes on CustomUser, minus "public".
+        indexes = [
+            models.Index(fields=["last_login"], name="community_dir_last_idx"),
+            models.Index(fields=["date_joined"], name="community_dir_joined_idx"),
+            models.Index(fields=["popularity_score"], name="community_dir_pop_idx"),
+            models.Index(fields=["city_ref", "last_login"], name="community_dir_city_idx"),
+            models.Index(fields=["gender", "birthdate"], name="community_dir_gender_age_idx"),
+            models.Index(fields=["birthdate"], name="community_dir_age_idx"),
+        ]
+
+    # Shown by the cached member lists in main.fragments.
+    DISPLAY_FIELDS = ("username", "avatar_url", "avatar_picture")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_display()
+        return instance
+
+    def _remember_display(self):
+        self._loaded_display = {name: self.__dict__[name] for name in self.DISPLAY_FIELDS if name in self.__dict__}
+
+    def display_changed(self) -> bool:
+        """Whether the last save changed a field the cached member lists show."""
+
+        loaded = getattr(self, "_loaded_display", None)
+        if loaded is None:
+            return True
+        return any(self.__dict__.get(name) != value for name, value in loaded.items())
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # post_save receivers have run; the next save compares with this one.
+        self._remember_display()
+
+    def __str__(self):
+        return self.username
@@ -0,0 +1,181 @@
+"""Member popularity from decayed activity counters.
+
+Views of a member's profile and posts, and comments on their posts, are
+counted in Redis (one HINCRBY per event, nothing written to the database
+on the request path). :func:`fold` then adds the pending counts to
+``CustomUser.popularity_score`` with one UPDATE per chunk, and once per
+``POPULARITY_DECAY_INTERVAL`` multiplies every score by the decay that
+elapsed (half-life ``POPULARITY_HALF_LIFE_DAYS``), so the ranking follows
+recent interest. Run it with ``manage.py fold_popularity``.
+
+A viewer (see :func:`viewer`) is counted once per target and event every
+``POPULARITY_DEDUPE_SECONDS``, and members never count for themselves.
+Comments are credited for the commenter's first comment on a post only.
+Without django-redis the counters live in the Django cache behind a
+process-local lock.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Cast, Round
+
+from main import fragments
+from main.ratelimit import redis_client
+
+from .models import MemberDirectoryEntry
+
+
+logger = logging.getLogger(__name__)
+
+# event -> points credited to the member concerned.
+WEIGHTS = {
+    "profile_view": 1,
+    "post_view": 2,
+    "comment": 5,
+}
+
+_fallback_lock = threading.Lock()
+
+
+def _key() -> str:
+    return getattr(settings, "POPULARITY_KEY", "popularity:pending")
+
+
+def _decayed_at_key() -> str:
+    return f"{_key()}:decayed_at"
+
+
+def viewer(request):
+    """Who a view is counted for: the member, else the TCP peer address.
+
+    ``X-Forwarded-For`` is deliberately ignored: it is chosen by the client,
+    so a different spoofed value per request would count as a new viewer.
+    """
+
+    if request.user.is_authenticated:
+        return request.user.pk
+    return f"ip:{request.META.get('REMOTE_ADDR') or 'unknown'}"
+
+
+def record(user_id: Optional[int], event: str, viewer=None) -> bool:
+    """Credit ``event`` to ``user_id``; returns whether it was counted.
+
+    ``viewer`` (a user id or client address) is used to count repeated
+    views once; pass ``None`` for events that are not views.
+    """
+
+    if not user_id:
+        return False
+    if viewer is not None:
+        if str(viewer) == str(user_id):
+            return False
+        ttl = getattr(settings, "POPULARITY_DEDUPE_SECONDS", 3600)
+        if ttl and not cache.add(f"popularity.seen.{event}.{user_id}.{viewer}", 1, ttl):
+            return False
+
+    weight = WEIGHTS[event]
+    try:
+        client = redis_client()
+        if client is not None:
+            client.hincrby(_key(), str(user_id), weight)
+        else:
+            with _fallback_lock:
+                pending = cache.get(_key()) or {}
+                pending[user_id] = pending.get(user_id, 0) + weight
+                cache.set(_key(), pending, timeout=None)
+    except Exception:
+        logger.exception("popularity record failed for user %s", user_id)
+        return False
+    return True
+
+
+def _folding_key() -> str:
+    return f"{_key()}:folding"
+
+
+def _take_pending() -> Dict[int, int]:
+    """Move the pending counters aside and return them.
+
+    Redis RENAME is atomic, so increments arriving meanwhile start a fresh
+    hash. The moved hash is only deleted by :func:`_forget_taken` once the
+    database has the points; a fold that fails is retried by the next one.
+    """
+
+    client = redis_client()
+    if client is not None:
+        if not client.exists(_folding_key()):
+            try:
+                client.rename(_key(), _folding_key())
+            except Exception:
+                # Nothing pending (RENAME of a missing key is an error).
+                return {}
+        return {int(user_id): int(points) for user_id, points in client.hgetall(_folding_key()).items()}
+
+    with _fallback_lock:
+        pending = cache.get(_key()) or {}
+        cache.delete(_key())
+    return pending
+
+
+def _forget_taken() -> None:
+    client = redis_client()
+    if client is not None:
+        client.delete(_folding_key())
+
+
+def _add_points(pending: Dict[int, int], chunk_size: int) -> int:
+    User = get_user_model()
+    rows = sorted(pending.items())
+    updated = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        points = Case(*[When(pk=user_id, then=Value(count)) for user_id, count in chunk], output_field=IntegerField())
+        ids = [user_id for user_id, _ in chunk]
+        updated += User.objects.filter(pk__in=ids).update(popularity_score=F("popularity_score") + points)
+        MemberDirectoryEntry.objects.filter(pk__in=ids).update(popularity_score=F("popularity_score") + points)
+    return updated
+
+
+def _decay(now: float) -> float:
+    """Apply the decay accumulated since the last run; returns the factor used."""
+
+    interval = getattr(settings, "POPULARITY_DECAY_INTERVAL", 86400)
+    last = cache.get(_decayed_at_key())
+    if last is None:
+        cache.set(_decayed_at_key(), now, timeout=None)
+        return 1.0
+    elapsed = now - float(last)
+    if elapsed < interval:
+        return 1.0
+
+    half_life = getattr(settings, "POPULARITY_HALF_LIFE_DAYS", 7) * 86400
+    factor = 0.5 ** (elapsed / half_life)
+    decayed = Cast(Round(F("popularity_score") * factor), IntegerField())
+    get_user_model().objects.filter(popularity_score__gt=0).update(popularity_score=decayed)
+    MemberDirectoryEntry.objects.filter(popularity_score__gt=0).update(popularity_score=decayed)
+    transaction.on_commit(lambda: cache.set(_decayed_at_key(), now, timeout=None))
+    return factor
+
+
+def fold(chunk_size: int = 500, now: Optional[float] = None) -> dict:
+    """Fold pending counters into ``popularity_score`` and apply any due decay."""
+
+    now = time.time() if now is None else now
+    pending = _take_pending()
+    with transaction.atomic():
+        factor = _decay(now)
+        updated = _add_points(pending, chunk_size) if pending else 0
+    _forget_taken()
+    if updated or factor != 1.0:
+        fragments.invalidate("popular_members")
+    return {"members": updated, "points": sum(pending.values()), "decay": factor}
@@ -0,0 +1,170 @@
+"""Who is online, kept in Redis instead of the ``last_login`` column.
+
+Each authenticated request (see ``middleware.presence``) records the user in
+a sorted set scored by the time it was last seen; a process skips users it
+recorded less than ``PRESENCE_TOUCH_INTERVAL`` seconds ago, so a busy member
+costs one ZADD per minute rather than a database write per request. Pages
+ask for the online ids in a single call.
+
+``last_login`` is still maintained, but in batches: :func:`flush_last_login`
+(run periodically through ``manage.py flush_presence``) copies the scores
+recorded since the previous flush into the database (users and directory
+entries) with one UPDATE per table and chunk, then trims entries older than
+``PRESENCE_RETENTION_SECONDS``.
+
+Without django-redis the same structure lives in the Django cache behind a
+process-local lock (fine for development and tests).
+"""
+
+from __future__ import annotations
+
+import datetime
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Case, Value, When
+
+from main.ratelimit import redis_client
+
+from .models import MemberDirectoryEntry
+
+
+logger = logging.getLogger(__name__)
+
+_fallback_lock = threading.Lock()
+_recent_touches: Dict[int, float] = {}
+
+
+def _key() -> str:
+    return getattr(settings, "PRESENCE_KEY", "presence:online")
+
+
+def _watermark_key() -> str:
+    return f"{_key()}:flushed"
+
+
+def online_window() -> int:
+    return getattr(settings, "PRESENCE_ONLINE_SECONDS", 300)
+
+
+def touch(user_id: int, at: Optional[float] = None) -> bool:
+    """Record ``user_id`` as seen now; returns whether a write was made."""
+
+    at = time.time() if at is None else at
+    interval = getattr(settings, "PRESENCE_TOUCH_INTERVAL", 60)
+    last = _recent_touches.get(user_id)
+    if last is not None and at - last < interval:
+        return False
+    if len(_recent_touches) > 10000:
+        _recent_touches.clear()
+    _recent_touches[user_id] = at
+
+    try:
+        client = redis_client()
+        if client is not None:
+            client.zadd(_key(), {str(user_id): at})
+        else:
+            with _fallback_lock:
+                scores = cache.get(_key()) or {}
+                scores[user_id] = at
+                cache.set(_key(), scores, timeout=None)
+    except Exception:
+        logger.exception("presence touch failed for user %s", user_id)
+        return False
+    return True
+
+
+def _since(min_score: float, exclusive: bool = False) -> List[tuple]:
+    """``(user_id, score)`` pairs with a score above ``min_score``, most recent first."""
+
+    client = redis_client()
+    if client is not None:
+        bound = f"({min_score}" if exclusive else min_score
+        rows = client.zrevrangebyscore(_key(), "+inf", bound, withscores=True)
+        return [(int(member), score) for member, score in rows]
+
+    scores = cache.get(_key()) or {}
+    rows = [
+        (user_id, score) for user_id, score in scores.items()
+        if score > min_score or (not exclusive and score == min_score)
+    ]
+    return sorted(rows, key=lambda row: row[1], reverse=True)
+
+
+def online_ids(window: Optional[int] = None) -> Set[int]:
+    """Ids of users seen in the last ``window`` seconds (one Redis call)."""
+
+    window = online_window() if window is None else window
+    try:
+        return {user_id for user_id, _ in _since(time.time() - window)}
+    except Exception:
+        logger.exception("presence lookup failed")
+        return set()
+
+
+def is_online(user_id: int, window: Optional[int] = None) -> bool:
+    window = online_window() if window is None else window
+    try:
+        client = redis_client()
+        if client is not None:
+            score = client.zscore(_key(), str(user_id))
+        else:
+            score = (cache.get(_key()) or {}).get(user_id)
+    except Exception:
+        logger.exception("presence lookup failed for user %s", user_id)
+        return False
+    return score is not None and score >= time.time() - window
+
+
+def _write_last_login(rows: Iterable[tuple], chunk_size: int) -> int:
+    User = get_user_model()
+    rows = list(rows)
+    updated = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        seen = Case(*[
+            When(pk=user_id, then=Value(datetime.datetime.fromtimestamp(score, tz=datetime.timezone.utc)))
+            for user_id, score in chunk
+        ])
+        ids = [user_id for user_id, _ in chunk]
+        updated += User.objects.filter(pk__in=ids).update(last_login=seen)
+        MemberDirectoryEntry.objects.filter(pk__in=ids).update(last_login=seen)
+    return updated
+
+
+def flush_last_login(chunk_size: int = 500) -> int:
+    """Copy presence recorded since the last flush into ``last_login``.
+
+    Returns the number of rows updated. The watermark only moves forward
+    after the database write, so a failed flush is retried by the next one.
+    """
+
+    client = redis_client()
+    if client is not None:
+        watermark = float(client.get(_watermark_key()) or 0)
+    else:
+        watermark = float(cache.get(_watermark_key()) or 0)
+
+    rows = _since(watermark, exclusive=True)
+    if not rows:
+        return 0
+    updated = _write_last_login(rows, chunk_size)
+    newest = rows[0][1]
+
+    cutoff = min(newest, time.time() - getattr(settings, "PRESENCE_RETENTION_SECONDS", 86400))
+    if client is not None:
+        pipe = client.pipeline()
+        pipe.set(_watermark_key(), newest)
+        pipe.zremrangebyscore(_key(), "-inf", f"({cutoff}")
+        pipe.execute()
+    else:
+        with _fallback_lock:
+            cache.set(_watermark_key(), newest, timeout=None)
+            scores = cache.get(_key()) or {}
+            cache.set(_key(), {u: s for u, s in scores.items() if s >= cutoff}, timeout=None)
+    return updated
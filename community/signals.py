@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import directory
+
+
+@receiver(post_save, sender=get_user_model(), dispatch_uid="community.sync_directory_entry")
+def sync_directory_entry(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(directory.SOURCE_FIELDS):
+        return
+    directory.sync_member(instance.pk)
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import django_rq
+
+from . import presence
+
+
+def flush_presence() -> int:
+    """Write recent presence back to ``CustomUser.last_login`` (see community.presence)."""
+    return presence.flush_last_login()
+
+
+def enqueue_flush_presence() -> str:
+    queue = django_rq.get_queue("default")
+    job = queue.enqueue(flush_presence)
+    return job.id
+
+
+def rebuild_member_directory() -> int:
+    """Rewrite every MemberDirectoryEntry from CustomUser (see community.directory)."""
+    from .directory import rebuild
+
+    return rebuild()
+
+
+def enqueue_rebuild_member_directory() -> str:
+    queue = django_rq.get_queue("default")
+    job = queue.enqueue(rebuild_member_directory)
+    return job.id
+
+
+def fold_popularity() -> dict:
+    """Fold pending popularity counters into popularity_score (see community.popularity)."""
+    from .popularity import fold
+
+    return fold()
+
+
+def enqueue_fold_popularity() -> str:
+    queue = django_rq.get_queue("default")
+    job = queue.enqueue(fold_popularity)
+    return job.id
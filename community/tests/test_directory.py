@@ -0,0 +1,154 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+
+from community import directory
+from community.models import MemberDirectoryEntry
+from locations.models import City
+from main.cursors import encode_cursor
+
+
+@override_settings(THUMBNAILS_ASYNC=False)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        base = now()
+        for index in range(7):
+            User.objects.create_user(
+                username=f"member{index}",
+                email=f"member{index}@example.com",
+                password="s3cret-pass",
+                # Two members share a score to exercise the pk tie-break.
+                popularity_score=index // 2,
+                last_login=base - timedelta(minutes=index),
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def _walk(self, order):
+        queryset = get_user_model().objects.filter(public=True)
+        pages, page = [], directory.keyset_page(queryset, order, per_page=3)
+        pages.append(page)
+        while page.has_next:
+            page = directory.keyset_page(queryset, order, after=page.next_cursor, per_page=3)
+            pages.append(page)
+        return queryset, pages
+
+    def test_pages_cover_every_member_once_in_order(self):
+        for order in ("last_active", "oldest", "popular"):
+            queryset, pages = self._walk(order)
+            seen = [user.username for page in pages for user in page]
+            column, descending = directory.ORDERINGS[order]
+            expected = list(
+                queryset.order_by(f"{'-' if descending else ''}{column}", f"{'-' if descending else ''}pk")
+                .values_list("username", flat=True)
+            )
+            self.assertEqual(seen, expected, order)
+
+            # Walking back from the last page returns the previous one.
+            back = directory.keyset_page(queryset, order, before=pages[-1].previous_cursor, per_page=3)
+            self.assertEqual(list(back), list(pages[-2]))
+
+    def test_view_counts_once_per_filter_combination(self):
+        url = reverse("community_membres")
+        response = self.client.get(url, {"order": "popular"}, secure=True)
+        self.assertEqual(response.context["total"], 7)
+        self.assertFalse(response.context["members"].has_next)
+
+        # Same filters, other order: the count comes from the cache.
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {"order": "oldest"}, secure=True)
+        self.assertFalse([q for q in queries.captured_queries if "COUNT(" in q["sql"]])
+
+        response = self.client.get(url, {"after": "not-a-cursor"}, secure=True)
+        self.assertEqual(len(response.context["members"]), 7)
+
+    def test_tampered_cursors_restart_from_the_first_page(self):
+        url = reverse("community_membres")
+        for order, position in (
+            ("popular", ["x", 1]),
+            ("popular", [3, True]),
+            ("oldest", ["2024-13-45T00:00:00", 1]),
+        ):
+            response = self.client.get(url, {"order": order, "after": encode_cursor(position)}, secure=True)
+            self.assertEqual(response.status_code, 200, position)
+            self.assertEqual(len(response.context["members"]), 7, position)
+
+
+@override_settings(THUMBNAILS_ASYNC=False)
+class PlaceFilterTests(TestCase):
+    def test_known_cities_use_the_city_reference(self):
+        city = City.objects.create(name="Saint-Étienne")
+        User = get_user_model()
+        member = User.objects.create_user(username="zoe", email="zoe@example.com", password="s3cret-pass", city="saint etienne")
+        self.assertEqual(member.city_ref, city)
+
+        # Rows written before city_ref existed are linked by the backfill.
+        User.objects.filter(pk=member.pk).update(city_ref=None)
+        MemberDirectoryEntry.objects.filter(pk=member.pk).update(city_ref=None)
+        call_command("backfill_city_refs", stdout=StringIO())
+        member.refresh_from_db()
+        self.assertEqual(member.city_ref, city)
+        self.assertEqual(MemberDirectoryEntry.objects.get(pk=member.pk).city_ref, city)
+
+        members = User.objects.filter(public=True)
+        self.assertIn('"city_ref_id" =', str(directory.filter_place(members, "SAINT-ETIENNE").query))
+        self.assertEqual(list(directory.filter_place(members, "SAINT-ETIENNE")), [member])
+        self.assertEqual(list(directory.filter_place(members, "etienne")), [member])
+
+        # Free text that resolved to no city still matches by substring.
+        paris = City.objects.create(name="Paris")
+        other = User.objects.create_user(username="yann", email="yann@example.com", password="s3cret-pass", city="Paris 15e")
+        self.assertIsNone(other.city_ref)
+        self.assertEqual(list(directory.filter_place(members, "paris")), [other])
+        User.objects.filter(pk=other.pk).update(city="Paris", city_ref=paris)
+        self.assertEqual(list(directory.filter_place(members, "paris")), [other])
+
+    def test_unknown_cities_are_not_looked_up_on_every_save(self):
+        member = get_user_model().objects.create_user(username="noe", email="noe@example.com", password="s3cret-pass", city="Atlantis")
+        with CaptureQueriesContext(connection) as queries:
+            member.save()
+        self.assertFalse([q for q in queries.captured_queries if "locations_city" in q["sql"]])
+        City.objects.create(name="Atlantis")
+        member.save()
+        self.assertEqual(member.city_ref.name, "Atlantis")
+
+        # Bulk loads skip City.save(); the loaders forget the misses themselves.
+        self.assertIsNone(City.resolve("Lyonesse"))
+        loaded = [City(name="Lyonesse", name_key="lyonesse")]
+        City.objects.bulk_create(loaded, ignore_conflicts=True)
+        City.forget_misses(loaded)
+        self.assertEqual(City.resolve("Lyonesse").name, "Lyonesse")
+
+
+@override_settings(THUMBNAILS_ASYNC=False)
+class DirectoryEntryTests(TestCase):
+    def test_entries_follow_user_saves_and_rebuild(self):
+        User = get_user_model()
+        member = User.objects.create_user(username="ines", email="ines@example.com", password="s3cret-pass", age=date(1990, 1, 1))
+        entry = MemberDirectoryEntry.objects.get(pk=member.pk)
+        self.assertEqual(entry.username, "ines")
+        self.assertEqual(entry.age_years, directory.age_years(date(1990, 1, 1)))
+        self.assertTrue(entry.avatar_url)
+
+        member.popularity_score = 5
+        member.save(update_fields=["popularity_score"])
+        self.assertEqual(MemberDirectoryEntry.objects.get(pk=member.pk).popularity_score, 5)
+
+        member.public = False
+        member.save()
+        self.assertFalse(MemberDirectoryEntry.objects.filter(pk=member.pk).exists())
+
+        User.objects.filter(pk=member.pk).update(public=True, username="ines2")
+        self.assertEqual(directory.rebuild(), 1)
+        self.assertEqual(MemberDirectoryEntry.objects.get(pk=member.pk).username, "ines2")
@@ -0,0 +1,62 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from blog.models import BlogPost
+from community import popularity
+from community.models import MemberDirectoryEntry
+
+
+@override_settings(THUMBNAILS_ASYNC=False, POPULARITY_HALF_LIFE_DAYS=1, POPULARITY_DECAY_INTERVAL=3600)
+class PopularityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.member = User.objects.create_user(username="sam", email="sam@example.com", password="s3cret-pass")
+        self.viewer = User.objects.create_user(username="eva", email="eva@example.com", password="s3cret-pass")
+
+    def _score(self):
+        self.member.refresh_from_db(fields=["popularity_score"])
+        return self.member.popularity_score
+
+    def test_views_are_counted_once_per_viewer_and_folded(self):
+        url = reverse("member_profile", kwargs={"username": "sam"})
+        self.client.force_login(self.viewer)
+        self.client.get(url, secure=True)
+        self.client.get(url, secure=True)
+        self.client.force_login(self.member)
+        self.client.get(url, secure=True)  # Own profile: not counted.
+        self.client.logout()
+        # A spoofed X-Forwarded-For does not make a new anonymous viewer.
+        for hop in ("198.51.100.1", "198.51.100.2"):
+            self.client.get(url, secure=True, HTTP_X_FORWARDED_FOR=hop, REMOTE_ADDR="203.0.113.9")
+        self.assertEqual(self._score(), 0)
+
+        self.assertTrue(popularity.record(self.member.pk, "comment"))
+        result = popularity.fold(now=1_000_000)
+        self.assertEqual(result["points"], 1 + 1 + 5)
+        self.assertEqual(self._score(), 7)
+        self.assertEqual(MemberDirectoryEntry.objects.get(pk=self.member.pk).popularity_score, 7)
+
+    def test_scores_decay_by_half_life(self):
+        get_user_model().objects.filter(pk=self.member.pk).update(popularity_score=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            popularity.fold(now=1_000_000)  # Starts the decay clock.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(popularity.fold(now=1_000_000 + 1800)["decay"], 1.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertAlmostEqual(popularity.fold(now=1_000_000 + 86400)["decay"], 0.5)
+        self.assertEqual(self._score(), 50)
+
+    @mock.patch("blog.views.verify_recaptcha", return_value=(True, None))
+    def test_comments_are_credited_once_per_commenter_and_post(self, _recaptcha):
+        post = BlogPost.objects.create(title="Hello", content="...", author=self.member, image="blog_images/x.jpg")
+        self.client.force_login(self.viewer)
+        url = reverse("blog:add_comment", kwargs={"slug": post.slug})
+        for text in ("first", "second", "third"):
+            self.client.post(url, {"content": text}, secure=True)
+        self.assertEqual(post.comments.count(), 3)
+        self.assertEqual(popularity.fold(now=1_000_000)["points"], 5)
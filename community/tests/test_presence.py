@@ -0,0 +1,43 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from community import presence
+from middleware.presence import PresenceMiddleware
+
+
+@override_settings(THUMBNAILS_ASYNC=False, PRESENCE_TOUCH_INTERVAL=60)
+class PresenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        presence._recent_touches.clear()
+        self.user = get_user_model().objects.create_user(username="lea", email="lea@example.com", password="s3cret-pass")
+
+    def test_middleware_marks_user_online_once_per_interval(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        middleware = PresenceMiddleware(lambda request: HttpResponse("ok"))
+        with self.assertNumQueries(0):
+            middleware(request)
+            middleware(request)
+
+        self.assertEqual(presence.online_ids(), {self.user.pk})
+        self.assertTrue(presence.is_online(self.user.pk))
+        self.assertFalse(presence.touch(self.user.pk))
+
+    def test_flush_writes_last_login_in_batches(self):
+        other = get_user_model().objects.create_user(username="max", email="max@example.com", password="s3cret-pass")
+        seen = time.time() - 3600
+        presence.touch(self.user.pk, at=seen)
+        presence.touch(other.pk, at=seen + 10)
+        self.assertEqual(presence.online_ids(), set())
+
+        with self.assertNumQueries(2):
+            self.assertEqual(presence.flush_last_login(), 2)
+        self.user.refresh_from_db()
+        self.assertAlmostEqual(self.user.last_login.timestamp(), seen, places=3)
+        # Nothing new since the last flush.
+        self.assertEqual(presence.flush_last_login(), 0)
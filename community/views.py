@@ -1,14 +1,20 @@
 from __future__ import annotations
 
-from datetime import date, timedelta
+from datetime import date
 
-from django.core.paginator import Paginator
+from django.db.models.functions import Lower
 from django.http import Http404
 from django.shortcuts import get_object_or_404, render
 from django.utils.timezone import now
 
 from accounts.models import CustomUser
 from blog.models import BlogPost
+from irc.services import AnopeStatsService, is_on_irc
+
+from main import fragments
+
+from . import directory, popularity, presence
+from .models import MemberDirectoryEntry
 
 
 def _safe_birthdate_for_age(age_years: int) -> date:
@@ -19,22 +25,16 @@ def _safe_birthdate_for_age(age_years: int) -> date:
         # Handles Feb 29th on non-leap years.
         return date(today.year - age_years, today.month, 28)
 
-
-def _age_years_from_birthdate(birthdate: date) -> int:
-    today = date.today()
-    years = today.year - birthdate.year
-    if (today.month, today.day) < (birthdate.month, birthdate.day):
-        years -= 1
-    return max(years, 0)
-
 def community_membres(request):
-    members = CustomUser.objects.filter(public=True)
+    members = MemberDirectoryEntry.objects.all()
 
     # ✅ Filtering (Optional)
     gender = request.GET.get("gender")
     age_min = request.GET.get("age_min")
     age_max = request.GET.get("age_max")
     country = request.GET.get("country")
+    on_irc = request.GET.get("irc") == "1"
+    irc_online = AnopeStatsService().online_identities_cached()
 
     gender_map = {
         "male": "M",
@@ -48,7 +48,7 @@ def community_membres(request):
         mapped_gender = gender_map.get(gender, gender)
         members = members.filter(gender=mapped_gender)
 
-    # CustomUser.age is a birthdate (DateField). Filter by age in years.
+    # Entries store the birthdate. Filter by age in years.
     try:
         age_min_int = int(age_min) if age_min else None
     except (TypeError, ValueError):
@@ -61,32 +61,41 @@ def community_membres(request):
 
     if age_min_int is not None:
         min_birthdate = _safe_birthdate_for_age(age_min_int)
-        members = members.filter(age__lte=min_birthdate)
+        members = members.filter(birthdate__lte=min_birthdate)
     if age_max_int is not None:
         max_birthdate = _safe_birthdate_for_age(age_max_int)
-        members = members.filter(age__gte=max_birthdate)
+        members = members.filter(birthdate__gte=max_birthdate)
     if country:
-        members = members.filter(city__icontains=country)
+        members = directory.filter_place(members, country)
+    if on_irc:
+        # Valid usernames never contain the characters RFC 1459 folds
+        # specially, so LOWER(username) matches the folded IRC names.
+        # Identified accounts only (see irc.services.is_on_irc).
+        irc_names = irc_online["accounts"] if irc_online else ()
+        members = members.annotate(_username_ci=Lower("username")).filter(_username_ci__in=irc_names)
 
     # ✅ Sorting
-    order = request.GET.get("order", "last_active")
-    if order == "oldest":
-        members = members.order_by("date_joined")
-    elif order == "popular":
-        members = members.order_by("-popularity_score")
-    elif order == "most_active":
-        members = members.order_by("-last_login")
-    else:
-        members = members.order_by("-last_login")  # Default: Last Active
-
-    # ✅ Pagination (10 per page)
-    paginator = Paginator(members, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-
-    # ✅ Get current time and threshold for active users (5 minutes)
+    order = request.GET.get("order", directory.DEFAULT_ORDER)
+    if order not in directory.ORDERINGS:
+        order = directory.DEFAULT_ORDER
+
+    # ✅ Keyset pagination (10 per page)
+    page_obj = directory.keyset_page(
+        members,
+        order,
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+        per_page=10,
+    )
+    total = directory.cached_count(members, {
+        "gender": gender,
+        "age_min": age_min_int,
+        "age_max": age_max_int,
+        "country": country,
+        "irc": on_irc,
+    })
+
     current_time = now()
-    active_threshold = current_time - timedelta(minutes=5)
 
     ages = list(range(18, 81))
     gender_choices = list(CustomUser._meta.get_field("gender").choices)
@@ -96,11 +105,14 @@ def community_membres(request):
         "community/membres.html",
         {
             "members": page_obj,
+            "total": total,
             "order": order,
             "ages": ages,
             "gender_choices": gender_choices,
             "now": current_time,
-            "active_threshold": active_threshold,
+            "online_ids": presence.online_ids(),
+            "on_irc": on_irc,
+            "irc_online_ids": {member.pk for member in page_obj if is_on_irc(irc_online, member.username)},
         },
     )
 
@@ -112,10 +124,11 @@ def member_profile(request, username):
         if request.user != member and not request.user.is_staff:
             raise Http404
 
+    popularity.record(member.pk, "profile_view", viewer=popularity.viewer(request))
+
     current_time = now()
-    active_threshold = current_time - timedelta(minutes=5)
 
-    member_age_years = _age_years_from_birthdate(member.age) if member.age else None
+    member_age_years = directory.age_years(member.age)
 
     recent_posts = (
         BlogPost.objects.filter(author=member, is_active=True, is_published=True)
@@ -126,19 +139,10 @@ def member_profile(request, username):
     recent_media_posts = (
         BlogPost.objects.filter(author=member, is_active=True, is_published=True)
         .order_by("-created_at")
-        .only("title", "slug", "image")[:6]
+        .only("title", "slug", "image", "thumbnails")[:6]
     )
 
-    newest_members = (
-        CustomUser.objects.filter(public=True)
-        .order_by("-date_joined")
-        .only("username", "avatar", "last_login")[:5]
-    )
-    popular_members = (
-        CustomUser.objects.filter(public=True)
-        .order_by("-popularity_score")
-        .only("username", "avatar", "last_login")[:5]
-    )
+    sidebar = fragments.get_many(["newest_members", "popular_members"], request)
 
     return render(
         request,
@@ -148,9 +152,10 @@ def member_profile(request, username):
             "member_age_years": member_age_years,
             "recent_posts": recent_posts,
             "recent_media_posts": recent_media_posts,
-            "newest_members": newest_members,
-            "popular_members": popular_members,
+            "newest_members": sidebar["newest_members"][:5],
+            "popular_members": sidebar["popular_members"],
             "now": current_time,
-            "active_threshold": active_threshold,
+            "member_online": presence.is_online(member.pk),
+            "member_on_irc": is_on_irc(AnopeStatsService().online_identities_cached(), member.username),
         },
     )
\ No newline at end of file
@@ -0,0 +1,360 @@
+"""Local stand-in for the Anope JSON-RPC endpoint.
+
+Used by the IRC tests and the ``benchmark_irc`` management command so the
+service layer and the ``/irc/api/*`` views can be exercised without a live
+network. The server implements the ``anope.*`` and ``anope.chanstatsplus.*``
+methods called by :class:`irc.rpc_client.AnopeRPC` over a synthetic network
+of configurable size, with optional injected latency and errors.
+"""
+
+import base64
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+NOT_FOUND_CODE = -32099
+INJECTED_ERROR_CODE = -32000
+METHOD_NOT_FOUND_CODE = -32601
+
+_METRICS = (
+    "letters",
+    "words",
+    "lines",
+    "actions",
+    "smileys_happy",
+    "smileys_sad",
+    "smileys_other",
+    "kicks",
+    "kicked",
+    "modes",
+    "topics",
+)
+
+
+class MethodNotFound(Exception):
+    """Raised by :meth:`FakeAnopeNetwork.call` for methods it does not implement."""
+
+
+class FakeAnopeNetwork:
+    """Deterministic synthetic network (users, channels, servers, opers)."""
+
+    def __init__(self, users: int = 500, channels: int = 50, servers: int = 3, opers: int = 5, seed: int = 1):
+        rng = random.Random(seed)
+        self.servers: Dict[str, Dict[str, Any]] = {}
+        server_names = [f"irc{i}.example.net" for i in range(max(servers, 1))]
+        for index, name in enumerate(server_names):
+            self.servers[name] = {
+                "name": name,
+                "description": f"Fake server {index}",
+                "synced": True,
+                "uplink": server_names[0] if index else None,
+                "downlinks": server_names[1:] if index == 0 else [],
+            }
+
+        self.users: Dict[str, Dict[str, Any]] = {}
+        for index in range(users):
+            nick = f"nick{index}"
+            self.users[nick] = {
+                "nick": nick,
+                "account": f"account{index}" if index % 3 == 0 else None,
+                "ident": f"u{index}",
+                "host": f"host{index}.example.org",
+                "real": f"Fake user {index}",
+                "server": server_names[index % len(server_names)],
+                "channels": [],
+            }
+
+        nicks = list(self.users)
+        self.channels: Dict[str, Dict[str, Any]] = {}
+        for index in range(channels):
+            name = f"#chan{index}"
+            # Zipf-ish populations: a few large channels and a long tail.
+            size = min(len(nicks), max(1, int(len(nicks) / (index + 1) ** 0.8)))
+            members = rng.sample(nicks, size) if nicks else []
+            for nick in members:
+                self.users[nick]["channels"].append(name)
+            self.channels[name] = {
+                "name": name,
+                "users": members,
+                "modes": ["+nts"] if index % 10 == 9 else ["+nt"],
+                "topic": {"value": f"Topic for {name}", "setter": "ChanServ", "time": 1700000000 + index},
+                "created": 1600000000 + index,
+            }
+
+        self.opers: Dict[str, Dict[str, Any]] = {
+            nick: {"name": nick, "type": "Services Root" if index == 0 else "Services Operator"}
+            for index, nick in enumerate(nicks[:opers])
+        }
+
+        self.accounts: Dict[str, Dict[str, Any]] = {
+            entry["account"]: {"display": entry["account"], "nicks": [nick]}
+            for nick, entry in self.users.items()
+            if entry["account"]
+        }
+
+        self.chanstats: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for name, channel in self.channels.items():
+            self.chanstats[name] = {
+                nick: {metric: rng.randint(0, 500) for metric in _METRICS}
+                for nick in channel["users"][:50]
+            }
+
+    # ------------------------------------------------------------------
+    # Method handlers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _listing(items: Dict[str, Dict[str, Any]], detail: str):
+        if detail == "full":
+            return items
+        return list(items)
+
+    @staticmethod
+    def _lookup(items: Dict[str, Dict[str, Any]], name: str, kind: str):
+        if name not in items:
+            raise LookupError(f"No such {kind}: {name}")
+        return items[name]
+
+    def _top(self, rows: List[Dict[str, Any]], metric: str, limit: Any) -> List[Dict[str, Any]]:
+        try:
+            limit = max(1, int(limit))
+        except (TypeError, ValueError):
+            limit = 10
+        rows.sort(key=lambda row: row.get(metric, 0), reverse=True)
+        return rows[:limit]
+
+    def _channel_totals(self, metric: str) -> List[Dict[str, Any]]:
+        rows = []
+        for name, per_nick in self.chanstats.items():
+            totals = Counter()
+            for counters in per_nick.values():
+                totals.update(counters)
+            rows.append({"channel": name, **{m: totals.get(m, 0) for m in _METRICS}})
+        return rows
+
+    def _nick_totals(self) -> List[Dict[str, Any]]:
+        totals: Dict[str, Counter] = {}
+        for per_nick in self.chanstats.values():
+            for nick, counters in per_nick.items():
+                totals.setdefault(nick, Counter()).update(counters)
+        return [{"nick": nick, **{m: counter.get(m, 0) for m in _METRICS}} for nick, counter in totals.items()]
+
+    def call(self, method: str, params: List[str]) -> Any:
+        p = list(params) + [""] * 6
+
+        if method == "anope.listAccounts":
+            return self._listing(self.accounts, p[0])
+        if method == "anope.account":
+            return self._lookup(self.accounts, p[0], "account")
+        if method == "anope.listChannels":
+            return self._listing(self.channels, p[0])
+        if method == "anope.channel":
+            return self._lookup(self.channels, p[0], "channel")
+        if method == "anope.listOpers":
+            return self._listing(self.opers, p[0])
+        if method == "anope.oper":
+            return self._lookup(self.opers, p[0], "oper")
+        if method == "anope.listServers":
+            return self._listing(self.servers, p[0])
+        if method == "anope.server":
+            return self._lookup(self.servers, p[0], "server")
+        if method == "anope.listUsers":
+            return self._listing(self.users, p[0])
+        if method == "anope.user":
+            return self._lookup(self.users, p[0], "user")
+        if method in {"anope.messageNetwork", "anope.messageServer", "anope.messageUser"}:
+            return {"sent": True}
+        if method == "anope.checkCredentials":
+            return {"account": p[0]} if p[0] in self.accounts else None
+        if method == "anope.identify":
+            return {"identified": p[0] in self.accounts}
+        if method == "anope.listCommands":
+            return {service: [] for service in params}
+        if method == "anope.commands":
+            return []
+
+        if method == "anope.chanstatsplus.getChannel":
+            per_nick = self._lookup(self.chanstats, p[0], "channel")
+            return per_nick.get(p[1]) if p[1] else {"channel": p[0], "nicks": len(per_nick)}
+        if method == "anope.chanstatsplus.getNick":
+            rows = [row for row in self._nick_totals() if row["nick"] == p[0]]
+            return rows[0] if rows else None
+        if method == "anope.chanstatsplus.top":
+            per_nick = self.chanstats.get(p[0], {})
+            rows = [{"nick": nick, **counters} for nick, counters in per_nick.items()]
+            return self._top(rows, p[2] or "lines", p[3])
+        if method == "anope.chanstatsplus.topChannels":
+            return self._top(self._channel_totals(p[1] or "lines"), p[1] or "lines", p[2])
+        if method == "anope.chanstatsplus.topNicksGlobal":
+            return self._top(self._nick_totals(), p[1] or "lines", p[2])
+        if method == "anope.chanstatsplus.listNicksInChannel":
+            nicks = sorted(self.chanstats.get(p[0], {}))
+            offset, limit = int(p[4] or 0), int(p[3] or 50)
+            return nicks[offset:offset + limit]
+        if method == "anope.chanstatsplus.listChannelsForNick":
+            channels = sorted(name for name, per_nick in self.chanstats.items() if p[0] in per_nick)
+            offset, limit = int(p[4] or 0), int(p[3] or 50)
+            return channels[offset:offset + limit]
+
+        raise MethodNotFound(method)
+
+
+@dataclass
+class FaultPlan:
+    """Latency and error injection applied to every call."""
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    method_latency: Dict[str, float] = field(default_factory=dict)
+    failing_methods: set = field(default_factory=set)
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    def delay_for(self, method: str) -> float:
+        base = self.method_latency.get(method, self.latency)
+        if self.jitter:
+            with self._lock:
+                base += self._rng.uniform(0, self.jitter)
+        return max(base, 0.0)
+
+    def should_fail(self, method: str) -> bool:
+        if method in self.failing_methods:
+            return True
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeAnopeRPC/1.0"
+
+    def log_message(self, format, *args):  # noqa: A002 - silence stderr logging
+        return
+
+    def do_POST(self):
+        fake = self.server.fake
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._reply(400, {"jsonrpc": "2.0", "error": {"code": -32700, "message": "Parse error"}, "id": None})
+            return
+
+        method = request.get("method") or ""
+        request_id = request.get("id")
+        fake.record(method)
+
+        if fake.token and self.headers.get("Authorization") != fake.expected_authorization:
+            self._reply(401, {"jsonrpc": "2.0", "error": {"code": -32001, "message": "Unauthorized"}, "id": request_id})
+            return
+
+        delay = fake.faults.delay_for(method)
+        if delay:
+            time.sleep(delay)
+
+        if fake.faults.should_fail(method):
+            error = {"code": INJECTED_ERROR_CODE, "message": "Injected failure"}
+            self._reply(200, {"jsonrpc": "2.0", "error": error, "id": request_id})
+            return
+
+        try:
+            result = fake.network.call(method, request.get("params") or [])
+        except LookupError as exc:
+            error = {"code": NOT_FOUND_CODE, "message": str(exc)}
+            self._reply(200, {"jsonrpc": "2.0", "error": error, "id": request_id})
+            return
+        except MethodNotFound:
+            error = {"code": METHOD_NOT_FOUND_CODE, "message": "Method not found"}
+            self._reply(200, {"jsonrpc": "2.0", "error": error, "id": request_id})
+            return
+
+        self._reply(200, {"jsonrpc": "2.0", "result": result, "id": request_id})
+
+    def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeAnopeRPCServer:
+    """Threaded HTTP server speaking Anope's JSON-RPC dialect on loopback.
+
+    Usage::
+
+        with FakeAnopeRPCServer(network=FakeAnopeNetwork(users=2000)) as server:
+            rpc = AnopeRPC(host=server.url)
+    """
+
+    def __init__(
+        self,
+        network: Optional[FakeAnopeNetwork] = None,
+        faults: Optional[FaultPlan] = None,
+        token: Optional[str] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.network = network or FakeAnopeNetwork()
+        self.faults = faults or FaultPlan()
+        self.token = token
+        self._calls = Counter()
+        self._calls_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def expected_authorization(self) -> str:
+        return "Bearer " + base64.b64encode(self.token.encode("utf-8")).decode("ascii")
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/jsonrpc"
+
+    def record(self, method: str) -> None:
+        with self._calls_lock:
+            self._calls[method] += 1
+
+    def calls(self) -> Counter:
+        with self._calls_lock:
+            return Counter(self._calls)
+
+    def total_calls(self) -> int:
+        with self._calls_lock:
+            return sum(self._calls.values())
+
+    def reset_calls(self) -> None:
+        with self._calls_lock:
+            self._calls.clear()
+
+    def start(self) -> "FakeAnopeRPCServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-anope-rpc", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "FakeAnopeRPCServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
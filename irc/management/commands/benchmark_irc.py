@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import json
+import secrets
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from irc.fake_rpc import FakeAnopeNetwork, FakeAnopeRPCServer, FaultPlan
+from irc.rpc_client import RPCError
+from irc.services import AnopeStatsService
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the IRC service layer, dashboard and /irc/api/* views against a local "
+        "fake Anope JSON-RPC server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000, help="Fake network size: users (default: 2000)")
+        parser.add_argument("--channels", type=int, default=200, help="Fake network size: channels (default: 200)")
+        parser.add_argument("--servers", type=int, default=4, help="Fake network size: servers (default: 4)")
+        parser.add_argument("--opers", type=int, default=10, help="Fake network size: operators (default: 10)")
+        parser.add_argument("--latency-ms", type=float, default=5.0, help="Injected RPC latency per call (default: 5)")
+        parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra random RPC latency (default: 0)")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of RPC calls that fail (0-1)")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per target (default: 200)")
+        parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients (default: 4)")
+        parser.add_argument(
+            "--target",
+            action="append",
+            default=[],
+            help="Only run the given target(s): service, dashboard, or an API name such as api:channels.",
+        )
+        parser.add_argument("--json", action="store_true", help="Emit results as JSON instead of a table.")
+
+    # ------------------------------------------------------------------
+    # Targets
+    # ------------------------------------------------------------------
+
+    def _targets(self, token: str) -> Dict[str, Callable[[Client], Tuple[bool, int]]]:
+        def http(url: str):
+            def run(client: Client) -> Tuple[bool, int]:
+                response = client.get(url, HTTP_X_IRC_API_TOKEN=token, HTTP_ACCEPT_ENCODING="gzip")
+                return response.status_code < 400, len(response.content)
+
+            return run
+
+        def service(client: Client) -> Tuple[bool, int]:
+            svc = AnopeStatsService()
+            try:
+                svc.network_overview()
+                svc.channel_listing(limit=8)
+                svc.server_listing()
+                svc.user_listing(limit=25)
+                svc.operator_listing()
+            except RPCError:
+                return False, 0
+            return True, 0
+
+        return {
+            "service": service,
+            "dashboard": http(reverse("irc_dashboard")),
+            "api:overview": http(reverse("irc_api_network_overview")),
+            "api:channels": http(reverse("irc_api_channels")),
+            "api:channels-page": http(reverse("irc_api_channels") + "?limit=50&fields=name,user_count,topic_value"),
+            "api:servers": http(reverse("irc_api_servers")),
+            "api:users": http(reverse("irc_api_users") + "?limit=100"),
+            "api:user-detail": http(reverse("irc_api_user_detail", kwargs={"nickname": "nick1"})),
+            "api:operators": http(reverse("irc_api_operators")),
+            "api:top-channels": http(reverse("irc_api_chanstatsplus_top_channels") + "?period=total"),
+            "api:top-in-channel": http(
+                reverse("irc_api_chanstatsplus_top_in_channel", kwargs={"channel_name": "#chan0"}) + "?period=total"
+            ),
+        }
+
+    def _run_target(self, name, fn, server: FakeAnopeRPCServer, requests: int, concurrency: int) -> dict:
+        latencies: List[float] = []
+        failures = 0
+        total_bytes = 0
+        lock = threading.Lock()
+        server.reset_calls()
+
+        def worker(count: int):
+            nonlocal failures, total_bytes
+            client = Client()
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    try:
+                        ok, size = fn(client)
+                    except Exception:
+                        ok, size = False, 0
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        total_bytes += size
+                        if not ok:
+                            failures += 1
+            finally:
+                close_old_connections()
+
+        per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, [count for count in per_worker if count]))
+        wall = time.perf_counter() - started
+
+        done = len(latencies)
+        return {
+            "target": name,
+            "requests": done,
+            "errors": failures,
+            "throughput_rps": round(done / wall, 1) if wall else 0.0,
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+            "p90_ms": round(_percentile(latencies, 90) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+            "rpc_calls_per_request": round(server.total_calls() / done, 3) if done else 0.0,
+            "avg_bytes": int(total_bytes / done) if done else 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Entry point
+    # ------------------------------------------------------------------
+
+    def handle(self, *args, **options):
+        requests = max(1, int(options["requests"]))
+        concurrency = max(1, min(int(options["concurrency"]), 64))
+        error_rate = min(max(float(options["error_rate"]), 0.0), 1.0)
+
+        network = FakeAnopeNetwork(
+            users=max(0, options["users"]),
+            channels=max(0, options["channels"]),
+            servers=max(1, options["servers"]),
+            opers=max(0, options["opers"]),
+        )
+        faults = FaultPlan(
+            latency=max(0.0, options["latency_ms"]) / 1000.0,
+            jitter=max(0.0, options["jitter_ms"]) / 1000.0,
+            error_rate=error_rate,
+            seed=1,
+        )
+        api_token = secrets.token_urlsafe(16)
+
+        results = []
+        with FakeAnopeRPCServer(network=network, faults=faults) as server:
+            # A fresh cache prefix per run keeps benchmark keys away from live
+            # telemetry and makes the first pass of every target a cold start.
+            overrides = override_settings(
+                ANOPE_RPC_HOST=server.url,
+                ANOPE_RPC_TOKEN=None,
+                IRC_API_TOKEN=api_token,
+                IRC_STATS_CACHE_PREFIX=f"irc.bench.{secrets.token_hex(4)}",
+                ALLOWED_HOSTS=[*getattr(settings, "ALLOWED_HOSTS", []), "testserver"],
+            )
+            with overrides:
+                targets = self._targets(api_token)
+                selected = options["target"] or list(targets)
+                unknown = [name for name in selected if name not in targets]
+                if unknown:
+                    raise CommandError(f"Unknown target(s): {', '.join(unknown)}. Choices: {', '.join(targets)}")
+
+                for name in selected:
+                    results.append(self._run_target(name, targets[name], server, requests, concurrency))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        columns = ("target", "requests", "errors", "throughput_rps", "p50_ms", "p90_ms", "p99_ms", "max_ms",
+                   "rpc_calls_per_request", "avg_bytes")
+        self.stdout.write(
+            f"Fake network: users={options['users']} channels={options['channels']} "
+            f"latency={options['latency_ms']}ms error_rate={error_rate} concurrency={concurrency}"
+        )
+        self.stdout.write("  ".join(f"{col:>18}" if col != "target" else f"{col:<18}" for col in columns))
+        for row in results:
+            self.stdout.write(
+                "  ".join(f"{row[col]:>18}" if col != "target" else f"{row[col]:<18}" for col in columns)
+            )
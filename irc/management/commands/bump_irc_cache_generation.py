@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from irc.services import AnopeStatsService
+
+
+class Command(BaseCommand):
+    help = (
+        "Invalidate cached IRC stats by bumping the generation of one or more key families "
+        "(e.g. after an Anope reload or a normalizer change)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "families",
+            nargs="*",
+            help=f"Key families to invalidate: {', '.join(AnopeStatsService.CACHE_FAMILIES)}",
+        )
+        parser.add_argument("--all", action="store_true", help="Invalidate every family.")
+
+    def handle(self, *args, **options):
+        families = list(AnopeStatsService.CACHE_FAMILIES) if options["all"] else options["families"]
+        if not families:
+            raise CommandError("Give at least one family, or --all.")
+
+        unknown = [family for family in families if family not in AnopeStatsService.CACHE_FAMILIES]
+        if unknown:
+            raise CommandError(f"Unknown family(ies): {', '.join(unknown)}")
+
+        service = AnopeStatsService()
+        for family in families:
+            generation = service.bump_generation(family)
+            self.stdout.write(self.style.SUCCESS(f"{family}: generation {generation}"))
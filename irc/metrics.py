@@ -0,0 +1,218 @@
+"""Counters and histograms for Anope RPC calls and the IRC stats cache.
+
+Every counter is incremented straight in the shared cache (one atomic
+``INCRBY`` each), so all workers contribute to the same totals and a scrape
+never misses observations still held by an idle process. Label values are
+drawn from fixed sets, which keeps the number of series bounded and lets
+:func:`render_prometheus` enumerate them with a single ``get_many``.
+"""
+
+import functools
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+KEY_PREFIX = "irc.metrics"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+RPC_ERROR_KINDS = ("transport", "rpc", "decode")
+CACHE_RESULTS = ("hit", "miss", "stale")
+
+RPC_METHODS = (
+    "anope.listAccounts",
+    "anope.account",
+    "anope.listChannels",
+    "anope.channel",
+    "anope.listOpers",
+    "anope.oper",
+    "anope.listServers",
+    "anope.server",
+    "anope.listUsers",
+    "anope.user",
+    "anope.messageNetwork",
+    "anope.messageServer",
+    "anope.messageUser",
+    "anope.checkCredentials",
+    "anope.identify",
+    "anope.listCommands",
+    "anope.commands",
+    "anope.chanstatsplus.getChannel",
+    "anope.chanstatsplus.getNick",
+    "anope.chanstatsplus.top",
+    "anope.chanstatsplus.topChannels",
+    "anope.chanstatsplus.topNicksGlobal",
+    "anope.chanstatsplus.listNicksInChannel",
+    "anope.chanstatsplus.listChannelsForNick",
+    "other",
+)
+
+@functools.lru_cache(maxsize=None)
+def cache_families() -> Tuple[str, ...]:
+    """``AnopeStatsService.CACHE_FAMILIES`` plus "other" for anything else."""
+
+    # Imported lazily: irc.services imports this module.
+    from .services import AnopeStatsService
+
+    return (*AnopeStatsService.CACHE_FAMILIES, "other")
+
+
+def _enabled() -> bool:
+    return bool(getattr(settings, "IRC_METRICS_ENABLED", True))
+
+
+def _bucket_index(value: float, buckets: Tuple[float, ...]) -> int:
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            return index
+    return len(buckets)
+
+
+def _record(items: Iterable[Tuple[str, int]]) -> None:
+    for name, amount in items:
+        key = f"{KEY_PREFIX}.{name}"
+        try:
+            try:
+                cache.incr(key, amount)
+            except ValueError:
+                if not cache.add(key, amount, timeout=None):
+                    cache.incr(key, amount)
+        except Exception:
+            # Metrics must never break the request that produced them.
+            continue
+
+
+def observe_rpc(method: str, seconds: float, payload_bytes: int = 0, error: str = "") -> None:
+    """Record one Anope RPC call."""
+
+    if not _enabled():
+        return
+    if method not in RPC_METHODS:
+        method = "other"
+
+    items = [
+        (f"rpc.{method}.count", 1),
+        (f"rpc.{method}.latency_us", int(seconds * 1_000_000)),
+        (f"rpc.{method}.latency_bucket.{_bucket_index(seconds, LATENCY_BUCKETS)}", 1),
+    ]
+    if payload_bytes:
+        items.append((f"rpc.{method}.bytes", int(payload_bytes)))
+        items.append((f"rpc.{method}.bytes_bucket.{_bucket_index(payload_bytes, SIZE_BUCKETS)}", 1))
+    if error:
+        items.append((f"rpc.{method}.errors.{error if error in RPC_ERROR_KINDS else 'rpc'}", 1))
+    _record(items)
+
+
+def observe_cache(family: str, result: str) -> None:
+    """Record a stats cache lookup outcome (hit, miss or stale)."""
+
+    if not _enabled() or result not in CACHE_RESULTS:
+        return
+    if family not in cache_families():
+        family = "other"
+    _record([(f"cache.{family}.{result}", 1)])
+
+
+# ----------------------------------------------------------------------
+# Prometheus exposition
+# ----------------------------------------------------------------------
+
+
+def _series_names() -> List[str]:
+    names = []
+    for method in RPC_METHODS:
+        base = f"rpc.{method}"
+        names += [f"{base}.count", f"{base}.latency_us", f"{base}.bytes"]
+        names += [f"{base}.latency_bucket.{i}" for i in range(len(LATENCY_BUCKETS) + 1)]
+        names += [f"{base}.bytes_bucket.{i}" for i in range(len(SIZE_BUCKETS) + 1)]
+        names += [f"{base}.errors.{kind}" for kind in RPC_ERROR_KINDS]
+    for family in cache_families():
+        names += [f"cache.{family}.{result}" for result in CACHE_RESULTS]
+    return names
+
+
+def _fmt(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _histogram_lines(
+    metric: str,
+    labels: str,
+    values: Dict[str, int],
+    base: str,
+    buckets: Tuple[float, ...],
+    sum_value: float,
+) -> List[str]:
+    lines = []
+    running = 0
+    for index, bound in enumerate(buckets):
+        running += values.get(f"{base}.{index}", 0)
+        lines.append(f'{metric}_bucket{{{labels},le="{_fmt(bound)}"}} {running}')
+    running += values.get(f"{base}.{len(buckets)}", 0)
+    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {running}')
+    lines.append(f"{metric}_sum{{{labels}}} {_fmt(sum_value)}")
+    lines.append(f"{metric}_count{{{labels}}} {running}")
+    return lines
+
+
+def render_prometheus() -> str:
+    """Render the shared metrics in the Prometheus text exposition format."""
+
+    names = _series_names()
+    stored = cache.get_many([f"{KEY_PREFIX}.{name}" for name in names])
+    values = {name: int(stored.get(f"{KEY_PREFIX}.{name}") or 0) for name in names}
+
+    requests = ["# HELP irc_rpc_requests_total Anope JSON-RPC calls.", "# TYPE irc_rpc_requests_total counter"]
+    errors = ["# HELP irc_rpc_errors_total Failed Anope JSON-RPC calls.", "# TYPE irc_rpc_errors_total counter"]
+    latency = [
+        "# HELP irc_rpc_latency_seconds Anope JSON-RPC call latency.",
+        "# TYPE irc_rpc_latency_seconds histogram",
+    ]
+    sizes = [
+        "# HELP irc_rpc_response_bytes Anope JSON-RPC response body size.",
+        "# TYPE irc_rpc_response_bytes histogram",
+    ]
+
+    for method in RPC_METHODS:
+        base = f"rpc.{method}"
+        count = values[f"{base}.count"]
+        if not count:
+            continue
+        labels = f'method="{method}"'
+        requests.append(f"irc_rpc_requests_total{{{labels}}} {count}")
+        for kind in RPC_ERROR_KINDS:
+            errors.append(f'irc_rpc_errors_total{{{labels},kind="{kind}"}} {values[f"{base}.errors.{kind}"]}')
+        latency += _histogram_lines(
+            "irc_rpc_latency_seconds",
+            labels,
+            values,
+            f"{base}.latency_bucket",
+            LATENCY_BUCKETS,
+            values[f"{base}.latency_us"] / 1_000_000,
+        )
+        sizes += _histogram_lines(
+            "irc_rpc_response_bytes",
+            labels,
+            values,
+            f"{base}.bytes_bucket",
+            SIZE_BUCKETS,
+            values[f"{base}.bytes"],
+        )
+
+    cache_lines = [
+        "# HELP irc_stats_cache_requests_total IRC stats cache lookups by key family and result.",
+        "# TYPE irc_stats_cache_requests_total counter",
+    ]
+    for family in cache_families():
+        family_values = [values[f"cache.{family}.{result}"] for result in CACHE_RESULTS]
+        if not any(family_values):
+            continue
+        for result, value in zip(CACHE_RESULTS, family_values):
+            cache_lines.append(f'irc_stats_cache_requests_total{{family="{family}",result="{result}"}} {value}')
+
+    return "\n".join(requests + errors + latency + sizes + cache_lines) + "\n"
@@ -0,0 +1,84 @@
+import re
+from bisect import bisect_right
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from rest_framework.exceptions import ValidationError
+
+from main.cursors import InvalidCursor, decode_cursor, encode_cursor
+
+
+_FIELD_NAME_RE = re.compile(r"^[A-Za-z0-9_]+$")
+MAX_FIELDS = 20
+
+
+def channel_sort_key(entry: Dict[str, Any]) -> Tuple:
+    return (-int(entry.get("user_count") or 0), entry.get("name") or "")
+
+
+def server_sort_key(entry: Dict[str, Any]) -> Tuple:
+    return (not entry.get("synced", False), entry.get("name") or "")
+
+
+def name_sort_key(entry: Any) -> Tuple:
+    if isinstance(entry, dict):
+        return (entry.get("name") or "",)
+    return (str(entry),)
+
+
+def parse_fields(request) -> Optional[List[str]]:
+    """Parse the ``fields=`` projection parameter (comma separated)."""
+
+    raw = (request.query_params.get("fields") or "").strip()
+    if not raw:
+        return None
+
+    fields = []
+    for name in raw.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if not _FIELD_NAME_RE.match(name):
+            raise ValidationError(detail=f"Invalid field name: {name[:40]}")
+        if name not in fields:
+            fields.append(name)
+
+    if len(fields) > MAX_FIELDS:
+        raise ValidationError(detail=f"Too many fields (max {MAX_FIELDS})")
+    return fields or None
+
+
+def project(entries: Sequence[Dict[str, Any]], fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    if not fields:
+        return list(entries)
+    return [{name: entry[name] for name in fields if name in entry} for entry in entries]
+
+
+def paginate(
+    entries: Sequence[Any],
+    sort_key: Callable[[Any], Tuple],
+    cursor: Optional[str],
+    limit: Optional[int],
+) -> Tuple[List[Any], Optional[str]]:
+    """Keyset-paginate a listing that is already ordered by ``sort_key``.
+
+    The cursor carries the sort key of the last entry served, so pages stay
+    stable while channels gain or lose users between polls.
+    """
+
+    start = 0
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+            keys = [sort_key(entry) for entry in entries]
+            start = bisect_right(keys, position)
+        except (InvalidCursor, TypeError) as exc:
+            raise ValidationError(detail="Invalid cursor") from exc
+
+    if limit is None:
+        return list(entries[start:]), None
+
+    page = list(entries[start:start + limit])
+    next_cursor = None
+    if page and start + limit < len(entries):
+        next_cursor = encode_cursor(sort_key(page[-1]))
+    return page, next_cursor
@@ -50,3 +50,14 @@ class IRCAPIAuthPermission(BasePermission):
             return True
 
         return False
+
+
+class IRCOperatorPermission(IRCAPIAuthPermission):
+    """The API token header or a staff user; dashboard signatures are not enough.
+
+    The public dashboard mints signatures for every visitor, so endpoints
+    meant for operators only (metrics) must not accept them.
+    """
+
+    def _signature_valid(self, provided: Optional[str]) -> bool:
+        return False
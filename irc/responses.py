@@ -0,0 +1,40 @@
+import gzip
+from typing import Any, Dict
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+
+GZIP_MIN_LENGTH = 200
+
+
+def encode_json_bundle(data: Any) -> Dict[str, bytes]:
+    """Render ``data`` once and keep both the identity and gzip encodings."""
+
+    body = JSONRenderer().render(data)
+    bundle = {"identity": body}
+    if len(body) >= GZIP_MIN_LENGTH:
+        bundle["gzip"] = gzip.compress(body, compresslevel=6)
+    return bundle
+
+
+def _accepts_gzip(request) -> bool:
+    accept_encoding = (request.META.get("HTTP_ACCEPT_ENCODING") or "").lower()
+    return "gzip" in accept_encoding
+
+
+def encoded_json_response(request, bundle: Dict[str, bytes]) -> HttpResponse:
+    """Write a pre-encoded JSON bundle straight to the response."""
+
+    gzip_body = bundle.get("gzip")
+    if gzip_body is not None and _accepts_gzip(request):
+        response = HttpResponse(gzip_body, content_type="application/json")
+        # GZipMiddleware leaves responses with an explicit encoding alone.
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(bundle["identity"], content_type="application/json")
+
+    if gzip_body is not None:
+        patch_vary_headers(response, ("Accept-Encoding",))
+    return response
@@ -1,10 +1,14 @@
 import base64
 import os
+import time
 import uuid
 
 import requests
 
+from . import metrics
 
+
+DEFAULT_RPC_HOST = os.getenv("ANOPE_RPC_HOST", "http://127.0.0.1:5600/jsonrpc")
 DEFAULT_RPC_TOKEN = os.getenv("ANOPE_RPC_TOKEN")
 
 
@@ -12,11 +16,15 @@ class RPCError(RuntimeError):
     """Raised when the JSON-RPC endpoint reports an error."""
 
 
+class RPCTransportError(RPCError):
+    """Raised when the JSON-RPC endpoint cannot be reached at all."""
+
+
 class AnopeRPC:
     """Thin client modeled after docs/RPC/jsonrpc.rb."""
 
-    def __init__(self, host="http://127.0.0.1:5600/jsonrpc", token=None):
-        self.host = host
+    def __init__(self, host=None, token=None):
+        self.host = host or DEFAULT_RPC_HOST
         self.token = token or DEFAULT_RPC_TOKEN
 
     def _headers(self):
@@ -34,16 +42,27 @@ class AnopeRPC:
             "id": uuid.uuid4().hex,
         }
 
+        started = time.perf_counter()
         try:
             response = requests.post(self.host, json=payload, headers=self._headers(), timeout=5)
             response.raise_for_status()
         except requests.exceptions.RequestException as exc:
-            raise RPCError(f"RPC request failed: {exc}") from exc
+            metrics.observe_rpc(method, time.perf_counter() - started, error="transport")
+            raise RPCTransportError(f"RPC request failed: {exc}") from exc
+
+        payload_bytes = len(response.content or b"")
+        try:
+            data = response.json()
+        except ValueError:
+            metrics.observe_rpc(method, time.perf_counter() - started, payload_bytes, error="decode")
+            raise
 
-        data = response.json()
         if "error" in data:
+            metrics.observe_rpc(method, time.perf_counter() - started, payload_bytes, error="rpc")
             err = data["error"]
             raise RPCError(f"JSON-RPC returned {err.get('code')}: {err.get('message')}")
+
+        metrics.observe_rpc(method, time.perf_counter() - started, payload_bytes)
         return data.get("result")
 
     # rpc_data helpers
@@ -1,46 +1,256 @@
 import logging
-from typing import Any, Dict, List, Optional
+import time
+import uuid
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
 
 from django.conf import settings
 from django.core.cache import cache
 from django.utils import timezone
 
-from .rpc_client import AnopeRPC, RPCError
+from . import metrics
+from .pagination import channel_sort_key, server_sort_key
+from .rpc_client import AnopeRPC, RPCTransportError
 
 
 logger = logging.getLogger(__name__)
 
+# Per-process memo of family generations: {generation key: (value, expires_at)}.
+_generation_memo: Dict[str, Tuple[int, float]] = {}
+
+# RFC 1459 case mapping: "[", "]", "\\" and "~" fold to "{", "}", "|" and "^".
+_IRC_CASEFOLD = str.maketrans("[]\\~", "{}|^")
+
+
+def irc_casefold(name: str) -> str:
+    """Fold a nick or account name the way the IRC server compares them."""
+
+    return (name or "").lower().translate(_IRC_CASEFOLD)
+
+
+def is_on_irc(identities: Optional[Dict[str, FrozenSet[str]]], username: str) -> bool:
+    """Whether someone on IRC is identified to the ``username`` account.
+
+    Nicks are not enough: anyone can take a member's nick without
+    identifying. ``identities`` is
+    :meth:`AnopeStatsService.online_identities_cached`; ``None`` (nothing
+    cached yet) means nobody is shown as online.
+    """
+
+    if not identities or not username:
+        return False
+    return irc_casefold(username) in identities["accounts"]
+
 
 class AnopeStatsService:
     """Cached helper around the Anope JSON-RPC surface."""
 
     NETWORK_OVERVIEW_KEY = "network.overview"
+    ONLINE_IDENTITIES_KEY = "users.online"
+    USER_NAMES_KEY = "users.names"
+    CHANNELS_KEY = "channels.public"
+    SERVERS_KEY = "servers.full"
+    OPERATORS_KEY = "opers.full"
+
+    NETWORK_OVERVIEW_TTL = 10
+    CHANNELS_TTL = 30
+    SERVERS_TTL = 30
+    OPERATORS_TTL = 60
+    USER_NAMES_TTL = 10
+
+    # Listings served as pre-encoded JSON (see ``irc.views``). Only these
+    # carry a payload version and keep a stale copy for Anope outages;
+    # per-name lookups (channel.X, user.X, chanstats) store the payload only.
+    ENCODED_KEYS = frozenset({NETWORK_OVERVIEW_KEY, CHANNELS_KEY, SERVERS_KEY, OPERATORS_KEY})
+    STALE_KEYS = ENCODED_KEYS | {ONLINE_IDENTITIES_KEY}
+
+    # Key families that can be invalidated as a whole by bumping their
+    # generation (see ``bump_generation``).
+    CACHE_FAMILIES = (
+        "network",
+        "channels",
+        "channel",
+        "servers",
+        "server",
+        "users",
+        "user",
+        "opers",
+        "chanstatsplus.top_channels",
+        "chanstatsplus.top_nicks_global",
+        "chanstatsplus.top_in_channel",
+    )
+
+    # chanstats limits are rounded up to one of these before hitting the
+    # cache, so arbitrary ?limit= values cannot multiply keys.
+    LIMIT_BUCKETS = (10, 25, 50, 100)
 
     def __init__(
         self,
         rpc: Optional[AnopeRPC] = None,
-        cache_prefix: str = "irc.stats",
+        cache_prefix: Optional[str] = None,
         default_ttl: int = 20,
     ) -> None:
-        self.rpc = rpc or AnopeRPC(token=getattr(settings, "ANOPE_RPC_TOKEN", None))
-        self.cache_prefix = cache_prefix
+        self.rpc = rpc or AnopeRPC(
+            host=getattr(settings, "ANOPE_RPC_HOST", None),
+            token=getattr(settings, "ANOPE_RPC_TOKEN", None),
+        )
+        self.cache_prefix = cache_prefix or getattr(settings, "IRC_STATS_CACHE_PREFIX", "irc.stats")
         self.default_ttl = default_ttl
+        self.stale_ttl = int(getattr(settings, "IRC_STATS_STALE_TTL", 600) or 0)
+        # Version of each ENCODED_KEYS payload this instance last handed out.
+        self._served_versions: Dict[str, Optional[str]] = {}
 
     # ------------------------------------------------------------------
     # Cache helpers
     # ------------------------------------------------------------------
 
     def _cache_key(self, suffix: str) -> str:
+        family = self._cache_family(suffix)
+        if family in self.CACHE_FAMILIES:
+            return f"{self.cache_prefix}.g{self.generation(family)}.{suffix}"
         return f"{self.cache_prefix}.{suffix}"
 
+    def _generation_key(self, family: str) -> str:
+        return f"{self.cache_prefix}.gen.{family}"
+
+    def generation(self, family: str) -> int:
+        """Current generation of ``family``, memoized per process for a few seconds."""
+
+        gen_key = self._generation_key(family)
+        now = time.monotonic()
+        memo = _generation_memo.get(gen_key)
+        if memo is not None and memo[1] > now:
+            return memo[0]
+
+        value = cache.get(gen_key)
+        if value is None:
+            # Seed from the clock rather than 1: if the counter is ever evicted
+            # the new generation cannot collide with keys written under an
+            # older one.
+            value = int(time.time())
+            if not cache.add(gen_key, value, timeout=None):
+                value = cache.get(gen_key) or value
+        self._remember_generation(gen_key, int(value), now)
+        return int(value)
+
+    @staticmethod
+    def _remember_generation(gen_key: str, value: int, now: Optional[float] = None) -> None:
+        ttl = float(getattr(settings, "IRC_STATS_GENERATION_MEMO_SECONDS", 5) or 0)
+        if ttl <= 0:
+            _generation_memo.pop(gen_key, None)
+            return
+        _generation_memo[gen_key] = (value, (now or time.monotonic()) + ttl)
+
+    def bump_generation(self, family: str) -> int:
+        """Invalidate every cached key of ``family`` and return the new generation.
+
+        Other processes pick the new generation up once their memo expires
+        (``IRC_STATS_GENERATION_MEMO_SECONDS``); old keys simply age out.
+        """
+
+        if family not in self.CACHE_FAMILIES:
+            raise ValueError(f"Unknown IRC stats cache family: {family}")
+        gen_key = self._generation_key(family)
+        try:
+            value = cache.incr(gen_key)
+        except ValueError:
+            value = self.generation(family) + 1
+            cache.set(gen_key, value, timeout=None)
+        self._remember_generation(gen_key, int(value))
+        return int(value)
+
+    @staticmethod
+    def _cache_family(key: str) -> str:
+        parts = key.split(".")
+        if parts[0] == "chanstatsplus" and len(parts) > 1:
+            return ".".join(parts[:2])
+        return parts[0]
+
+    def _version_key(self, key: str) -> str:
+        return f"{self._cache_key(key)}.version"
+
+    def _stale_key(self, key: str) -> str:
+        return f"{self._cache_key(key)}.stale"
+
+    def _store(self, key: str, payload: Any, ttl: Optional[int] = None) -> Optional[str]:
+        ttl = ttl or self.default_ttl
+        version = None
+        if key in self.ENCODED_KEYS:
+            # Every write gets a fresh version so pre-encoded responses built
+            # from an older payload are never served again.
+            version = uuid.uuid4().hex[:12]
+            cache.set_many({self._cache_key(key): payload, self._version_key(key): version}, ttl)
+        else:
+            cache.set(self._cache_key(key), payload, ttl)
+        if key in self.STALE_KEYS and self.stale_ttl and payload is not None:
+            cache.set(self._stale_key(key), payload, self.stale_ttl)
+        return version
+
     def _cached(self, key: str, producer, ttl: Optional[int] = None):
         cache_key = self._cache_key(key)
-        payload = cache.get(cache_key)
-        if payload is None:
+        family = self._cache_family(key)
+        if key in self.ENCODED_KEYS:
+            # Read the version in the same round-trip as the payload, so
+            # served_version() names the payload that was actually returned.
+            version_key = self._version_key(key)
+            found = cache.get_many([cache_key, version_key])
+            payload = found.get(cache_key)
+            self._served_versions[key] = found.get(version_key)
+        else:
+            payload = cache.get(cache_key)
+        if payload is not None:
+            metrics.observe_cache(family, "hit")
+            return payload
+
+        try:
             payload = producer()
-            cache.set(cache_key, payload, ttl or self.default_ttl)
+        except RPCTransportError as exc:
+            # Anope is unreachable: keep serving the last good payload for a
+            # while instead of failing every page that shows telemetry.
+            stale = cache.get(self._stale_key(key)) if self.stale_ttl and key in self.STALE_KEYS else None
+            metrics.observe_cache(family, "miss" if stale is None else "stale")
+            if stale is None:
+                raise
+            logger.warning("Serving stale %s after RPC failure: %s", key, exc)
+            self._served_versions[key] = None
+            return stale
+
+        metrics.observe_cache(family, "miss")
+        version = self._store(key, payload, ttl)
+        if key in self.ENCODED_KEYS:
+            self._served_versions[key] = version
         return payload
 
+    # ------------------------------------------------------------------
+    # Pre-encoded responses
+    # ------------------------------------------------------------------
+
+    def payload_version(self, key: str) -> Optional[str]:
+        return cache.get(self._version_key(key))
+
+    def served_version(self, key: str) -> Optional[str]:
+        """Version of the ``key`` payload this instance last returned.
+
+        None for a stale copy or a payload whose version was evicted: a body
+        encoded from it must not be cached under any version.
+        """
+
+        return self._served_versions.get(key)
+
+    def _encoded_key(self, name: str, version: str) -> str:
+        return self._cache_key(f"json.{name}.{version}")
+
+    def encoded_payload(self, name: str, version: str) -> Optional[Dict[str, bytes]]:
+        return cache.get(self._encoded_key(name, version))
+
+    def store_encoded_payload(
+        self,
+        name: str,
+        version: str,
+        bundle: Dict[str, bytes],
+        ttl: Optional[int] = None,
+    ) -> None:
+        cache.set(self._encoded_key(name, version), bundle, ttl or self.default_ttl)
+
     # ------------------------------------------------------------------
     # Normalizers
     # ------------------------------------------------------------------
@@ -95,7 +305,9 @@ class AnopeStatsService:
             entry["topic_value"] = topic.get("value")
             channels.append(entry)
 
-        channels.sort(key=lambda c: c.get("user_count", 0), reverse=True)
+        # Ties are broken by name so keyset cursors see a total order; cursors
+        # bisect on the same key, so both orders must agree.
+        channels.sort(key=channel_sort_key)
         return channels
 
     def _normalize_servers(self, raw: Any) -> List[Dict[str, Any]]:
@@ -113,16 +325,48 @@ class AnopeStatsService:
             entry["downlink_count"] = len(entry.get("downlinks") or [])
             servers.append(entry)
 
-        servers.sort(key=lambda srv: (not srv.get("synced", False), srv.get("name", "")))
+        servers.sort(key=server_sort_key)
         return servers
 
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
 
-    def _build_network_overview(self) -> Dict[str, Any]:
+    @staticmethod
+    def _online_identities(raw: Any) -> Dict[str, FrozenSet[str]]:
+        if isinstance(raw, dict):
+            entries = raw.items()
+        elif isinstance(raw, list):
+            entries = ((entry, {}) if isinstance(entry, str) else (entry.get("nick"), entry) for entry in raw)
+        else:
+            entries = []
+
+        nicks, accounts = set(), set()
+        for nick, data in entries:
+            if nick:
+                nicks.add(irc_casefold(nick))
+            account = (data or {}).get("account") if isinstance(data, dict) else None
+            if account:
+                accounts.add(irc_casefold(account))
+        return {"nicks": frozenset(nicks), "accounts": frozenset(accounts)}
+
+    @staticmethod
+    def _user_names(raw: Any) -> List[str]:
+        if isinstance(raw, dict):
+            names = raw.keys()
+        elif isinstance(raw, list):
+            names = (entry if isinstance(entry, str) else (entry or {}).get("nick") for entry in raw)
+        else:
+            names = []
+        return sorted(name for name in names if name)
+
+    def _build_network_overview(self, ttl: Optional[int] = None) -> Dict[str, Any]:
         channels = self.rpc.list_channels("name") or []
-        users = self.rpc.list_users("name") or []
+        users = self.rpc.list_users("full") or []
+        # The same listing gives who is on IRC right now and the nick list
+        # served by user_listing(), so neither needs its own listUsers call.
+        self._store(self.ONLINE_IDENTITIES_KEY, self._online_identities(users), ttl or self.NETWORK_OVERVIEW_TTL)
+        self._store(self.USER_NAMES_KEY, self._user_names(users), ttl or self.USER_NAMES_TTL)
         servers = self.rpc.list_servers("name") or []
         operators = self.rpc.list_opers("name") or []
         return {
@@ -136,14 +380,33 @@ class AnopeStatsService:
         }
 
     def network_overview(self) -> Dict[str, Any]:
-        return self._cached(self.NETWORK_OVERVIEW_KEY, self._build_network_overview, ttl=10)
+        return self._cached(
+            self.NETWORK_OVERVIEW_KEY,
+            lambda: self._build_network_overview(self.NETWORK_OVERVIEW_TTL),
+            ttl=self.NETWORK_OVERVIEW_TTL,
+        )
 
     def network_overview_cached(self) -> Optional[Dict[str, Any]]:
-        return cache.get(self._cache_key(self.NETWORK_OVERVIEW_KEY))
+        payload = cache.get(self._cache_key(self.NETWORK_OVERVIEW_KEY))
+        metrics.observe_cache("network", "miss" if payload is None else "hit")
+        return payload
 
     def refresh_network_overview_cache(self, ttl: Optional[int] = None) -> Dict[str, Any]:
-        payload = self._build_network_overview()
-        cache.set(self._cache_key(self.NETWORK_OVERVIEW_KEY), payload, ttl or self.default_ttl)
+        payload = self._build_network_overview(ttl)
+        self._store(self.NETWORK_OVERVIEW_KEY, payload, ttl)
+        return payload
+
+    def online_identities_cached(self) -> Optional[Dict[str, FrozenSet[str]]]:
+        """Case-folded ``{"nicks", "accounts"}`` online on IRC, from cache only.
+
+        Filled whenever the network overview is built; falls back to the last
+        known set while Anope is unreachable.
+        """
+
+        payload = cache.get(self._cache_key(self.ONLINE_IDENTITIES_KEY))
+        if payload is None and self.stale_ttl:
+            payload = cache.get(self._stale_key(self.ONLINE_IDENTITIES_KEY))
+        metrics.observe_cache("users", "miss" if payload is None else "hit")
         return payload
 
     def channel_listing(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
@@ -153,7 +416,7 @@ class AnopeStatsService:
 
         entries = [
             entry
-            for entry in self._cached("channels.public.v1", fetch, ttl=30)
+            for entry in self._cached(self.CHANNELS_KEY, fetch, ttl=self.CHANNELS_TTL)
             if not entry.get("is_secret")
         ]
         if limit is not None:
@@ -161,52 +424,38 @@ class AnopeStatsService:
         return list(entries)
 
     def channel_detail(self, name: str) -> Optional[Dict[str, Any]]:
-        cache_key = self._cache_key(f"channel.{name}")
-        payload = cache.get(cache_key)
-        if payload is None:
-            payload = self.rpc.channel(name)
-            cache.set(cache_key, payload, self.default_ttl)
-        return payload
+        return self._cached(f"channel.{name}", lambda: self.rpc.channel(name))
 
     def server_listing(self) -> List[Dict[str, Any]]:
         def fetch():
             raw = self.rpc.list_servers("full")
             return self._normalize_servers(raw)
 
-        return list(self._cached("servers.full", fetch, ttl=30))
+        return list(self._cached(self.SERVERS_KEY, fetch, ttl=self.SERVERS_TTL))
 
     def server_detail(self, name: str) -> Optional[Dict[str, Any]]:
-        cache_key = self._cache_key(f"server.{name}")
-        payload = cache.get(cache_key)
-        if payload is None:
-            payload = self.rpc.server(name)
-            cache.set(cache_key, payload, self.default_ttl)
-        return payload
+        return self._cached(f"server.{name}", lambda: self.rpc.server(name))
 
-    def user_listing(self, limit: int = 50) -> List[str]:
+    def user_listing(self, limit: Optional[int] = 50) -> List[str]:
         def fetch():
             names = self.rpc.list_users("name") or []
             return sorted(names)
 
-        users = self._cached("users.names", fetch, ttl=10)
+        # Normally already filled by the network overview refresh.
+        users = self._cached(self.USER_NAMES_KEY, fetch, ttl=self.USER_NAMES_TTL)
         return users[:limit]
 
     def user_detail(self, nickname: str) -> Optional[Dict[str, Any]]:
-        cache_key = self._cache_key(f"user.{nickname}")
-        payload = cache.get(cache_key)
-        if payload is None:
-            payload = self.rpc.user(nickname)
-            cache.set(cache_key, payload, self.default_ttl)
-        return payload
+        return self._cached(f"user.{nickname}", lambda: self.rpc.user(nickname))
 
     def operator_listing(self) -> List[Dict[str, Any]]:
         def fetch():
             data = self.rpc.list_opers("full")
             if isinstance(data, dict):
-                return [dict(entry or {}, name=name) for name, entry in data.items()]
+                return [dict(entry or {}, name=name) for name, entry in sorted(data.items())]
             return []
 
-        return list(self._cached("opers.full", fetch, ttl=60))
+        return list(self._cached(self.OPERATORS_KEY, fetch, ttl=self.OPERATORS_TTL))
 
     # ------------------------------------------------------------------
     # chanstats_plus (third-party)
@@ -248,6 +497,13 @@ class AnopeStatsService:
         value = max(1, value)
         return min(value, max_value)
 
+    @classmethod
+    def _limit_bucket(cls, limit: int) -> int:
+        for bucket in cls.LIMIT_BUCKETS:
+            if limit <= bucket:
+                return bucket
+        return limit
+
     def chanstatsplus_top_channels(
         self,
         period: str = "daily",
@@ -260,13 +516,14 @@ class AnopeStatsService:
         limit = self._clean_limit(limit, default=10)
         pstart = (period_start or "").strip()
 
-        cache_key = f"chanstatsplus.top_channels.{period}.{metric}.{limit}.{pstart or 'auto'}"
+        bucket = self._limit_bucket(limit)
+        cache_key = f"chanstatsplus.top_channels.{period}.{metric}.{bucket}.{pstart or 'auto'}"
 
         def fetch():
-            data = self.rpc.chanstatsplus_top_channels(period=period, metric=metric, limit=limit, period_start=pstart)
+            data = self.rpc.chanstatsplus_top_channels(period=period, metric=metric, limit=bucket, period_start=pstart)
             return data if isinstance(data, list) else []
 
-        return list(self._cached(cache_key, fetch, ttl=30))
+        return list(self._cached(cache_key, fetch, ttl=30))[:limit]
 
     def chanstatsplus_top_nicks_global(
         self,
@@ -280,13 +537,14 @@ class AnopeStatsService:
         limit = self._clean_limit(limit, default=10)
         pstart = (period_start or "").strip()
 
-        cache_key = f"chanstatsplus.top_nicks_global.{period}.{metric}.{limit}.{pstart or 'auto'}"
+        bucket = self._limit_bucket(limit)
+        cache_key = f"chanstatsplus.top_nicks_global.{period}.{metric}.{bucket}.{pstart or 'auto'}"
 
         def fetch():
-            data = self.rpc.chanstatsplus_top_nicks_global(period=period, metric=metric, limit=limit, period_start=pstart)
+            data = self.rpc.chanstatsplus_top_nicks_global(period=period, metric=metric, limit=bucket, period_start=pstart)
             return data if isinstance(data, list) else []
 
-        return list(self._cached(cache_key, fetch, ttl=30))
+        return list(self._cached(cache_key, fetch, ttl=30))[:limit]
 
     def chanstatsplus_top_in_channel(
         self,
@@ -305,16 +563,19 @@ class AnopeStatsService:
         limit = self._clean_limit(limit, default=10)
         pstart = (period_start or "").strip()
 
-        cache_key = f"chanstatsplus.top_in_channel.{channel_clean}.{period}.{metric}.{limit}.{pstart or 'auto'}"
+        bucket = self._limit_bucket(limit)
+        cache_key = (
+            f"chanstatsplus.top_in_channel.{channel_clean.lower()}.{period}.{metric}.{bucket}.{pstart or 'auto'}"
+        )
 
         def fetch():
             data = self.rpc.chanstatsplus_top(
                 channel=channel_clean,
                 period=period,
                 metric=metric,
-                limit=limit,
+                limit=bucket,
                 period_start=pstart,
             )
             return data if isinstance(data, list) else []
 
-        return list(self._cached(cache_key, fetch, ttl=30))
+        return list(self._cached(cache_key, fetch, ttl=30))[:limit]
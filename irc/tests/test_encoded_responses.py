@@ -0,0 +1,102 @@
+import gzip
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from irc.services import AnopeStatsService
+from irc.views import AnopeAPIView
+
+
+class FakeRPC:
+    def __init__(self):
+        self.calls = []
+
+    def _record(self, method):
+        self.calls.append(method)
+
+    def list_channels(self, detail="name"):
+        self._record("listChannels")
+        channels = {
+            f"#chan{i}": {"users": ["nick"] * i, "modes": ["+nt"], "topic": {"value": f"topic {i}"}}
+            for i in range(1, 30)
+        }
+        channels["#hidden"] = {"users": ["a", "b"], "modes": ["+s"]}
+        return channels if detail == "full" else list(channels)
+
+    def list_users(self, detail="name"):
+        self._record("listUsers")
+        return ["alice", "bob"]
+
+    def list_servers(self, detail="name"):
+        self._record("listServers")
+        return {"irc.example.net": {"synced": True, "downlinks": []}} if detail == "full" else ["irc.example.net"]
+
+    def list_opers(self, detail="name"):
+        self._record("listOpers")
+        return {"alice": {"type": "admin"}} if detail == "full" else ["alice"]
+
+
+@override_settings(IRC_API_TOKEN="test-token")
+class EncodedResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rpc = FakeRPC()
+        rpc = self.rpc
+
+        class Service(AnopeStatsService):
+            def __init__(self):
+                super().__init__(rpc=rpc)
+
+        patcher = mock.patch.object(AnopeAPIView, "service_class", Service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get(self, name, **extra):
+        return self.client.get(reverse(name), HTTP_X_IRC_API_TOKEN="test-token", **extra)
+
+    def test_channel_listing_is_served_from_encoded_cache(self):
+        first = self._get("irc_api_channels")
+        self.assertEqual(first.status_code, 200)
+        calls_after_first = len(self.rpc.calls)
+
+        with mock.patch("irc.views.encode_json_bundle") as encode:
+            second = self._get("irc_api_channels")
+        encode.assert_not_called()
+
+        self.assertEqual(len(self.rpc.calls), calls_after_first)
+        self.assertEqual(first.content, second.content)
+        data = json.loads(second.content)
+        self.assertEqual(data["count"], 29)
+        self.assertNotIn("#hidden", [entry["name"] for entry in data["results"]])
+
+    def test_gzip_variant_is_used_when_accepted(self):
+        plain = self._get("irc_api_channels")
+        compressed = self._get("irc_api_channels", HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+
+    def test_payload_refresh_invalidates_encoded_body(self):
+        self._get("irc_api_network_overview")
+        service = AnopeStatsService(rpc=self.rpc)
+        before = service.payload_version(AnopeStatsService.NETWORK_OVERVIEW_KEY)
+        service.refresh_network_overview_cache()
+        after = service.payload_version(AnopeStatsService.NETWORK_OVERVIEW_KEY)
+        self.assertNotEqual(before, after)
+        self.assertIsNone(service.encoded_payload("overview", after))
+
+    def test_body_is_keyed_by_the_version_it_was_built_from(self):
+        original = AnopeStatsService.network_overview
+        other_worker = AnopeStatsService(rpc=self.rpc)
+
+        def overview_then_concurrent_refresh(service, *args, **kwargs):
+            data = original(service, *args, **kwargs)
+            other_worker.refresh_network_overview_cache()
+            return data
+
+        with mock.patch.object(AnopeStatsService, "network_overview", overview_then_concurrent_refresh):
+            self._get("irc_api_network_overview")
+        current = other_worker.payload_version(AnopeStatsService.NETWORK_OVERVIEW_KEY)
+        self.assertIsNone(other_worker.encoded_payload("overview", current))
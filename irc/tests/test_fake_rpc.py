@@ -0,0 +1,131 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from irc.fake_rpc import FakeAnopeNetwork, FakeAnopeRPCServer, FaultPlan
+from irc.rpc_client import AnopeRPC, RPCError, RPCTransportError
+from irc.services import AnopeStatsService, is_on_irc
+
+
+class FakeRPCServerTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeAnopeRPCServer(network=FakeAnopeNetwork(users=60, channels=12), token="rpc-secret").start()
+        cls.addClassCleanup(cls.server.stop)
+
+    def setUp(self):
+        cache.clear()
+        self.server.reset_calls()
+        self.server.faults = FaultPlan()
+        overrides = override_settings(
+            ANOPE_RPC_HOST=self.server.url,
+            ANOPE_RPC_TOKEN="rpc-secret",
+            IRC_API_TOKEN="api-token",
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def _get(self, url):
+        return self.client.get(url, HTTP_X_IRC_API_TOKEN="api-token")
+
+    def test_client_round_trip(self):
+        rpc = AnopeRPC(host=self.server.url, token="rpc-secret")
+        self.assertEqual(len(rpc.list_users("name")), 60)
+        with self.assertRaises(RPCError):
+            rpc.channel("#does-not-exist")
+        with self.assertRaisesMessage(RPCError, "-32601"):
+            rpc.run("anope.noSuchMethod")
+
+    def test_service_caches_between_calls(self):
+        service = AnopeStatsService()
+        service.network_overview()
+        service.network_overview()
+        self.assertEqual(self.server.calls()["anope.listChannels"], 1)
+
+    def test_views_map_rpc_errors(self):
+        missing = self._get(reverse("irc_api_channel_detail", kwargs={"channel_name": "#nope"}))
+        self.assertEqual(missing.status_code, 404)
+
+        self.server.faults = FaultPlan(failing_methods={"anope.listServers"})
+        unavailable = self._get(reverse("irc_api_servers"))
+        self.assertEqual(unavailable.status_code, 502)
+
+    def test_secret_channels_are_hidden(self):
+        response = self._get(reverse("irc_api_channels") + "?fields=name,modes&limit=100")
+        self.assertEqual(response.status_code, 200)
+        names = [entry["name"] for entry in response.json()["results"]]
+        self.assertEqual(len(names), 11)
+        self.assertNotIn("#chan9", names)
+
+    def test_stale_payload_served_when_anope_is_unreachable(self):
+        AnopeStatsService().server_listing()
+        AnopeStatsService().channel_detail("#chan1")
+        detail = "channel.#chan1"
+        self.assertIsNone(cache.get(AnopeStatsService()._stale_key(detail)))
+        self.assertIsNone(AnopeStatsService().payload_version(detail))
+        cache.delete(AnopeStatsService()._cache_key(AnopeStatsService.SERVERS_KEY))
+
+        with override_settings(ANOPE_RPC_HOST="http://127.0.0.1:9/jsonrpc"):
+            service = AnopeStatsService()
+            self.assertTrue(service.server_listing())
+            with self.assertRaises(RPCTransportError):
+                service.operator_listing()
+
+    def test_metrics_endpoint_reports_rpc_and_cache_series(self):
+        self._get(reverse("irc_api_servers"))
+        self._get(reverse("irc_api_servers"))
+        response = self._get(reverse("irc_api_metrics"))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('irc_rpc_requests_total{method="anope.listServers"} 1', body)
+        self.assertIn('irc_stats_cache_requests_total{family="servers",result="miss"} 1', body)
+        self.assertIn('irc_rpc_latency_seconds_bucket{method="anope.listServers",le="+Inf"} 1', body)
+
+        # Dashboard signatures are minted for anonymous visitors: not enough here.
+        from irc.views import _mint_api_signature
+
+        signed = self.client.get(reverse("irc_api_metrics"), HTTP_X_IRC_API_SIGNATURE=_mint_api_signature())
+        self.assertEqual(signed.status_code, 403)
+
+    def test_bumping_a_family_generation_forces_a_refetch(self):
+        service = AnopeStatsService()
+        service.server_listing()
+        service.operator_listing()
+        call_command("bump_irc_cache_generation", "servers", stdout=StringIO())
+        service.server_listing()
+        service.operator_listing()
+        calls = self.server.calls()
+        self.assertEqual(calls["anope.listServers"], 2)
+        self.assertEqual(calls["anope.listOpers"], 1)
+
+    def test_chanstats_limits_share_a_bucket(self):
+        service = AnopeStatsService()
+        self.assertEqual(len(service.chanstatsplus_top_channels(period="total", limit=3)), 3)
+        self.assertEqual(len(service.chanstatsplus_top_channels(period="total", limit=7)), 7)
+        self.assertEqual(self.server.calls()["anope.chanstatsplus.topChannels"], 1)
+
+    @override_settings(THUMBNAILS_ASYNC=False)
+    def test_online_identities_refresh_with_the_overview(self):
+        service = AnopeStatsService()
+        self.assertIsNone(service.online_identities_cached())
+        service.refresh_network_overview_cache(ttl=30)
+        self.assertEqual(len(service.user_listing(limit=None)), 60)
+        self.assertEqual(self.server.calls()["anope.listUsers"], 1)
+        online = service.online_identities_cached()
+        # An unidentified nick does not make a member show as online.
+        self.assertFalse(is_on_irc(online, "NICK1"))
+        self.assertTrue(is_on_irc(online, "Account3"))
+        self.assertFalse(is_on_irc(online, "account1"))
+
+        User = get_user_model()
+        User.objects.create_user(username="Account3", email="a3@example.com", password="s3cret-pass", public=True)
+        User.objects.create_user(username="Nick1", email="n1@example.com", password="s3cret-pass", public=True)
+        calls = sum(self.server.calls().values())
+        response = self.client.get(reverse("community_membres") + "?irc=1", secure=True)
+        self.assertEqual([m.username for m in response.context["members"]], ["Account3"])
+        self.assertEqual(sum(self.server.calls().values()), calls)
@@ -0,0 +1,45 @@
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ValidationError
+
+from irc.pagination import channel_sort_key, paginate, project
+
+
+def _channels(*counts):
+    return sorted(
+        ({"name": f"#c{i}", "user_count": count, "users": ["x"] * count} for i, count in enumerate(counts)),
+        key=channel_sort_key,
+    )
+
+
+class ListingPaginationTests(SimpleTestCase):
+    def test_cursor_walks_every_entry_once(self):
+        channels = _channels(9, 7, 7, 5, 3, 3, 1)
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = paginate(channels, channel_sort_key, cursor, 3)
+            seen.extend(entry["name"] for entry in page)
+            if not cursor:
+                break
+        self.assertEqual(seen, [entry["name"] for entry in channels])
+
+    def test_cursor_is_stable_when_earlier_entries_change(self):
+        channels = _channels(9, 7, 5, 3)
+        page, cursor = paginate(channels, channel_sort_key, None, 2)
+        self.assertEqual([c["user_count"] for c in page], [9, 7])
+
+        # The top channel empties out between polls; the next page must not
+        # repeat or skip the entries after the cursor.
+        channels = [dict(c) for c in channels]
+        channels[0]["user_count"] = 0
+        channels.sort(key=channel_sort_key)
+        page, _ = paginate(channels, channel_sort_key, cursor, 2)
+        self.assertEqual([c["user_count"] for c in page], [5, 3])
+
+    def test_invalid_cursor_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            paginate(_channels(1, 2), channel_sort_key, "not-a-cursor", 1)
+
+    def test_projection_keeps_only_requested_fields(self):
+        projected = project(_channels(2), ["name", "user_count", "missing"])
+        self.assertEqual(projected, [{"name": "#c0", "user_count": 2}])
@@ -6,6 +6,7 @@ from .views import (
     ChanstatsPlusTopNicksGlobalView,
     ChannelDetailView,
     ChannelListView,
+    MetricsView,
     NetworkOverviewView,
     TelemetryHistoryView,
     OperatorListView,
@@ -32,6 +33,7 @@ urlpatterns = [
     path("api/users/", UserListView.as_view(), name="irc_api_users"),
     path("api/users/<str:nickname>/", UserDetailView.as_view(), name="irc_api_user_detail"),
     path("api/operators/", OperatorListView.as_view(), name="irc_api_operators"),
+    path("api/metrics/", MetricsView.as_view(), name="irc_api_metrics"),
 
     # chanstats_plus (stats)
     path(
@@ -6,6 +6,7 @@ from functools import cached_property
 
 from django.conf import settings
 from django.core import signing
+from django.http import HttpResponse
 from django.shortcuts import render
 from django.utils import timezone
 from django.urls import reverse
@@ -13,8 +14,11 @@ from rest_framework.exceptions import APIException, NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from . import metrics
 from .models import TelemetrySnapshot
-from .permissions import IRCAPIAuthPermission
+from .pagination import channel_sort_key, name_sort_key, paginate, parse_fields, project, server_sort_key
+from .permissions import IRCAPIAuthPermission, IRCOperatorPermission
+from .responses import encode_json_bundle, encoded_json_response
 from .rpc_client import RPCError
 from .services import AnopeStatsService
 
@@ -203,6 +207,8 @@ class AnopeAPIView(APIView):
     not_found_markers = {"-32099", "-32098"}
     permission_classes = (IRCAPIAuthPermission,)
     throttle_scope = "irc_api"
+    listing_max_limit = 500
+    listing_params = ("fields", "limit", "cursor")
 
     @cached_property
     def service(self):
@@ -216,16 +222,67 @@ class AnopeAPIView(APIView):
         text = str(exc)
         return any(marker in text for marker in self.not_found_markers)
 
+    def _encoded_response(self, request, name: str, source_key: str, ttl: int, build):
+        """Serve the default response for ``source_key`` as cached JSON bytes.
+
+        The encoded body is keyed by the version of the cached payload it was
+        built from, so polling clients skip Python-level serialization until
+        the payload itself is refreshed.
+        """
+
+        service = self.service
+        version = service.payload_version(source_key)
+        if version:
+            bundle = service.encoded_payload(name, version)
+            if bundle:
+                return encoded_json_response(request, bundle)
 
-class NetworkOverviewView(AnopeAPIView):
-    def get(self, request):
         try:
-            payload = self.service.network_overview()
+            data = build()
         except RPCError as exc:
             self._raise_unavailable(exc)
+
+        # Key the body by the version of the payload build() actually read,
+        # not whatever version is current by now.
+        bundle = encode_json_bundle(data)
+        version = service.served_version(source_key)
+        if version:
+            service.store_encoded_payload(name, version, bundle, ttl=ttl)
+        return encoded_json_response(request, bundle)
+
+    def _is_default_listing(self, request, extra_params=()) -> bool:
+        params = (*self.listing_params, *extra_params)
+        return not any((request.query_params.get(name) or "").strip() for name in params)
+
+    def _parse_limit(self, request, default=None):
+        limit_param = request.query_params.get("limit")
+        try:
+            return min(max(int(limit_param), 1), self.listing_max_limit) if limit_param else default
+        except ValueError:
+            return default
+
+    def _listing_response(self, request, entries, sort_key, limit=None, fields=None):
+        """Apply cursor pagination and the ``fields=`` projection to a listing."""
+
+        cursor = (request.query_params.get("cursor") or "").strip()
+        page, next_cursor = paginate(entries, sort_key, cursor, limit)
+        payload = {"count": len(page), "results": project(page, fields)}
+        if limit is not None or cursor:
+            payload["next"] = next_cursor
         return Response(payload)
 
 
+class NetworkOverviewView(AnopeAPIView):
+    def get(self, request):
+        return self._encoded_response(
+            request,
+            "overview",
+            self.service_class.NETWORK_OVERVIEW_KEY,
+            self.service_class.NETWORK_OVERVIEW_TTL,
+            self.service.network_overview,
+        )
+
+
 class TelemetryHistoryView(APIView):
     """Serves DB-collected history for charts (independent of live RPC)."""
 
@@ -284,14 +341,36 @@ class TelemetryHistoryView(APIView):
         )
 
 
+class MetricsView(APIView):
+    """Prometheus scrape endpoint for Anope RPC and stats cache metrics."""
+
+    permission_classes = (IRCOperatorPermission,)
+
+    def get(self, request):
+        return HttpResponse(
+            metrics.render_prometheus(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+
+
 class ChannelListView(AnopeAPIView):
     def get(self, request):
+        if self._is_default_listing(request, extra_params=("q",)):
+            def build():
+                channels = self.service.channel_listing()
+                return {"count": len(channels), "results": channels}
+
+            return self._encoded_response(
+                request,
+                "channels",
+                self.service_class.CHANNELS_KEY,
+                self.service_class.CHANNELS_TTL,
+                build,
+            )
+
         query = request.query_params.get("q", "").strip().lower()
-        limit_param = request.query_params.get("limit")
-        try:
-            limit = min(max(int(limit_param), 1), 500) if limit_param else None
-        except ValueError:
-            limit = None
+        limit = self._parse_limit(request)
+        fields = parse_fields(request)
 
         try:
             channels = self.service.channel_listing()
@@ -309,10 +388,7 @@ class ChannelListView(AnopeAPIView):
                 or query in (entry.get("modes_display") or "").lower()
             ]
 
-        if limit is not None:
-            channels = channels[:limit]
-
-        return Response({"count": len(channels), "results": channels})
+        return self._listing_response(request, channels, channel_sort_key, limit=limit, fields=fields)
 
 
 class ChannelDetailView(AnopeAPIView):
@@ -340,11 +416,26 @@ class ChannelDetailView(AnopeAPIView):
 
 class ServerListView(AnopeAPIView):
     def get(self, request):
+        if self._is_default_listing(request):
+            def build():
+                servers = self.service.server_listing()
+                return {"count": len(servers), "results": servers}
+
+            return self._encoded_response(
+                request,
+                "servers",
+                self.service_class.SERVERS_KEY,
+                self.service_class.SERVERS_TTL,
+                build,
+            )
+
+        limit = self._parse_limit(request)
+        fields = parse_fields(request)
         try:
             servers = self.service.server_listing()
         except RPCError as exc:
             self._raise_unavailable(exc)
-        return Response({"count": len(servers), "results": servers})
+        return self._listing_response(request, servers, server_sort_key, limit=limit, fields=fields)
 
 
 class ServerDetailView(AnopeAPIView):
@@ -364,21 +455,18 @@ class ServerDetailView(AnopeAPIView):
 class UserListView(AnopeAPIView):
     def get(self, request):
         query = request.query_params.get("q", "").strip().lower()
-        limit_param = request.query_params.get("limit")
-        try:
-            limit = min(max(int(limit_param), 1), 500) if limit_param else 50
-        except ValueError:
-            limit = 50
+        limit = self._parse_limit(request, default=50)
 
         try:
-            users = self.service.user_listing(limit=500)
+            users = self.service.user_listing(limit=None)
         except RPCError as exc:
             self._raise_unavailable(exc)
 
         if query:
             users = [name for name in users if query in name.lower()]
 
-        return Response({"count": len(users[:limit]), "results": users[:limit]})
+        # Nicknames are plain strings, so there is nothing to project.
+        return self._listing_response(request, users, name_sort_key, limit=limit)
 
 
 class UserDetailView(AnopeAPIView):
@@ -397,11 +485,26 @@ class UserDetailView(AnopeAPIView):
 
 class OperatorListView(AnopeAPIView):
     def get(self, request):
+        if self._is_default_listing(request):
+            def build():
+                opers = self.service.operator_listing()
+                return {"count": len(opers), "results": opers}
+
+            return self._encoded_response(
+                request,
+                "operators",
+                self.service_class.OPERATORS_KEY,
+                self.service_class.OPERATORS_TTL,
+                build,
+            )
+
+        limit = self._parse_limit(request)
+        fields = parse_fields(request)
         try:
             opers = self.service.operator_listing()
         except RPCError as exc:
             self._raise_unavailable(exc)
-        return Response({"count": len(opers), "results": opers})
+        return self._listing_response(request, opers, name_sort_key, limit=limit, fields=fields)
 
 
 class ChanstatsPlusTopChannelsView(AnopeAPIView):
@@ -4,7 +4,7 @@ import time
 import requests
 from django.core.management.base import BaseCommand
 
-from locations.models import City
+from locations.models import City, city_key
 
 
 class Command(BaseCommand):
@@ -95,10 +95,11 @@ class Command(BaseCommand):
                     lng = float(row.get("lng")) if row.get("lng") is not None else None
                 except (TypeError, ValueError):
                     lng = None
-                batch.append(City(name=name, latitude=lat, longitude=lng))
+                batch.append(City(name=name, name_key=city_key(name), latitude=lat, longitude=lng))
 
             if batch:
                 City.objects.bulk_create(batch, ignore_conflicts=True)
+                City.forget_misses(batch)
                 inserted_total += len(batch)
 
             self.stdout.write(
@@ -6,7 +6,7 @@ from typing import Iterable
 import requests
 from django.core.management.base import BaseCommand
 
-from locations.models import City
+from locations.models import City, city_key
 
 
 class Command(BaseCommand):
@@ -115,10 +115,11 @@ class Command(BaseCommand):
                 if name in batch_seen:
                     continue
                 batch_seen.add(name)
-                batch.append(City(name=name, latitude=lat, longitude=lng))
+                batch.append(City(name=name, name_key=city_key(name), latitude=lat, longitude=lng))
 
                 if len(batch) >= batch_size:
                     City.objects.bulk_create(batch, ignore_conflicts=True)
+                    City.forget_misses(batch)
                     inserted_attempted += len(batch)
                     self.stdout.write(
                         self.style.SUCCESS(
@@ -134,6 +135,7 @@ class Command(BaseCommand):
 
             if batch and (not max_rows or inserted_attempted < max_rows):
                 City.objects.bulk_create(batch, ignore_conflicts=True)
+                City.forget_misses(batch)
                 inserted_attempted += len(batch)
 
             self.stdout.write(self.style.SUCCESS(f"Done. total_attempted={inserted_attempted}"))
@@ -1,9 +1,60 @@
+import hashlib
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 
+
+def city_key(name):
+    """Accent-, case- and hyphen-insensitive form of a city name ("saint etienne")."""
+
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.replace("-", " ").replace("'", " ").split()).casefold()
+
+
+def _miss_cache_key(key):
+    return f"locations.city_miss.{hashlib.md5(key.encode('utf-8')).hexdigest()}"
+
+
 class City(models.Model):
     name = models.CharField(max_length=255, null=True, unique=True)
     latitude = models.FloatField(null=True, blank=True)  # ✅ Ensure these fields exist
     longitude = models.FloatField(null=True, blank=True)
+    # city_key(name); what free-text member cities are matched against.
+    name_key = models.CharField(max_length=255, blank=True, default="", db_index=True, editable=False)
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        self.name_key = city_key(self.name)
+        super().save(*args, **kwargs)
+        cache.delete(_miss_cache_key(self.name_key))
+
+    @classmethod
+    def forget_misses(cls, cities):
+        """Drop cached misses for ``cities``; for inserts that skip ``save()`` (``bulk_create``)."""
+
+        cache.delete_many([_miss_cache_key(city.name_key or city_key(city.name)) for city in cities])
+
+    @classmethod
+    def resolve(cls, name):
+        """The city a free-text ``name`` refers to, or ``None``.
+
+        Names that match no city are remembered for ``CITY_RESOLVE_MISS_TTL``
+        seconds (saving a matching city, or ``forget_misses``, forgets it), so members with an
+        unknown city do not cost a query on every save.
+        """
+
+        key = city_key(name)
+        if not key:
+            return None
+        miss_key = _miss_cache_key(key)
+        if cache.get(miss_key):
+            return None
+        city = cls.objects.filter(name_key=key).order_by("pk").first()
+        if city is None:
+            cache.set(miss_key, True, getattr(settings, "CITY_RESOLVE_MISS_TTL", 3600))
+        return city
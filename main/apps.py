@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from . import fragments
+
+        fragments.connect_signals()
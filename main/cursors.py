@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any, Optional, Sequence
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client-supplied cursor cannot be decoded."""
+
+
+def encode_cursor(position: Sequence[Any]) -> str:
+    """Encode a keyset position as an opaque, URL-safe token."""
+
+    raw = json.dumps(list(position), separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: Optional[str], *, length: Optional[int] = None) -> Optional[tuple]:
+    """Decode a token produced by :func:`encode_cursor`.
+
+    Returns ``None`` for an empty token and raises :class:`InvalidCursor`
+    for anything malformed (including a position of the wrong length).
+    """
+
+    token = (token or "").strip()
+    if not token:
+        return None
+
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+
+    if not isinstance(position, list):
+        raise InvalidCursor("Invalid cursor")
+    if length is not None and len(position) != length:
+        raise InvalidCursor("Invalid cursor")
+    return tuple(position)
@@ -0,0 +1,218 @@
+"""Named, cached page fragments shared by several views.
+
+A fragment is a small query result (newest members, recent posts, blog
+categories...) that many pages show. :func:`get_many` serves any number of
+them with one cache round-trip and rebuilds only those that are missing or
+stale. Payloads are cached per host, like the home page always was.
+
+Invalidation uses generations: every fragment has a counter in the cache,
+bumped by model signals (see ``invalidated_by``) or :func:`invalidate`.
+Payloads are stored with the generation they were built under, so a bump
+makes them stale everywhere at once without deleting per-host keys.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Sequence, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+
+
+@dataclass(frozen=True)
+class Fragment:
+    name: str
+    build: Callable[[], Any]
+    ttl_setting: str
+    default_ttl: int = 300
+    # (model label, event) pairs that make the fragment stale; event is
+    # "save" (any save), "create", "delete" or "change" (a save for which
+    # the instance's display_changed() is true).
+    invalidated_by: Tuple[Tuple[str, str], ...] = ()
+
+    @property
+    def ttl(self) -> int:
+        return getattr(settings, self.ttl_setting, self.default_ttl)
+
+
+REGISTRY: Dict[str, Fragment] = {}
+
+
+def register(fragment: Fragment) -> Fragment:
+    REGISTRY[fragment.name] = fragment
+    return fragment
+
+
+def _generation_key(name: str) -> str:
+    return f"fragments.gen.{name}"
+
+
+def _payload_key(name: str, host: str) -> str:
+    return f"fragments.{name}.{host or '-'}"
+
+
+def _host(request) -> str:
+    if request is None:
+        return ""
+    return (request.get_host() or "").split(":", 1)[0].lower()
+
+
+def invalidate(*names: str) -> None:
+    for name in names:
+        key = _generation_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_many(names: Sequence[str], request=None) -> Dict[str, Any]:
+    """Current data of each fragment in ``names`` (one cache read when all are fresh)."""
+
+    host = _host(request)
+    keys = {}
+    for name in names:
+        keys[_generation_key(name)] = None
+        keys[_payload_key(name, host)] = None
+    found = cache.get_many(list(keys))
+
+    results = {}
+    for name in names:
+        fragment = REGISTRY[name]
+        generation = found.get(_generation_key(name))
+        if generation is None:
+            # Seeded from the clock so an evicted counter never reuses an old value.
+            cache.add(_generation_key(name), time.time_ns(), timeout=None)
+            generation = cache.get(_generation_key(name))
+
+        stored = found.get(_payload_key(name, host))
+        if stored is not None and stored[0] == generation:
+            results[name] = stored[1]
+            continue
+
+        data = fragment.build()
+        cache.set(_payload_key(name, host), (generation, data), fragment.ttl)
+        results[name] = data
+    return results
+
+
+def get(name: str, request=None) -> Any:
+    return get_many([name], request)[name]
+
+
+# ----------------------------------------------------------------------
+# Signals
+# ----------------------------------------------------------------------
+
+
+def _stale_fragments(label: str, events: Iterable[str]):
+    events = set(events)
+    return [
+        fragment.name
+        for fragment in REGISTRY.values()
+        if any(model == label and event in events for model, event in fragment.invalidated_by)
+    ]
+
+
+def _on_save(sender, instance=None, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        events = ("save", "create", "change")
+    elif getattr(instance, "display_changed", None) is not None and instance.display_changed():
+        events = ("save", "change")
+    else:
+        events = ("save",)
+    names = _stale_fragments(sender._meta.label, events)
+    if names:
+        invalidate(*names)
+
+
+def _on_delete(sender, **kwargs):
+    names = _stale_fragments(sender._meta.label, ("delete",))
+    if names:
+        invalidate(*names)
+
+
+def connect_signals() -> None:
+    labels = {model for fragment in REGISTRY.values() for model, _ in fragment.invalidated_by}
+    for label in labels:
+        model = apps.get_model(label)
+        post_save.connect(_on_save, sender=model, dispatch_uid=f"fragments.save.{label}")
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f"fragments.delete.{label}")
+
+
+# ----------------------------------------------------------------------
+# Fragments
+# ----------------------------------------------------------------------
+
+
+def _directory_entries(order: str, limit: int):
+    from community.models import MemberDirectoryEntry
+
+    return list(MemberDirectoryEntry.objects.order_by(order)[:limit])
+
+
+def _published_posts():
+    from blog.models import BlogPost
+
+    return BlogPost.objects.filter(is_active=True, is_published=True)
+
+
+# Every member list goes stale when a shown member is renamed or changes
+# avatar ("change"), or leaves the directory.
+_MEMBER_DISPLAY = (("community.MemberDirectoryEntry", "change"), ("community.MemberDirectoryEntry", "delete"))
+
+register(Fragment(
+    "newest_members",
+    lambda: _directory_entries("-date_joined", 9),
+    "HOME_CACHE_TTL_MEMBERS",
+    invalidated_by=_MEMBER_DISPLAY,
+))
+# Scores change in bulk: community.popularity.fold() invalidates this one.
+register(Fragment(
+    "popular_members",
+    lambda: _directory_entries("-popularity_score", 5),
+    "HOME_CACHE_TTL_MEMBERS",
+    invalidated_by=_MEMBER_DISPLAY,
+))
+# Ordered by activity, which changes constantly; the TTL keeps it fresh.
+register(Fragment(
+    "active_members",
+    lambda: _directory_entries("-last_login", 8),
+    "HOME_CACHE_TTL_MEMBERS",
+    invalidated_by=_MEMBER_DISPLAY,
+))
+register(Fragment(
+    "recent_posts",
+    lambda: list(
+        _published_posts()
+        .only("title", "slug", "created_at", "image", "thumbnails")
+        .order_by("-created_at")[:5]
+    ),
+    "HOME_CACHE_TTL_POSTS",
+    invalidated_by=(("blog.BlogPost", "save"), ("blog.BlogPost", "delete")),
+))
+register(Fragment(
+    "latest_posts",
+    lambda: list(_published_posts().select_related("author").order_by("-created_at")[:6]),
+    "HOME_CACHE_TTL_POSTS",
+    invalidated_by=(("blog.BlogPost", "save"), ("blog.BlogPost", "delete")),
+))
+register(Fragment(
+    "categories",
+    lambda: list(
+        _published_posts()
+        .exclude(category="")
+        .values("category")
+        .annotate(count=Count("id"))
+        .order_by("-count", "category")
+    ),
+    "HOME_CACHE_TTL_POSTS",
+    invalidated_by=(("blog.BlogPost", "save"), ("blog.BlogPost", "delete")),
+))
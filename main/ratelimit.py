@@ -0,0 +1,385 @@
+"""Atomic rate limiting (GCRA) shared by views, middleware and DRF.
+
+A limit is a key plus a :class:`Rate` ("5/10m": at most 5 hits in any 10
+minutes, refilling evenly). State is one timestamp per key: the generic cell
+rate algorithm's "theoretical arrival time". With django-redis every check
+is a single Lua script call, and several limits are checked and updated
+together (all or nothing) in that one round-trip. Other cache backends use
+a process-local fallback that is not atomic across processes (fine for
+development and tests).
+
+Typical uses::
+
+    decision = ratelimit.hit(ratelimit.Limit(f"login:{ip}", "10/m"))
+    if not decision.allowed: ...
+
+    @ratelimit.ratelimit("contact", "5/h")
+    def contact_view(request): ...
+
+    @throttle_classes([ratelimit.ScopedThrottle])  # DRF, reads throttle_scope
+
+Lockouts after repeated failures use :class:`FailureWindow` instead: a
+fixed window that does not refill, so the limit really is "N failures, then
+wait until the window ends".
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import math
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Union
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.throttling import ScopedRateThrottle
+
+
+logger = logging.getLogger(__name__)
+
+
+_PERIOD_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_RATE_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([smhd])[a-z]*\s*$", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class Rate:
+    limit: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: Union["Rate", str]) -> "Rate":
+        """Parse ``"N/period"``: ``"30/min"``, ``"5/10m"``, ``"100/h"`` (DRF rates are accepted)."""
+
+        if isinstance(value, Rate):
+            return value
+        match = _RATE_RE.match(value or "")
+        if not match:
+            raise ValueError(f"invalid rate: {value!r}")
+        count, multiplier, unit = match.groups()
+        return cls(int(count), int(multiplier or 1) * _PERIOD_UNITS[unit.lower()])
+
+    @property
+    def interval_ms(self) -> float:
+        return self.period * 1000.0 / max(self.limit, 1)
+
+
+@dataclass(frozen=True)
+class Limit:
+    key: str
+    rate: Rate
+
+    def __init__(self, key: str, rate: Union[Rate, str]):
+        object.__setattr__(self, "key", key)
+        object.__setattr__(self, "rate", Rate.parse(rate))
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    # Seconds until the first denied limit admits a hit (0 when allowed).
+    retry_after: float
+    # Hits left on the tightest limit.
+    remaining: int
+
+
+def _storage_key(limit: Limit) -> str:
+    # The stored timestamp only makes sense for the rate that wrote it.
+    prefix = getattr(settings, "RATELIMIT_KEY_PREFIX", "rl")
+    return f"{prefix}:{limit.key}:{limit.rate.limit}/{limit.rate.period:g}"
+
+
+# KEYS: one per limit. ARGV: dry_run, then (interval_ms, period_ms, cost) per key.
+# Returns flattened (allowed, retry_after_ms, remaining) per key; nothing is
+# written unless every limit allows the hit.
+_GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local dry_run = ARGV[1] == '1'
+local out, tats, denied = {}, {}, false
+for i = 1, #KEYS do
+  local interval = tonumber(ARGV[i * 3 - 1])
+  local period = tonumber(ARGV[i * 3])
+  local cost = tonumber(ARGV[i * 3 + 1])
+  local tat = tonumber(redis.call('GET', KEYS[i]) or now)
+  if tat < now then tat = now end
+  local new_tat = tat + interval * cost
+  local allow_at = new_tat - period
+  if now < allow_at then
+    denied = true
+    out[#out + 1] = 0
+    out[#out + 1] = math.ceil(allow_at - now)
+    out[#out + 1] = 0
+  else
+    tats[i] = math.floor(new_tat + 0.5)
+    out[#out + 1] = 1
+    out[#out + 1] = 0
+    out[#out + 1] = math.floor((period - (new_tat - now)) / interval)
+  end
+end
+if not denied and not dry_run then
+  for i = 1, #KEYS do
+    local ttl = tats[i] - now
+    if ttl > 0 then redis.call('SET', KEYS[i], tats[i], 'PX', ttl) end
+  end
+end
+return out
+"""
+
+_script = None
+_fallback_lock = threading.Lock()
+
+
+def redis_client():
+    """Raw redis client behind the default cache, or ``None`` for other backends."""
+
+    if "django_redis" not in type(cache).__module__:
+        return None
+    try:
+        from django_redis import get_redis_connection
+
+        return get_redis_connection("default")
+    except Exception:
+        return None
+
+
+def _evaluate(limits: Sequence[Limit], cost: int, dry_run: bool) -> List[tuple]:
+    keys = [_storage_key(limit) for limit in limits]
+    client = redis_client()
+    if client is not None:
+        global _script
+        if _script is None:
+            _script = client.register_script(_GCRA_LUA)
+        args = ["1" if dry_run else "0"]
+        for limit in limits:
+            args.extend([limit.rate.interval_ms, limit.rate.period * 1000.0, cost])
+        raw = _script(keys=keys, args=args, client=client)
+        return [(bool(raw[i]), raw[i + 1] / 1000.0, int(raw[i + 2])) for i in range(0, len(raw), 3)]
+
+    # Same algorithm over the Django cache (not atomic across processes).
+    with _fallback_lock:
+        now = time.time() * 1000.0
+        stored = cache.get_many(keys)
+        results, updates = [], {}
+        for key, limit in zip(keys, limits):
+            interval, period = limit.rate.interval_ms, limit.rate.period * 1000.0
+            new_tat = max(float(stored.get(key) or now), now) + interval * cost
+            allow_at = new_tat - period
+            if now < allow_at:
+                results.append((False, math.ceil(allow_at - now) / 1000.0, 0))
+            else:
+                results.append((True, 0.0, int((period - (new_tat - now)) // interval)))
+                updates[key] = (new_tat, new_tat - now)
+        if all(allowed for allowed, _, _ in results) and not dry_run:
+            for key, (tat, ttl_ms) in updates.items():
+                if ttl_ms > 0:
+                    cache.set(key, tat, timeout=math.ceil(ttl_ms / 1000.0))
+        return results
+
+
+def check(*limits: Limit, cost: int = 1, dry_run: bool = False) -> Decision:
+    """Check all ``limits`` at once and, unless ``dry_run``, record the hit on each.
+
+    A hit is recorded only when every limit allows it. If the backend fails
+    the request is allowed (and logged) rather than blocked.
+    """
+
+    limits = [limit for limit in limits if limit is not None]
+    if not limits:
+        return Decision(True, 0.0, 0)
+    try:
+        results = _evaluate(limits, cost, dry_run)
+    except Exception:
+        logger.exception("rate limit backend failed; allowing request")
+        return Decision(True, 0.0, 0)
+
+    allowed = all(ok for ok, _, _ in results)
+    retry_after = max((wait for ok, wait, _ in results if not ok), default=0.0)
+    remaining = min(left for _, _, left in results)
+    return Decision(allowed, retry_after, max(remaining, 0))
+
+
+def hit(*limits: Limit, cost: int = 1) -> Decision:
+    return check(*limits, cost=cost)
+
+
+def peek(*limits: Limit) -> Decision:
+    """Would one more hit be allowed? Records nothing."""
+
+    return check(*limits, dry_run=True)
+
+
+def reset(*limits: Limit) -> None:
+    full_keys = [_storage_key(limit) for limit in limits]
+    client = redis_client()
+    try:
+        if client is not None:
+            client.delete(*full_keys)
+        else:
+            cache.delete_many(full_keys)
+    except Exception:
+        logger.exception("rate limit reset failed for %s", full_keys)
+
+
+@dataclass(frozen=True)
+class FailureWindow:
+    """At most ``limit`` failures per ``window`` seconds, counted from the first one.
+
+    Unlike a GCRA :class:`Rate`, nothing refills before the window ends: once
+    ``limit`` failures are recorded the key stays locked until it expires.
+    The counter is a plain cache integer (``add`` then ``incr``), atomic on
+    django-redis and memcached.
+
+    Callers guarding a slow check use :meth:`attempt` before it, so that
+    concurrent requests cannot all read "unlocked" and guess in parallel,
+    and :meth:`refund` (or :meth:`reset`) when the attempt was not a failure.
+    """
+
+    key: str
+    limit: int
+    window: int
+
+    @property
+    def _cache_key(self) -> str:
+        prefix = getattr(settings, "RATELIMIT_KEY_PREFIX", "rl")
+        return f"{prefix}:fail:{self.key}"
+
+    def locked(self) -> bool:
+        try:
+            return int(cache.get(self._cache_key) or 0) >= self.limit
+        except Exception:
+            logger.exception("failure counter read failed for %s", self.key)
+            return False
+
+    def fail(self) -> int:
+        """Record one failure; returns the failures counted in this window."""
+
+        try:
+            cache.add(self._cache_key, 0, timeout=max(int(self.window), 1))
+            try:
+                return cache.incr(self._cache_key)
+            except ValueError:
+                # Expired between add() and incr(): start a new window.
+                cache.set(self._cache_key, 1, timeout=max(int(self.window), 1))
+                return 1
+        except Exception:
+            logger.exception("failure counter update failed for %s", self.key)
+            return 0
+
+    def attempt(self) -> bool:
+        """Reserve one attempt up front; False once ``limit`` are spent."""
+
+        return self.fail() <= self.limit
+
+    def refund(self) -> None:
+        """Give back an attempt reserved by :meth:`attempt` that did not fail."""
+
+        try:
+            cache.decr(self._cache_key)
+        except ValueError:
+            # Window already expired: nothing to give back.
+            pass
+        except Exception:
+            logger.exception("failure counter refund failed for %s", self.key)
+
+    def reset(self) -> None:
+        try:
+            cache.delete(self._cache_key)
+        except Exception:
+            logger.exception("failure counter reset failed for %s", self.key)
+
+
+def client_ip(request) -> str:
+    """Client address: ``REMOTE_ADDR``, or the hop seen by the outermost trusted proxy.
+
+    Each proxy appends the peer it saw to ``X-Forwarded-For``, so behind
+    ``RATELIMIT_TRUSTED_PROXIES`` proxies the client is that many hops from
+    the right. Anything further left was written by the client and is ignored.
+    """
+
+    remote_addr = request.META.get("REMOTE_ADDR") or "unknown"
+    try:
+        trusted = int(getattr(settings, "RATELIMIT_TRUSTED_PROXIES", 0))
+    except (TypeError, ValueError):
+        trusted = 0
+    if trusted <= 0:
+        return remote_addr
+    hops = [hop.strip() for hop in (request.META.get("HTTP_X_FORWARDED_FOR") or "").split(",") if hop.strip()]
+    if len(hops) < trusted:
+        return remote_addr
+    return hops[-trusted]
+
+
+def too_many_requests(decision: Decision, content: str = "Too many requests.") -> HttpResponse:
+    response = HttpResponse(content, status=429, content_type="text/plain; charset=utf-8")
+    response["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+    return response
+
+
+def ratelimit(
+    name: str,
+    rate: Union[Rate, str],
+    key: Callable = client_ip,
+    methods: Optional[Sequence[str]] = None,
+    response: Optional[Callable] = None,
+):
+    """View decorator: at most ``rate`` requests per ``key(request)``.
+
+    ``methods`` restricts counting to those HTTP methods. ``response(request,
+    decision)`` builds the rejection (default: plain 429 with Retry-After).
+    """
+
+    rate = Rate.parse(rate)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if methods is None or request.method in methods:
+                decision = hit(Limit(f"{name}:{key(request)}", rate))
+                if not decision.allowed:
+                    return response(request, decision) if response else too_many_requests(decision)
+            return view(request, *args, **kwargs)
+
+        return wrapped
+
+    return decorator
+
+
+class ScopedThrottle(ScopedRateThrottle):
+    """Drop-in for DRF's ScopedRateThrottle using :func:`hit` (one round-trip per request)."""
+
+    # Used when DEFAULT_THROTTLE_RATES does not configure the scope, so new
+    # scopes do not break deployments whose settings predate them.
+    FALLBACK_RATES = {
+        "avatars": "120/min",
+        "irc_login": "10/min",
+    }
+
+    def get_rate(self):
+        if self.scope not in self.THROTTLE_RATES and self.scope in self.FALLBACK_RATES:
+            return self.FALLBACK_RATES[self.scope]
+        return super().get_rate()
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+
+        ident = self.get_cache_key(request, view)
+        if ident is None:
+            return True
+        self.decision = hit(Limit(f"throttle:{ident}", self.rate))
+        return self.decision.allowed
+
+    def wait(self):
+        decision = getattr(self, "decision", None)
+        return decision.retry_after if decision and not decision.allowed else None
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from django import template
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+_IMG_DEFAULTS = {"loading": "lazy", "decoding": "async"}
+
+
+@register.simple_tag
+def picture(data, sizes: str = "", **attrs) -> str:
+    """Render ``<picture>`` markup for the dict returned by ``thumbnails.picture()``.
+
+    Usage::
+
+        {% load images %}
+        {% picture m.avatar_picture sizes="100px" width=100 height=100 alt=m.username %}
+
+    Remaining keyword arguments become ``<img>`` attributes; underscores turn
+    into hyphens (``data_fallback_src`` -> ``data-fallback-src``). Images load
+    lazily unless ``loading`` is given.
+    """
+
+    data = data or {}
+    img_attrs = {**_IMG_DEFAULTS, **{name.replace("_", "-"): value for name, value in attrs.items()}}
+    img_attrs["src"] = data.get("src") or img_attrs.get("src", "")
+    if data.get("srcset"):
+        img_attrs["srcset"] = data["srcset"]
+        if sizes:
+            img_attrs["sizes"] = sizes
+
+    img = format_html(
+        "<img {}>",
+        format_html_join(" ", '{}="{}"', ((name, value) for name, value in img_attrs.items() if value is not None)),
+    )
+    sources = data.get("sources") or []
+    if not sources:
+        return img
+
+    size_attr = format_html(' sizes="{}"', sizes) if sizes else ""
+    return format_html(
+        "<picture>{}{}</picture>",
+        format_html_join(
+            "",
+            '<source type="{}" srcset="{}"{}>',
+            ((source["type"], source["srcset"], size_attr) for source in sources),
+        ),
+        img,
+    )
+
+
+@register.simple_tag
+def srcset(data, fmt: str = "") -> str:
+    """``srcset`` value for one format of ``thumbnails.picture()`` data (``<img>`` fallback by default)."""
+
+    data = data or {}
+    if not fmt or fmt == data.get("format"):
+        return data.get("srcset", "")
+    for source in data.get("sources") or []:
+        if source.get("format") == fmt:
+            return source["srcset"]
+    return ""
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from blog.models import BlogPost
+from main import fragments
+
+
+@override_settings(THUMBNAILS_ASYNC=False)
+class FragmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = get_user_model().objects.create_user(username="ana", email="ana@example.com", password="s3cret-pass")
+        self.request = RequestFactory().get("/", HTTP_HOST="chaat.site")
+
+    def _post(self, title, category="news"):
+        return BlogPost.objects.create(title=title, content="...", author=self.author, category=category, image="blog_images/x.jpg")
+
+    def test_fragments_are_shared_until_a_model_signal_invalidates_them(self):
+        self._post("First")
+        names = ["recent_posts", "categories", "newest_members"]
+        first = fragments.get_many(names, self.request)
+        self.assertEqual([post.title for post in first["recent_posts"]], ["First"])
+
+        with self.assertNumQueries(0):
+            again = fragments.get_many(names, self.request)
+        self.assertEqual(again["categories"], [{"category": "news", "count": 1}])
+
+        self._post("Second", category="tech")
+        with self.assertNumQueries(2):
+            fresh = fragments.get_many(names, self.request)
+        self.assertEqual(len(fresh["categories"]), 2)
+        self.assertEqual([entry.username for entry in fresh["newest_members"]], ["ana"])
+
+        get_user_model().objects.create_user(username="bea", email="bea@example.com", password="s3cret-pass")
+        self.assertEqual(len(fragments.get("newest_members", self.request)), 2)
+
+        # A rename shows up at once; saves that change nothing shown do not rebuild.
+        self.author.username = "anna"
+        self.author.save()
+        self.assertEqual([entry.username for entry in fragments.get("newest_members", self.request)], ["bea", "anna"])
+        self.author.save()
+        with self.assertNumQueries(0):
+            fragments.get("newest_members", self.request)
+
+    def test_site_footer_is_lazy_and_served_from_the_fragment_cache(self):
+        from tchat.context_processors import site_footer
+
+        self._post("Footer news")
+        with self.assertNumQueries(0):
+            context = site_footer(self.request)
+        with self.assertNumQueries(2):
+            self.assertEqual(context["footer"]["recent_articles"][0]["title"], "Footer news")
+            self.assertEqual([entry.username for entry in context["footer"]["latest_users"]], ["ana"])
+        with self.assertNumQueries(0):
+            self.assertEqual(len(site_footer(self.request)["footer"]["latest_users"]), 1)
@@ -0,0 +1,85 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from main import ratelimit
+from middleware.ratelimit import RateLimitMiddleware
+
+
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_burst_then_deny_with_retry_after(self):
+        limit = ratelimit.Limit("test:burst", "3/m")
+        decisions = [ratelimit.hit(limit) for _ in range(4)]
+        self.assertEqual([d.allowed for d in decisions], [True, True, True, False])
+        self.assertEqual(decisions[0].remaining, 2)
+        self.assertGreater(decisions[3].retry_after, 15)
+        self.assertLessEqual(decisions[3].retry_after, 20)
+
+    def test_several_limits_are_all_or_nothing(self):
+        tight = ratelimit.Limit("test:tight", "1/m")
+        loose = ratelimit.Limit("test:loose", "10/m")
+        self.assertTrue(ratelimit.hit(tight, loose).allowed)
+        self.assertFalse(ratelimit.hit(tight, loose).allowed)
+        # The denied call did not consume from the loose limit.
+        self.assertEqual(ratelimit.hit(loose).remaining, 8)
+
+    def test_peek_records_nothing_and_reset_clears(self):
+        failures = ratelimit.Limit("test:failures", "2/10m")
+        self.assertTrue(ratelimit.peek(failures).allowed)
+        ratelimit.hit(failures)
+        ratelimit.hit(failures)
+        self.assertFalse(ratelimit.peek(failures).allowed)
+        ratelimit.reset(failures)
+        self.assertTrue(ratelimit.peek(failures).allowed)
+
+    def test_failure_window_does_not_refill(self):
+        failures = ratelimit.FailureWindow("test:lockout", 2, 600)
+        failures.fail()
+        failures.fail()
+        self.assertTrue(failures.locked())
+        # Unlike a GCRA limit, a minute later the key is still locked.
+        with mock.patch("time.time", return_value=time.time() + 60):
+            self.assertTrue(failures.locked())
+        failures.reset()
+        self.assertFalse(failures.locked())
+
+    def test_failure_window_reserves_attempts(self):
+        failures = ratelimit.FailureWindow("test:reserve", 2, 600)
+        self.assertTrue(failures.attempt())
+        failures.refund()
+        self.assertTrue(failures.attempt())
+        self.assertTrue(failures.attempt())
+        # Both remaining attempts are held, even before either check finished.
+        self.assertFalse(failures.attempt())
+        self.assertTrue(failures.locked())
+
+    def test_client_ip_ignores_client_written_hops(self):
+        request = RequestFactory().get("/", HTTP_X_FORWARDED_FOR="6.6.6.6, 198.51.100.7", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(ratelimit.client_ip(request), "10.0.0.1")
+        with override_settings(RATELIMIT_TRUSTED_PROXIES=1):
+            self.assertEqual(ratelimit.client_ip(request), "198.51.100.7")
+
+    def test_decorator_and_middleware_return_429(self):
+        @ratelimit.ratelimit("test:view", "1/m", methods=["POST"])
+        def view(request):
+            return HttpResponse("ok")
+
+        factory = RequestFactory()
+        self.assertEqual(view(factory.get("/")).status_code, 200)
+        self.assertEqual(view(factory.post("/")).status_code, 200)
+        denied = view(factory.post("/"))
+        self.assertEqual(denied.status_code, 429)
+        self.assertIn("Retry-After", denied)
+
+        rules = [{"name": "api", "path": "/api/", "rate": "1/m"}, {"name": "all", "path": "/", "rate": "5/m"}]
+        with override_settings(RATELIMIT_RULES=rules):
+            middleware = RateLimitMiddleware(lambda request: HttpResponse("ok"))
+        self.assertEqual(middleware(factory.get("/api/x")).status_code, 200)
+        self.assertEqual(middleware(factory.get("/api/x")).status_code, 429)
+        self.assertEqual(middleware(factory.get("/other")).status_code, 200)
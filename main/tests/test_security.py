@@ -38,3 +38,12 @@ class FooterContextProcessorTests(SimpleTestCase):
         self.assertEqual(footer["information_links"][0]["url"], "#")
         self.assertEqual(footer["useful_links"][0]["url"], "https://example.com")
         self.assertEqual(footer["social_links"][0]["url"], "#")
+
+    @override_settings(SITE_FOOTERS={"chaat.site": {"tagline": "Chaat"}})
+    def test_footer_config_cache_is_bounded_by_configured_hosts(self):
+        from tchat import context_processors
+
+        for host in ("chaat.site", "www.chaat.site", "a.example", "b.example", "c.example"):
+            context_processors._footer_config(host)
+        self.assertEqual(len(context_processors._footer_config_cache), 2)
+        self.assertEqual(context_processors._footer_config("www.chaat.site")["tagline"], "Chaat")
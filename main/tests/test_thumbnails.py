@@ -0,0 +1,115 @@
+import io
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from main import thumbnails
+
+
+def _png_bytes(size=(400, 300)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@override_settings(THUMBNAILS_ASYNC=False)
+class ThumbnailManifestTests(TestCase):
+    def test_avatar_urls_render_without_storage_calls(self):
+        user = get_user_model().objects.create_user(username="erin", email="erin@example.com", password="s3cret-pass")
+        with self.captureOnCommitCallbacks(execute=True):
+            user.avatar.save("erin.png", ContentFile(_png_bytes((700, 800))), save=True)
+
+        user = get_user_model().objects.get(pk=user.pk)
+        self.assertEqual(user.thumbnails["source"], user.avatar.name)
+        self.assertEqual(user.thumbnails["set"], thumbnails.AVATAR.signature)
+        self.assertEqual(set(user.thumbnails["variants"]), {"100", "200", "320", "640"})
+        self.assertEqual(
+            set(user.thumbnails["variants"]["100"]),
+            set(thumbnails.supported_formats(thumbnails.AVATAR.formats)),
+        )
+
+        with mock.patch.object(default_storage, "exists", side_effect=AssertionError("storage I/O")):
+            self.assertIn("__100", user.avatar_thumb_100_url())
+            self.assertIn("__320", user.avatar_thumb_320_url())
+            self.assertTrue(user.avatar_url().endswith(".png"))
+            html = Template("{% load images %}{% picture user.avatar_picture sizes='100px' width=100 alt=user.username %}").render(
+                Context({"user": user})
+            )
+
+        self.assertIn('<source type="image/webp"', html)
+        self.assertRegex(html, r"__640\.[0-9a-f]+\.webp 640w")
+        self.assertIn('sizes="100px"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertRegex(html, r'<img [^>]*src="[^"]*__100\.[0-9a-f]+\.jpg"')
+
+    def test_small_originals_are_not_upscaled(self):
+        user = get_user_model().objects.create_user(username="hank", email="hank@example.com", password="s3cret-pass")
+        with self.captureOnCommitCallbacks(execute=True):
+            user.avatar.save("hank.png", ContentFile(_png_bytes((400, 300))), save=True)
+        user.refresh_from_db()
+        self.assertEqual(set(user.thumbnails["variants"]), {"100", "200"})
+        self.assertTrue(user.avatar_thumb_320_url().endswith(".png"))
+
+    def test_variant_names_are_content_hashed_and_old_files_collected(self):
+        user = get_user_model().objects.create_user(username="jude", email="jude@example.com", password="s3cret-pass")
+        with self.captureOnCommitCallbacks(execute=True):
+            user.avatar.save("jude.png", ContentFile(_png_bytes()), save=True)
+        user.refresh_from_db()
+        first = thumbnails.variant_files(user.thumbnails)
+        self.assertRegex(user.thumbnails["variants"]["100"]["jpeg"], r"__100\.[0-9a-f]{12}\.jpg$")
+
+        # Same content again: the same names are reused and nothing is deleted.
+        with self.captureOnCommitCallbacks(execute=True):
+            user.ensure_avatar_thumbs(force=True)
+        self.assertEqual(thumbnails.variant_files(user.thumbnails), first)
+        self.assertTrue(all(default_storage.exists(name) for name in first))
+
+        buf = io.BytesIO()
+        Image.new("RGB", (400, 300), (10, 90, 200)).save(buf, format="PNG")
+        with default_storage.open(user.avatar.name, "wb") as fh:
+            fh.write(buf.getvalue())
+        with self.captureOnCommitCallbacks(execute=True):
+            user.ensure_avatar_thumbs(force=True)
+        second = thumbnails.variant_files(user.thumbnails)
+        self.assertFalse(set(first) & set(second))
+        self.assertFalse(any(default_storage.exists(name) for name in first))
+        self.assertTrue(all(default_storage.exists(name) for name in second))
+
+    def test_changing_the_variant_set_outdates_manifests(self):
+        user = get_user_model().objects.create_user(username="ivy", email="ivy@example.com", password="s3cret-pass")
+        with self.captureOnCommitCallbacks(execute=True):
+            user.avatar.save("ivy.png", ContentFile(_png_bytes()), save=True)
+        user.refresh_from_db()
+        self.assertFalse(user.thumbnails_outdated())
+
+        changed = thumbnails.VariantSet("avatar", widths=(100,), formats=("jpeg",))
+        with mock.patch.object(thumbnails, "AVATAR", changed):
+            self.assertTrue(user.thumbnails_outdated())
+            user.ensure_avatar_thumbs()
+        self.assertEqual(user.thumbnails["variants"], {"100": {"jpeg": mock.ANY}})
+
+    def test_manifest_for_a_previous_image_is_ignored(self):
+        user = get_user_model().objects.create_user(username="finn", email="finn@example.com", password="s3cret-pass")
+        with self.captureOnCommitCallbacks(execute=True):
+            user.avatar.save("finn.png", ContentFile(_png_bytes()), save=True)
+        user.avatar.name = "avatars/other.png"
+        self.assertFalse(user.avatar_thumb_100_url().endswith(".webp"))
+
+    def test_save_defers_generation_and_backfill_catches_up(self):
+        user = get_user_model().objects.create_user(username="gail", email="gail@example.com", password="s3cret-pass")
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            user.avatar.save("gail.png", ContentFile(_png_bytes()), save=True)
+        self.assertEqual(len(callbacks), 1)
+        self.assertTrue(get_user_model().objects.get(pk=user.pk).thumbnails_outdated())
+
+        out = StringIO()
+        call_command("generate_avatar_thumbs", stdout=out)
+        self.assertIn("Processed 1 users", out.getvalue())
+        self.assertFalse(get_user_model().objects.get(pk=user.pk).thumbnails_outdated())
@@ -0,0 +1,391 @@
+"""Thumbnail variants and manifests shared by avatars and blog images.
+
+Each use site declares a :class:`VariantSet` (widths, crop, formats and
+quality). The generator decodes the original once, downscales it from the
+largest width to the smallest, and encodes every width in every format. The
+result is recorded in a small JSON manifest on the owning row, so templates
+build ``<picture>`` markup without touching storage::
+
+    {"source": "avatars/me.png", "set": "3f2a9c1e", "missing": false,
+     "variants": {"100": {"avif": "avatars/thumbs/me__100.3b9d1c0a2e4f.avif", "webp": "...", "jpeg": "..."}}}
+
+A manifest only describes the file named in ``source`` and the variant set
+whose signature is stored in ``set``. Once either changes it is ignored until
+the generator runs again.
+
+Variant file names carry a hash of their content (``me__100.3b9d1c0a2e4f.webp``),
+so a given URL never changes what it serves and can be cached as immutable.
+Files that drop out of a manifest are deleted when it is replaced.
+"""
+
+import hashlib
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import django
+import django_rq
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+# Hex digits of the content hash embedded in variant file names.
+CONTENT_HASH_LENGTH = 12
+
+
+# Pillow format name, MIME type and file extension for each output format.
+FORMATS = {
+    "avif": ("AVIF", "image/avif", "avif"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+
+@dataclass(frozen=True)
+class VariantSet:
+    """Variants generated for one use site.
+
+    ``aspect`` is height / width of the centre crop; ``None`` keeps the
+    original proportions. ``formats`` are listed from most to least preferred;
+    the last one is what browsers without ``<picture>`` support receive.
+    """
+
+    name: str
+    widths: Tuple[int, ...]
+    aspect: Optional[float] = 1.0
+    formats: Tuple[str, ...] = ("avif", "webp", "jpeg")
+    quality: Tuple[Tuple[str, int], ...] = (("avif", 55), ("webp", 78), ("jpeg", 82))
+
+    @property
+    def signature(self) -> str:
+        return hashlib.sha1(repr(self).encode()).hexdigest()[:8]
+
+    def quality_for(self, fmt: str) -> int:
+        return dict(self.quality).get(fmt, 80)
+
+
+VARIANT_SETS: Dict[str, VariantSet] = {}
+
+
+def register(variant_set: VariantSet) -> VariantSet:
+    VARIANT_SETS[variant_set.name] = variant_set
+    return variant_set
+
+
+# 100px member avatars (1x/2x) and ~261px member cards (1x/2x).
+AVATAR = register(VariantSet("avatar", widths=(100, 200, 320, 640)))
+# ~326px blog cards (1x/2x).
+BLOG_CARD = register(VariantSet(
+    "blog_card",
+    widths=(326, 652),
+    quality=(("avif", 55), ("webp", 80), ("jpeg", 84)),
+))
+
+
+def supported_formats(formats: Sequence[str]) -> List[str]:
+    """The subset of ``formats`` this Pillow build can encode."""
+
+    Image.init()
+    return [fmt for fmt in formats if fmt in FORMATS and FORMATS[fmt][0] in Image.SAVE]
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "jpeg":
+        if img.mode != "RGB":
+            flat = Image.new("RGB", img.size, (255, 255, 255))
+            flat.paste(img, mask=img.getchannel("A") if img.mode == "RGBA" else None)
+            img = flat
+        img.save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+    elif fmt == "webp":
+        img.save(buf, format="WEBP", quality=quality, method=4)
+    else:
+        img.save(buf, format=FORMATS[fmt][0], quality=quality)
+    return buf.getvalue()
+
+
+def generate(
+    source_name: str,
+    variant_set: VariantSet,
+    name_for: Callable[[int, str], str],
+) -> Dict[str, Dict[str, str]]:
+    """Encode every variant of ``source_name`` and return ``{width: {format: storage name}}``.
+
+    ``name_for(width, extension)`` gives the storage name of each file, to
+    which a content hash is added. Identical files already in storage are
+    reused rather than written again.
+    """
+
+    widths = sorted(set(variant_set.widths), reverse=True)
+    formats = supported_formats(variant_set.formats)
+    if not widths or not formats:
+        return {}
+
+    with default_storage.open(source_name, "rb") as fh:
+        img = Image.open(fh)
+        if img.format == "JPEG":
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale when that is still
+            # large enough. Square request: EXIF rotation may swap the axes.
+            largest = max(widths[0], round(widths[0] * (variant_set.aspect or 1)))
+            img.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        img.load()
+
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+
+    # Don't upscale: widths the original can't fill are skipped (the smallest is always kept).
+    max_width = img.width if not variant_set.aspect else min(img.width, img.height / variant_set.aspect)
+    widths = [width for width in widths if width <= max_width] or widths[-1:]
+
+    variants: Dict[str, Dict[str, str]] = {}
+    current = img
+    for width in widths:
+        # Each width is resized from the previous (larger) one, not the original.
+        if variant_set.aspect:
+            size = (width, max(1, round(width * variant_set.aspect)))
+            current = ImageOps.fit(current, size, method=Image.Resampling.LANCZOS)
+        else:
+            current = current.copy()
+            current.thumbnail((width, current.height), Image.Resampling.LANCZOS)
+
+        encoded = {}
+        for fmt in formats:
+            try:
+                data = _encode(current, fmt, variant_set.quality_for(fmt))
+            except Exception:
+                logger.exception("could not encode %s as %s", source_name, fmt)
+                continue
+            name = hashed_name(name_for(width, FORMATS[fmt][2]), data)
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(data))
+            encoded[fmt] = name
+        if encoded:
+            variants[str(width)] = encoded
+    return variants
+
+
+def hashed_name(name: str, data: bytes) -> str:
+    """``name`` with a hash of ``data`` inserted before the extension."""
+
+    digest = hashlib.sha256(data).hexdigest()[:CONTENT_HASH_LENGTH]
+    base, dot, ext = name.rpartition(".")
+    return f"{base}.{digest}.{ext}" if dot else f"{name}.{digest}"
+
+
+def build_manifest(
+    source_name: str,
+    variants: Dict[str, Dict[str, str]],
+    variant_set: Optional[VariantSet] = None,
+    missing: bool = False,
+) -> dict:
+    return {
+        "source": source_name,
+        "set": variant_set.signature if variant_set else "",
+        "missing": bool(missing),
+        "variants": dict(variants),
+    }
+
+
+def current_manifest(manifest, source_name: str, variant_set: Optional[VariantSet] = None) -> Optional[dict]:
+    """Return ``manifest`` if it was generated for ``source_name`` (and ``variant_set``), else ``None``."""
+
+    if not source_name or not isinstance(manifest, dict):
+        return None
+    if manifest.get("source") != source_name:
+        return None
+    if variant_set is not None and manifest.get("set") != variant_set.signature:
+        return None
+    return manifest
+
+
+def _variant_names(manifest: Optional[dict]) -> Dict[str, Dict[str, str]]:
+    variants = (manifest or {}).get("variants") or {}
+    return {width: names for width, names in variants.items() if isinstance(names, dict)}
+
+
+def variant_url(manifest, source_name: str, variant_set: VariantSet, width, fmt: str = "") -> str:
+    """Storage URL of the ``width`` variant recorded for ``source_name``, or ``""``.
+
+    Without ``fmt`` the most preferred format that was generated is used.
+    """
+
+    names = _variant_names(current_manifest(manifest, source_name, variant_set)).get(str(width)) or {}
+    for candidate in ([fmt] if fmt else variant_set.formats):
+        if names.get(candidate):
+            return default_storage.url(names[candidate])
+    return ""
+
+
+def picture(manifest, source_name: str, variant_set: VariantSet, fallback_url: str = "") -> dict:
+    """Everything the ``{% picture %}`` tag needs, built from the manifest alone.
+
+    ``sources`` lists ``{"type", "srcset"}`` per format, most preferred first.
+    ``src``/``srcset`` are for the ``<img>`` fallback (last format, smallest
+    width first) and fall back to ``fallback_url`` when nothing was generated.
+    """
+
+    variants = _variant_names(current_manifest(manifest, source_name, variant_set))
+    widths = sorted(variants, key=int)
+
+    sources = []
+    for fmt in variant_set.formats:
+        candidates = [
+            (default_storage.url(variants[w][fmt]), int(w)) for w in widths if variants[w].get(fmt)
+        ]
+        if candidates:
+            sources.append({
+                "format": fmt,
+                "type": FORMATS[fmt][1],
+                "candidates": candidates,
+                "srcset": ", ".join(f"{url} {w}w" for url, w in candidates),
+            })
+
+    if not sources:
+        return {"sources": [], "format": "", "src": fallback_url, "srcset": "", "candidates": []}
+    fallback = sources[-1]
+    return {
+        "format": fallback["format"],
+        "sources": sources[:-1],
+        "src": fallback["candidates"][0][0],
+        "srcset": fallback["srcset"],
+        "candidates": fallback["candidates"],
+    }
+
+
+def variant_files(manifest) -> List[str]:
+    """Storage names of every variant recorded in ``manifest``."""
+
+    variants = (manifest or {}).get("variants") if isinstance(manifest, dict) else None
+    files = []
+    for names in (variants or {}).values():
+        # Older manifests stored a single file name per width.
+        files.extend(names.values() if isinstance(names, dict) else [names])
+    return [name for name in files if isinstance(name, str) and name]
+
+
+def delete_files(names) -> None:
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except Exception:
+            logger.warning("could not delete stale thumbnail %s", name, exc_info=True)
+
+
+def save_manifest(instance, manifest: dict, field: str = "thumbnails") -> None:
+    """Persist ``manifest`` without calling ``save()`` (which would regenerate thumbs)."""
+
+    setattr(instance, field, manifest)
+    type(instance).objects.filter(pk=instance.pk).update(**{field: manifest})
+
+
+def replace_manifest(instance, manifest: dict, field: str = "thumbnails") -> None:
+    """Save ``manifest`` and delete, once committed, the files only the previous one referenced."""
+
+    stale = set(variant_files(getattr(instance, field, None))) - set(variant_files(manifest))
+    save_manifest(instance, manifest, field)
+    if stale:
+        transaction.on_commit(lambda: delete_files(sorted(stale)))
+
+
+# ----------------------------------------------------------------------
+# Background generation
+# ----------------------------------------------------------------------
+
+
+def schedule_generation(task_path: str, *args) -> None:
+    """Run thumbnail task ``task_path`` in django-rq once the current transaction commits.
+
+    Falls back to running inline when the queue is unavailable, or when
+    ``THUMBNAILS_ASYNC`` is False.
+    """
+
+    def run_inline():
+        try:
+            import_string(task_path)(*args)
+        except Exception:
+            logger.exception("thumbnail task %s%r failed", task_path, args)
+
+    if not getattr(settings, "THUMBNAILS_ASYNC", True):
+        transaction.on_commit(run_inline)
+        return
+
+    def enqueue():
+        try:
+            # Already running on commit: enqueue now rather than deferring again.
+            queue = django_rq.get_queue(getattr(settings, "THUMBNAILS_QUEUE", "default"), autocommit=True)
+            queue.enqueue(task_path, *args)
+        except Exception as exc:
+            logger.warning("could not enqueue %s%r (%s); generating inline", task_path, args, exc)
+            run_inline()
+
+    transaction.on_commit(enqueue)
+
+
+def _backfill_chunk(
+    task_path: str,
+    ids: List[int],
+    force: bool,
+    in_worker: bool = False,
+) -> Tuple[int, List[Tuple[int, str]]]:
+    task = import_string(task_path)
+    done, errors = 0, []
+    try:
+        for pk in ids:
+            try:
+                task(pk, force=force)
+                done += 1
+            except Exception as exc:
+                errors.append((pk, str(exc)))
+    finally:
+        if in_worker:
+            connections.close_all()
+    return done, errors
+
+
+def backfill(
+    task_path: str,
+    ids: Sequence[int],
+    *,
+    workers: int = 1,
+    force: bool = False,
+    chunk_size: int = 50,
+    progress: Optional[Callable[[int, int, List[Tuple[int, str]]], None]] = None,
+) -> Tuple[int, List[Tuple[int, str]]]:
+    """Run ``task_path(pk, force=...)`` for every id, optionally across worker processes.
+
+    ``progress(done, total, new_errors)`` is called after each chunk.
+    """
+
+    ids = list(ids)
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), max(1, chunk_size))]
+    total_done, all_errors = 0, []
+
+    def report(result):
+        nonlocal total_done
+        done, errors = result
+        total_done += done
+        all_errors.extend(errors)
+        if progress:
+            progress(total_done + len(all_errors), len(ids), errors)
+
+    if workers <= 1:
+        for chunk in chunks:
+            report(_backfill_chunk(task_path, chunk, force))
+        return total_done, all_errors
+
+    # Children must open their own database connections.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        futures = [pool.submit(_backfill_chunk, task_path, chunk, force, True) for chunk in chunks]
+        for future in as_completed(futures):
+            report(future.result())
+    return total_done, all_errors
@@ -1,17 +1,15 @@
 from django.shortcuts import render
-from accounts.models import CustomUser
 from django.http import HttpResponse
 from django.template.loader import render_to_string
-from django.core.cache import cache
 from django.contrib.sites.requests import RequestSite
 from irc.services import AnopeStatsService
-from blog.models import BlogPost
+from community import presence
 from django.http import JsonResponse  
-from django.conf import settings
 
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from django.views.generic import TemplateView
 
+from . import fragments
 from .models import LegalMentions
 
 def webirc(request):
@@ -23,38 +21,13 @@ def webirc(request):
 
 @ensure_csrf_cookie
 def home(request):
-    host = (request.get_host() or "").split(":", 1)[0].lower()
-    cache_ns = f"home.{host}" if host else "home"
-
-    latest_members = cache.get_or_set(
-        f"{cache_ns}.latest_members",
-        lambda: list(
-            CustomUser.objects.filter(public=True)
-            .order_by("-date_joined")
-            .only("username", "avatar", "last_login")[:9]
-        ),
-        settings.HOME_CACHE_TTL_MEMBERS,
-    )
-
-    home_members = cache.get_or_set(
-        f"{cache_ns}.home_members",
-        lambda: list(
-            CustomUser.objects.filter(public=True)
-            .order_by("-last_login")
-            .only("username", "avatar", "last_login")[:8]
-        ),
-        settings.HOME_CACHE_TTL_MEMBERS,
-    )
-
-    latest_posts = cache.get_or_set(
-        f"{cache_ns}.latest_posts",
-        lambda: list(
-            BlogPost.objects.filter(is_published=True)
-            .select_related("author")
-            .order_by("-created_at")[:6]
-        ),
-        settings.HOME_CACHE_TTL_POSTS,
-    )
+    shared = fragments.get_many(["newest_members", "active_members", "latest_posts"], request)
+    latest_members = shared["newest_members"]
+    latest_posts = shared["latest_posts"]
+
+    # Members online right now first; the cached list itself stays shared.
+    online_ids = presence.online_ids()
+    home_members = sorted(shared["active_members"], key=lambda m: m.pk not in online_ids)
 
     stats_service = AnopeStatsService()
     overview = stats_service.network_overview_cached() or {}
@@ -67,6 +40,7 @@ def home(request):
     return render(request, 'main/home.html', {
         "latest_members": latest_members,
         "home_members": home_members,
+        "online_ids": online_ids,
         "latest_posts": latest_posts,
         "posts": latest_posts,
         "user_count": user_count,  # ✅ Added user count
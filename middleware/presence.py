@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from community import presence
+
+
+class PresenceMiddleware:
+    """Mark authenticated users as online (see ``community.presence``).
+
+    Place after ``AuthenticationMiddleware``. The touch happens after the
+    view, when ``request.user`` has usually been resolved already, and is
+    skipped entirely for users recorded within the last minute.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            presence.touch(user.pk)
+        return response
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from django.conf import settings
+
+from main import ratelimit
+
+
+class RateLimitMiddleware:
+    """Apply ``RATELIMIT_RULES`` to matching requests, per client IP.
+
+    Each rule is a dict::
+
+        {"name": "auth", "path": "/accounts/", "rate": "60/m", "methods": ["POST"]}
+
+    ``path`` is a prefix; ``methods`` is optional. All rules matching a
+    request are checked in one backend round-trip.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rules = []
+        for rule in getattr(settings, "RATELIMIT_RULES", ()):
+            methods = rule.get("methods")
+            self.rules.append((
+                rule["name"],
+                rule.get("path", "/"),
+                ratelimit.Rate.parse(rule["rate"]),
+                {method.upper() for method in methods} if methods else None,
+            ))
+
+    def __call__(self, request):
+        if self.rules:
+            limits = []
+            ip = None
+            for name, prefix, rate, methods in self.rules:
+                if not request.path.startswith(prefix):
+                    continue
+                if methods is not None and request.method not in methods:
+                    continue
+                ip = ip or ratelimit.client_ip(request)
+                limits.append(ratelimit.Limit(f"mw:{name}:{ip}", rate))
+            if limits:
+                decision = ratelimit.hit(*limits)
+                if not decision.allowed:
+                    return ratelimit.too_many_requests(decision)
+
+        return self.get_response(request)
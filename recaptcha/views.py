@@ -8,18 +8,17 @@ from django.conf import settings
 from recaptcha.jwt_utils import decode_jwt
 from recaptcha.models import VerificationToken, TrustedIP
 from django.utils.timezone import now
-from django.core.cache import cache
 from django.views.decorators.http import require_GET
 from datetime import timedelta
 
+from main import ratelimit
+
 
 logger = logging.getLogger(__name__)
 
 def get_client_ip(request):
-    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
-    if x_forwarded_for:
-        return x_forwarded_for.split(",")[0]  # First IP in the list is the real client
-    return request.META.get("REMOTE_ADDR", "0.0.0.0")  # Fallback to REMOTE_ADDR
+    # Same rules as the rate limiter: only hops added by trusted proxies count.
+    return ratelimit.client_ip(request)
 
 
 def get_remote_addr(request):
@@ -126,40 +125,38 @@ def verify_session_token(request):
             "message": "Jeton manquant. Reconnectez-vous à IRC et réessayez."
         })
 
-    attempts_key = f"verify_page_attempts:{client_ip}"
-    attempts = cache.get(attempts_key, 0)
-
-    if attempts >= 10:
+    # Each request reserves an attempt; only failed ones keep it.
+    failures = ratelimit.FailureWindow(f"verify_page_attempts:{client_ip}", 10, 600)
+    if not failures.attempt():
         return render(request, "recaptcha/error.html", {
             "message": "Trop de tentatives. Veuillez patienter 10 minutes avant de réessayer."
         })
 
     payload = decode_jwt(jwt_token, settings.EXTJWT_SECRET, settings.JWT_ISSUER)
     if not payload:
-        cache.set(attempts_key, attempts + 1, timeout=600)
         return render(request, "recaptcha/error.html", {
             "message": "Jeton invalide ou expiré. Reconnectez-vous à IRC pour obtenir un nouveau lien."
         })
 
     token_ip = payload.get("ip")
     if not token_ip:
-        cache.set(attempts_key, attempts + 1, timeout=600)
         return render(request, "recaptcha/error.html", {
             "message": "Ce lien n’est pas associé à une adresse IP. Reconnectez-vous à IRC pour obtenir un nouveau lien de vérification."
         })
 
     if token_ip != client_ip:
-        cache.set(attempts_key, attempts + 1, timeout=600)
         return render(request, "recaptcha/error.html", {
             "message": "Adresse IP différente pour ce lien. Merci d’ouvrir le lien depuis le même appareil et la même connexion que votre session IRC."
         })
 
     # <-- Explicitly check if token is already verified -->
     if VerificationToken.objects.filter(token=jwt_token, is_verified=True).exists():
+        failures.refund()
         return render(request, "recaptcha/error.html", {
             "message": "Ce jeton a déjà été utilisé. Reconnectez-vous à IRC pour obtenir un nouveau jeton de vérification."
         })
 
+    failures.refund()
     nickname = payload.get("sub")
 
     return render(request, "recaptcha/verify.html", {
@@ -172,35 +169,31 @@ def verify_session_token(request):
 def process_recaptcha(request):
     client_ip = get_client_ip(request)
 
-    cache_key = f"recaptcha_attempts:{client_ip}"
-    attempts = cache.get(cache_key, 0)
-
-    if attempts >= 5:
+    # Each request reserves an attempt; only failed ones keep it, a success clears them.
+    failures = ratelimit.FailureWindow(f"recaptcha_attempts:{client_ip}", 5, 600)
+    if not failures.attempt():
         return JsonResponse({"status": "error", "message": "Trop de tentatives. Veuillez patienter 10 minutes avant de réessayer."})
 
     recaptcha_response = request.POST.get('g-recaptcha-response')
     jwt_token = request.POST.get('jwt')
 
     if not recaptcha_response or not jwt_token:
-        cache.set(cache_key, attempts + 1, timeout=600)
         return JsonResponse({"status": "error", "message": "Champs requis manquants. Merci de réessayer."})
 
     payload = decode_jwt(jwt_token, settings.EXTJWT_SECRET, settings.JWT_ISSUER)
     if not payload:
-        cache.set(cache_key, attempts + 1, timeout=600)
         return JsonResponse({"status": "error", "message": "JWT invalide ou expiré. Reconnectez-vous à IRC pour obtenir un nouveau lien."})
 
     token_ip = payload.get("ip")
     if not token_ip:
-        cache.set(cache_key, attempts + 1, timeout=600)
         return JsonResponse({"status": "error", "message": "Ce lien n’est pas associé à une adresse IP. Reconnectez-vous à IRC pour obtenir un nouveau lien."})
 
     if token_ip != client_ip:
-        cache.set(cache_key, attempts + 1, timeout=600)
         return JsonResponse({"status": "error", "message": "Adresse IP différente pour ce jeton. Merci d’ouvrir le lien depuis le même appareil et la même connexion que votre session IRC."})
 
     # Already verified?
     if VerificationToken.objects.filter(token=jwt_token, is_verified=True).exists():
+        failures.refund()
         return JsonResponse({"status": "error", "message": "Ce jeton est déjà vérifié (déjà utilisé). Reconnectez-vous à IRC pour obtenir un nouveau lien."})
 
     # Verify reCAPTCHA response with Google
@@ -214,7 +207,6 @@ def process_recaptcha(request):
     result = response.json()
 
     if not result.get("success"):
-        cache.set(cache_key, attempts + 1, timeout=600)
         return JsonResponse({"status": "error", "message": "Échec de la vérification reCAPTCHA. Merci de réessayer."})
 
     # ONLY HERE: Mark JWT as verified (single clear point)
@@ -226,6 +218,6 @@ def process_recaptcha(request):
     # Remember this IP for a short time to reduce friction on reconnect.
     remember_trusted_ip(client_ip)
 
-    cache.delete(cache_key)
+    failures.reset()
 
     return JsonResponse({"status": "ok", "result": jwt_token})
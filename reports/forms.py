@@ -1,7 +1,8 @@
 from django import forms
-from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 
+from accounts.services import find_user_by_identifier
+
 from .models import UserReport
 
 
@@ -23,8 +24,7 @@ class ReportUserForm(forms.ModelForm):
         if not username:
             raise ValidationError("Please provide a username.")
 
-        user_model = get_user_model()
-        reported = user_model.objects.filter(username__iexact=username).first()
+        reported = find_user_by_identifier(username, fields=("username",))
         if reported is None:
             raise ValidationError("User not found.")
 
@@ -5,8 +5,11 @@ from datetime import datetime
 from typing import Dict
 
 from django.conf import settings
-from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.urls import NoReverseMatch, reverse
+from django.utils import translation
+from django.utils.functional import SimpleLazyObject
 
 
 def _normalize_host(host: str) -> str:
@@ -99,16 +102,24 @@ def site_branding(request):
     }
 
 
-def _footer_for_host(host: str) -> dict:
+def _footer_entry(host: str) -> str:
+    """The ``SITE_FOOTERS`` key serving ``host``, or "" for ``DEFAULT_SITE_FOOTER``."""
+
     site_footers = getattr(settings, "SITE_FOOTERS", {})
     if host in site_footers:
-        return site_footers[host]
+        return host
 
     if host.startswith("www."):
         bare_host = host[4:]
         if bare_host in site_footers:
-            return site_footers[bare_host]
+            return bare_host
+
+    return ""
 
+
+def _footer_for_entry(entry: str) -> dict:
+    if entry:
+        return getattr(settings, "SITE_FOOTERS", {})[entry]
     return getattr(settings, "DEFAULT_SITE_FOOTER", {})
 
 
@@ -147,17 +158,35 @@ def _sanitize_footer_links(items: object) -> list:
     return sanitized
 
 
-def site_footer(request):
-    """Expose footer configuration + latest users to all templates.
+def _footer_count(configured: dict, key: str, default: int) -> int:
+    try:
+        return max(int(configured.get(key, default)), 0)
+    except (TypeError, ValueError):
+        return default
 
-    This is intentionally defensive: it should never break template rendering
-    (e.g. during maintenance, migrations, or partial deployments).
-    """
 
-    normalized_host = _normalize_host(request.get_host() if request else "")
-    configured = _footer_for_host(normalized_host) or {}
+# (SITE_FOOTERS key or "", language) -> footer settings and sanitized links.
+# Keyed on the configured entry rather than the request host, so arbitrary
+# Host headers cannot grow it. Only depends on settings and URLconf, so it
+# is built once per process.
+_footer_config_cache: Dict[tuple, dict] = {}
+
+
+@receiver(setting_changed)
+def _clear_footer_config(setting, **kwargs):
+    if setting in {"SITE_FOOTERS", "DEFAULT_SITE_FOOTER", "ROOT_URLCONF"}:
+        _footer_config_cache.clear()
 
-    footer = {
+
+def _footer_config(host: str) -> dict:
+    entry = _footer_entry(host)
+    cache_key = (entry, translation.get_language())
+    cached = _footer_config_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    configured = _footer_for_entry(entry) or {}
+    footer_config = {
         "background_image": configured.get("background_image", "images/footer/bg-2.jpg"),
         "tagline": configured.get(
             "tagline",
@@ -198,36 +227,55 @@ def site_footer(request):
             )
         ),
         "social_links": _sanitize_footer_links(configured.get("social_links", [])),
-        "year": datetime.now().year,
-        "recent_articles": [],
-        "latest_users": [],
+        "recent_articles_count": _footer_count(configured, "recent_articles_count", 3),
+        "latest_users_count": _footer_count(configured, "latest_users_count", 5),
     }
+    _footer_config_cache[cache_key] = footer_config
+    return footer_config
 
-    recent_articles_count = int(configured.get("recent_articles_count", 3) or 3)
-    if recent_articles_count > 0:
-        try:
-            from blog.models import BlogPost
 
-            recent_posts = (
-                BlogPost.objects.filter(is_active=True, is_published=True)
-                .only("title", "slug", "created_at")
-                .order_by("-created_at")[:recent_articles_count]
-            )
-            footer["recent_articles"] = [
-                {"title": post.title, "url": _safe_reverse("blog:blog_detail", slug=post.slug)}
-                for post in recent_posts
-            ]
-        except Exception:
-            footer["recent_articles"] = []
-
-    latest_users_count = int(configured.get("latest_users_count", 5) or 5)
-    if latest_users_count > 0:
-        try:
-            User = get_user_model()
-            footer["latest_users"] = list(
-                User.objects.only("username", "date_joined", "avatar").order_by("-date_joined")[:latest_users_count]
-            )
-        except Exception:
-            footer["latest_users"] = []
+def _build_footer(request) -> dict:
+    footer = _footer_config(_normalize_host(request.get_host() if request else "")).copy()
+    recent_articles_count = footer.pop("recent_articles_count")
+    latest_users_count = footer.pop("latest_users_count")
+    footer.update({"year": datetime.now().year, "recent_articles": [], "latest_users": []})
+
+    names = []
+    if recent_articles_count:
+        names.append("recent_posts")
+    if latest_users_count:
+        names.append("newest_members")
+    if not names:
+        return footer
+
+    try:
+        from main import fragments
+
+        shared = fragments.get_many(names, request)
+    except Exception:
+        return footer
+
+    if recent_articles_count:
+        footer["recent_articles"] = [
+            {"title": post.title, "url": _safe_reverse("blog:blog_detail", slug=post.slug)}
+            for post in shared["recent_posts"][:recent_articles_count]
+        ]
+    if latest_users_count:
+        footer["latest_users"] = shared["newest_members"][:latest_users_count]
+    return footer
+
+
+def site_footer(request):
+    """Expose footer configuration + latest users to all templates.
+
+    The footer is built lazily, on the first template access, so responses
+    that never render it (JSON, redirects, error pages) cost nothing. Links
+    are computed once per host and language; recent articles and members
+    come from the shared ``main.fragments`` cache, refreshed when a post is
+    saved or a member joins. At most 5 articles and 9 members are available.
+
+    This is intentionally defensive: it should never break template rendering
+    (e.g. during maintenance, migrations, or partial deployments).
+    """
 
-    return {"footer": footer}
+    return {"footer": SimpleLazyObject(lambda: _build_footer(request))}